@@ -11,6 +11,7 @@ import csv
 import logging
 
 from file_handlers import create_and_check_path
+from weapons import SAMPLE_SIZE, detect_dialect
 
 
 def map_troops_to_armour_types(weapon_input_filename: str, armour_types: set):
@@ -27,14 +28,18 @@ def map_troops_to_armour_types(weapon_input_filename: str, armour_types: set):
     armour_types_dict = {}
 
     logging.debug("Loading weapon input csv file")
-    with open(weapon_input_path) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=",")
-        logging.debug("Done")
-
-        for row in csv_reader:
-            if row[0] in armour_types:
-                troops_with_armour_type = format_troops(row[1].split(","))
-                armour_types_dict[row[0]] = troops_with_armour_type
+    # Read the same way as weapons.weapon_file_reader, so semicolon or tab
+    # separated files and Excel's byte order mark work here too
+    with open(weapon_input_path, encoding="utf-8-sig", newline="") as csv_file:
+        dialect = detect_dialect(csv_file.read(SAMPLE_SIZE))
+        csv_file.seek(0)
+
+        for row in csv.reader(csv_file, dialect):
+            if len(row) < 2:
+                continue
+            armour_type = row[0].strip()
+            if armour_type in armour_types:
+                armour_types_dict[armour_type] = format_troops(row[1].split(","))
 
     return generate_armour_type_dicts(armour_types_dict)
 
@@ -71,6 +76,9 @@ def generate_armour_type_dicts(armour_types_dict: dict):
     troops_to_armour_types_dict = {}
 
     for armour_type, troops in armour_types_dict.items():
+        # Lists rather than sets so they can be saved without conversion
+        troops = sorted(troops)
+        armour_types_dict[armour_type] = troops
         for troop in troops:
             if troop not in troops_to_armour_types_dict:
                 troops_to_armour_types_dict[troop] = armour_type
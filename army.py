@@ -0,0 +1,460 @@
+"""
+Finds the mix of troops that best counters a whole opposing army, rather
+than a single troop.
+
+The opponent's army is a list of (race, troop, count) squads, which is
+turned into the total squad health of each armour type in it. Each of the
+player race's (troop, weapon) pairs from the counters data is a squad
+that can be bought, at the troop's cost and taking up one squad. The
+army is limited by a budget (requisition plus power, the same cost the
+scoring stage uses), a squad cap or both. Two objectives are supported:
+ - dps -- the army's DPS averaged over the opponent's health, i.e. each
+   armour type counts by how much of the opponent's health has it
+ - time_to_kill -- the time for the army to kill every squad, one armour
+   type at a time with the whole army firing
+
+The solver is greedy: it keeps buying the squad that improves the
+objective the most for the share of the budget and squad cap it uses,
+then tries swapping squads until no swap helps. Squads that are no better
+than a cheaper squad against every armour type are never considered. The
+result also has a bound on the best possible value (from the continuous
+relaxation) so the gap to the optimum is known.
+"""
+import logging
+
+from scoring import get_troop_cost
+
+OBJECTIVES = ("dps", "time_to_kill")
+# Squads are limited to this when only a budget is given, since free
+# troops would otherwise be bought without end
+MAX_SQUADS = 100
+# Stands in for no damage against an armour type while buying, so the
+# time to kill stays finite
+NO_DAMAGE = 1e-9
+
+
+class ArmyError(Exception):
+    """
+    An exception for when an army can't be optimised, e.g. because a
+    troop doesn't exist or there is no budget or squad cap.
+    """
+    pass
+
+
+def optimise_army(troops_dict: dict, counters: dict, player_race: str, opponents: list,
+                  budget: float=None, squad_cap: int=None, objective: str="dps"):
+    """
+    Finds the mix of squads that best counters an opposing army.
+
+    :param troops_dict: every troop in DoW organised by race
+    :param counters: each race's (troop, weapon, damage) counters for
+                        each armour type, as saved by calculate_counters
+    :param player_race: the race the player is playing
+    :param opponents: a list of (race, troop, count) squads in the
+                        opponent's army, the troop being a filename or
+                        display name
+    :param budget: the most the army can cost, or None for no limit
+    :param squad_cap: the most squads the army can have, or None for no
+                        limit
+    :param objective: "dps" or "time_to_kill"
+    :returns: a dictionary of the army (troop_file, display_name, weapon
+                and count of each squad), its cost, squads, objective
+                value and DPS against each armour type, the bound on the
+                best value and any armour types the player race can't
+                damage
+    :raises ArmyError: when the army can't be optimised
+    """
+    if objective not in OBJECTIVES:
+        raise ArmyError(f"Unknown objective: {objective}")
+    if player_race not in counters:
+        raise ArmyError(f"Unknown race: {player_race}")
+    if budget is None and squad_cap is None:
+        raise ArmyError("Either a budget or a squad cap is needed")
+    if squad_cap is None:
+        squad_cap = MAX_SQUADS
+
+    target_health = get_target_health(troops_dict, opponents)
+    armour_types = list(target_health)
+    rows, costs, squad_dps = get_race_rows(troops_dict[player_race], counters[player_race], armour_types)
+
+    # Armour types nothing in the race can damage are left out, otherwise
+    # no army could ever kill them
+    columns = [
+        column for column in range(len(armour_types))
+        if any(damages[column] > 0 for damages in squad_dps)
+    ]
+    unkillable = [armour_type for column, armour_type in enumerate(armour_types) if column not in columns]
+    health = [target_health[armour_types[column]] for column in columns]
+    damages = [[row_damages[column] for column in columns] for row_damages in squad_dps]
+
+    if objective == "dps":
+        total_health = sum(health)
+        weights = [squad_health / total_health for squad_health in health] if total_health else []
+        damages = [[sum(weight * damage for weight, damage in zip(weights, damage))] for damage in damages]
+        army = ArmyObjective(DpsObjective(), costs, damages, budget, squad_cap)
+    else:
+        army = ArmyObjective(TimeToKillObjective(health), costs, damages, budget, squad_cap)
+
+    army.solve()
+
+    army_dps = {armour_type: 0.0 for armour_type in armour_types}
+    squads = []
+    for row, count in sorted(army.counts.items(), key=lambda item: (-item[1], rows[item[0]])):
+        troop_file, weapon = rows[row]
+        squads.append({
+            "troop_file": troop_file,
+            "display_name": troops_dict[player_race][troop_file]["display_name"],
+            "weapon": weapon,
+            "count": count
+        })
+        for armour_type, damage in zip(armour_types, squad_dps[row]):
+            army_dps[armour_type] += damage * count
+
+    value = army.value()
+    bound = army.bound()
+    logging.debug("Optimised army: %s %s (bound %s) from %d squads", objective, value, bound, len(army.candidates))
+
+    return {
+        "objective": objective,
+        "army": squads,
+        "cost": army.cost,
+        "squads": army.squads,
+        "value": value,
+        "bound": bound,
+        "army_dps": army_dps,
+        "unkillable": unkillable
+    }
+
+
+def get_target_health(troops_dict: dict, opponents: list):
+    """
+    Totals the squad health of each armour type in the opponent's army.
+
+    :param troops_dict: every troop in DoW organised by race
+    :param opponents: a list of (race, troop, count) squads
+    :returns: a dictionary mapping each armour type to its total health,
+                in the order the armour types first appear
+    :raises ArmyError: when a troop can't be found, has no armour type or
+                        the army is empty
+    """
+    target_health = {}
+    for race, troop, count in opponents:
+        if race not in troops_dict:
+            raise ArmyError(f"Unknown race: {race}")
+        troop_info = find_troop(troops_dict[race], troop)
+        if troop_info is None:
+            raise ArmyError(f"Unknown troop for {race}: {troop}")
+        if count < 0:
+            raise ArmyError(f"Squad count can't be negative: {troop} x {count}")
+
+        armour_type = troop_info["armour_types"]
+        if armour_type is None:
+            raise ArmyError(f"Troop has no armour type: {troop}")
+
+        squad_health = troop_info.get("health", 0) * troop_info.get("squad_size", 1) * count
+        target_health[armour_type] = target_health.get(armour_type, 0) + squad_health
+
+    target_health = {armour_type: health for armour_type, health in target_health.items() if health > 0}
+    if not target_health:
+        raise ArmyError("The opponent's army has no health to counter")
+
+    return target_health
+
+
+def find_troop(race_troops: dict, troop: str):
+    """
+    Finds a troop by filename or (case insensitive) display name.
+
+    :param race_troops: every troop in a race
+    :param troop: the troop's filename or display name
+    :returns: the troop's information, or None if it can't be found
+    """
+    if troop in race_troops:
+        return race_troops[troop]
+
+    troop = troop.lower()
+    for troop_file, troop_info in race_troops.items():
+        if troop_file.lower() == troop or (troop_info["display_name"] or "").lower() == troop:
+            return troop_info
+
+    return None
+
+
+def get_race_rows(race_troops: dict, race_counters: dict, armour_types: list):
+    """
+    Lays out a race's (troop, weapon) pairs with their squad DPS against
+    each armour type, from the race's counters.
+
+    :param race_troops: every troop in the race
+    :param race_counters: the race's counters for each armour type
+    :param armour_types: the armour types to get the DPS against
+    :returns: (a list of (troop file, weapon) rows, a list of each row's
+                cost, a list of each row's squad DPS against each armour
+                type)
+    """
+    squad_dps = {}
+    for column, armour_type in enumerate(armour_types):
+        for troop_file, weapon, damage in race_counters.get(armour_type, ()):
+            row_damages = squad_dps.get((troop_file, weapon))
+            if row_damages is None:
+                row_damages = squad_dps[(troop_file, weapon)] = [0.0] * len(armour_types)
+            row_damages[column] = damage * race_troops[troop_file].get("squad_size", 1)
+
+    rows = sorted(squad_dps)
+    costs = [get_troop_cost(race_troops[troop_file]) for troop_file, _ in rows]
+    return rows, costs, [squad_dps[row] for row in rows]
+
+
+def remove_dominated(costs: list, damages: list):
+    """
+    Finds the rows worth buying. A row is dominated when another row
+    costs no more and does at least as much damage against every armour
+    type.
+
+    :param costs: each row's cost
+    :param damages: each row's squad DPS against each armour type
+    :returns: a list of the rows that aren't dominated
+    """
+    candidates = []
+    for row in sorted(range(len(costs)), key=lambda row: (costs[row], [-damage for damage in damages[row]])):
+        row_damages = damages[row]
+        if not any(row_damages):
+            continue
+        if not any(all(better >= damage for better, damage in zip(damages[candidate], row_damages))
+                   for candidate in candidates):
+            candidates.append(row)
+
+    return candidates
+
+
+class DpsObjective():
+    """
+    The army's health weighted DPS, which each squad adds to by a fixed
+    amount. Bigger is better.
+    """
+    maximise = True
+
+    def value(self, totals: list):
+        return totals[0]
+
+    def gradient(self, totals: list):
+        return [1.0]
+
+
+class TimeToKillObjective():
+    """
+    The time for the army to kill every armour type in turn. Smaller is
+    better, and each squad helps less the more damage the army already
+    does.
+    """
+    maximise = False
+
+    def __init__(self, health: list):
+        """
+        :param health: the opponent's total health of each armour type
+        """
+        self.health = health
+
+    def value(self, totals: list):
+        return sum(health / max(total, NO_DAMAGE) for health, total in zip(self.health, totals))
+
+    def gradient(self, totals: list):
+        return [-health / max(total, NO_DAMAGE) ** 2 for health, total in zip(self.health, totals)]
+
+
+class ArmyObjective():
+    """
+    Buys squads for an objective within the budget and squad cap.
+    """
+
+    def __init__(self, objective, costs: list, damages: list, budget: float, squad_cap: int):
+        """
+        :param objective: the DpsObjective or TimeToKillObjective
+        :param costs: each row's cost
+        :param damages: each row's squad DPS against each of the
+                        objective's columns
+        :param budget: the most the army can cost, or None for no limit
+        :param squad_cap: the most squads the army can have
+        """
+        self.objective = objective
+        self.costs = costs
+        self.damages = damages
+        self.budget = budget
+        self.squad_cap = squad_cap
+        self.candidates = remove_dominated(costs, damages)
+
+        self.counts = {}
+        self.totals = [0.0] * len(damages[0]) if damages else []
+        self.cost = 0
+        self.squads = 0
+
+    def fits(self, row: int, cost: float=0, squads: int=0):
+        """
+        Checks whether a squad can be bought.
+
+        :param row: the squad's row
+        :param cost: the cost already freed up by a squad being removed
+        :param squads: the squads already freed up
+        :returns: whether or not the squad fits in the budget and cap
+        """
+        return (self.squads - squads < self.squad_cap
+                and (self.budget is None or self.cost - cost + self.costs[row] <= self.budget))
+
+    def add(self, row: int, count: int=1):
+        """
+        Buys (or with a negative count, removes) squads.
+        """
+        self.counts[row] = self.counts.get(row, 0) + count
+        if not self.counts[row]:
+            del self.counts[row]
+        self.totals = [total + damage * count for total, damage in zip(self.totals, self.damages[row])]
+        self.cost += self.costs[row] * count
+        self.squads += count
+
+    def improvement(self, totals: list, row: int):
+        """
+        :returns: how much buying a squad improves the objective
+        """
+        current = self.objective.value(totals)
+        bought = self.objective.value([total + damage for total, damage in zip(totals, self.damages[row])])
+        return bought - current if self.objective.maximise else current - bought
+
+    def share(self, row: int):
+        """
+        :returns: the share of the budget and squad cap a squad uses
+        """
+        share = 1 / self.squad_cap
+        if self.budget:
+            share += self.costs[row] / self.budget
+        return share
+
+    def solve(self):
+        """
+        Buys squads greedily, then swaps squads while it helps.
+        """
+        self.buy()
+
+        # Each swap strictly improves the objective, the limit only stops
+        # rounding errors from swapping back and forth
+        for _ in range(2 * self.squad_cap):
+            if not self.swap():
+                break
+            self.buy()
+
+    def buy(self):
+        """
+        Keeps buying the squad that improves the objective the most for
+        its share of the budget and squad cap, until none fit or help.
+        """
+        while True:
+            best_row, best_ratio = None, 0
+            for row in self.candidates:
+                if self.fits(row):
+                    ratio = self.improvement(self.totals, row) / self.share(row)
+                    if ratio > best_ratio:
+                        best_row, best_ratio = row, ratio
+            if best_row is None:
+                return
+
+            if self.objective.maximise:
+                # Every squad adds the same, so buy as many as fit at once
+                count = self.squad_cap - self.squads
+                if self.budget is not None:
+                    count = min(count, int((self.budget - self.cost) // self.costs[best_row]))
+                self.add(best_row, max(count, 1))
+            else:
+                self.add(best_row)
+
+    def swap(self):
+        """
+        Makes the best swap of one bought squad for another.
+
+        :returns: whether or not a swap was made
+        """
+        current = self.objective.value(self.totals)
+        best_swap, best_improvement = None, 0
+        for removed in list(self.counts):
+            removed_totals = [total - damage for total, damage in zip(self.totals, self.damages[removed])]
+            for added in self.candidates:
+                if added == removed or not self.fits(added, self.costs[removed], 1):
+                    continue
+                swapped = self.objective.value(
+                    [total + damage for total, damage in zip(removed_totals, self.damages[added])])
+                improvement = swapped - current if self.objective.maximise else current - swapped
+                # Ignore improvements that are only rounding errors
+                if improvement > best_improvement + 1e-9 * abs(current):
+                    best_swap, best_improvement = (removed, added), improvement
+
+        if best_swap is None:
+            return False
+
+        removed, added = best_swap
+        self.add(removed, -1)
+        self.add(added)
+        return True
+
+    def value(self):
+        """
+        :returns: the objective value of the army bought, None for a time
+                    to kill the army can't achieve
+        """
+        if not self.objective.maximise and not all(self.totals):
+            return None
+        return self.objective.value(self.totals)
+
+    def bound(self):
+        """
+        Bounds the best possible objective value using the continuous
+        relaxation (buying fractions of squads). For dps this is an upper
+        bound, for time_to_kill a lower bound from the objective's
+        gradient at the army bought, since the time to kill is convex.
+
+        :returns: the bound, or None if there is none
+        """
+        if self.objective.maximise:
+            values = [self.damages[row][0] for row in self.candidates]
+            return relaxed_maximum(values, [self.costs[row] for row in self.candidates],
+                                   self.budget, self.squad_cap)
+
+        if not self.totals or not all(self.totals):
+            return None
+        gradient = self.objective.gradient(self.totals)
+        values = [-sum(g * damage for g, damage in zip(gradient, self.damages[row])) for row in self.candidates]
+        current = sum(g * total for g, total in zip(gradient, self.totals))
+        best = -relaxed_maximum(values, [self.costs[row] for row in self.candidates], self.budget, self.squad_cap)
+        return max(self.objective.value(self.totals) + best - current, 0.0)
+
+
+def relaxed_maximum(values: list, costs: list, budget: float, squad_cap: float):
+    """
+    Solves the continuous relaxation of buying squads: maximise the total
+    value of the squads bought, where fractions of squads can be bought,
+    within a budget and squad cap. The best solution is at a vertex,
+    which is either as many of a single squad as fit, or two squads
+    using exactly the budget and squad cap.
+
+    :param values: the value of each squad
+    :param costs: the cost of each squad
+    :param budget: the budget, or None for no limit
+    :param squad_cap: the squad cap
+    :returns: the best total value
+    """
+    best = 0.0
+    for value, cost in zip(values, costs):
+        count = squad_cap if budget is None else min(squad_cap, budget / cost)
+        best = max(best, value * count)
+
+    if budget is None:
+        return best
+
+    for first in range(len(values)):
+        for second in range(first + 1, len(values)):
+            cost_difference = costs[first] - costs[second]
+            if cost_difference == 0:
+                continue
+            first_count = (budget - costs[second] * squad_cap) / cost_difference
+            second_count = squad_cap - first_count
+            if first_count >= 0 and second_count >= 0:
+                best = max(best, values[first] * first_count + values[second] * second_count)
+
+    return best
@@ -0,0 +1,873 @@
+"""
+Benchmarks for the slower parts of the data generation. Each benchmark
+builds synthetic data at roughly Ultimate Apocalypse scale, so they can
+be run without any input files.
+
+Usage: python benchmarks.py <benchmark> [options]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from urllib.parse import urlencode
+
+from file_handlers import encode_json, load_from_json, orjson
+
+
+def make_synthetic_counters(races: int, armour_types: int, rows: int, seed: int=0):
+    """
+    Creates synthetic counters shaped like the generated counters.json.
+
+    :param races: the number of races
+    :param armour_types: the number of armour types per race
+    :param rows: the number of (troop, weapon) rows per armour type
+    :param seed: the random seed
+    :returns: a counters dictionary of (troop, weapon, damage) tuples
+    """
+    rng = random.Random(seed)
+    counters = {}
+    for race in range(races):
+        counters[f"race_{race}"] = {
+            f"armour_type_{armour_type}": [
+                (f"troop_{row % 97}.lua", f"weapon_{row}.lua", rng.random() * 100)
+                for row in range(rows)
+            ]
+            for armour_type in range(armour_types)
+        }
+
+    return counters
+
+
+def make_synthetic_game(races: int, armour_types: int, troops: int, weapons: int, seed: int=0):
+    """
+    Creates synthetic weapons and troops shaped like the generated
+    weapons.json and troops.json.
+
+    :param races: the number of races
+    :param armour_types: the number of armour types
+    :param troops: the number of troops per race
+    :param weapons: the number of weapons per race
+    :param seed: the random seed
+    :returns: (a troops dictionary, a weapons dictionary, a list of
+                armour types)
+    """
+    rng = random.Random(seed)
+    armour_type_names = [f"armour_type_{armour_type}" for armour_type in range(armour_types)]
+
+    weapons_dict = {}
+    troops_dict = {}
+    for race in range(races):
+        race_weapons = [f"race_{race}_weapon_{weapon}.lua" for weapon in range(weapons)]
+        for weapon in race_weapons:
+            weapons_dict[weapon] = {armour_type: rng.random() * 100 for armour_type in armour_type_names}
+
+        troops_dict[f"race_{race}"] = {}
+        for troop in range(troops):
+            troop_file = f"race_{race}_troop_{troop}.lua"
+            troops_dict[f"race_{race}"][troop_file] = {
+                "display_name": f"Troop {race}-{troop}",
+                "weapons": sorted(rng.sample(race_weapons, rng.randint(1, 4))),
+                "armour_types": rng.choice(armour_type_names),
+                "troop_file": troop_file,
+                "health": rng.uniform(100, 5000),
+                "cost": {"requisition": float(rng.randrange(0, 600, 5)), "power": float(rng.randrange(0, 200, 5))},
+                "squad_size": rng.randint(1, 8),
+                "missing_weapons": []
+            }
+
+    return troops_dict, weapons_dict, armour_type_names
+
+
+def calculate_race_counters(race_troops_dict: dict, weapons_dict: dict, armour_types: list):
+    """
+    Lists each troop in a race's damage against each armour type, the way
+    the counters stage did before weapon and armour type classes. Kept
+    as the reference the classes are timed and tested against.
+
+    :param race_troops_dict: every troop in the race
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types to find counters for
+    :returns: a dictionary mapping each armour type to an (unsorted)
+                list of (troop, weapon, damage) counters
+    """
+    race_counters = {armour_type: [] for armour_type in armour_types}
+
+    for troop in race_troops_dict:  # For each troop in a race
+        # For each weapon that troop has
+        for weapon in race_troops_dict[troop]["weapons"]:
+            for armour_type in armour_types:
+                # Plain tuples so the counters can be saved by the
+                # json module's C encoder
+                race_counters[armour_type].append(
+                    (troop, weapon, weapons_dict[weapon][armour_type]))
+
+    return race_counters
+
+
+def sort_counters(counters: dict):
+    """
+    Sorts the counters into descending order of damage. Ties are broken
+    by troop and then weapon so the order is always the same.
+
+    :param counters: the counters to sort
+    :returns: the counters dict with sorted armour type counters
+    """
+    for race in counters:
+        for armour_type in counters[race]:
+            counters[race][armour_type].sort(key=counter_sort_key)
+
+    return counters
+
+
+def counter_sort_key(counter: tuple):
+    """
+    The key counters are sorted by, highest damage first.
+
+    :param counter: a (troop, weapon, damage) counter
+    :returns: the key to sort the counter by
+    """
+    troop_file, weapon, damage = counter
+    return -damage, troop_file, weapon
+
+
+def time_call(function, repeat: int):
+    """
+    Times the best of several calls to a function.
+
+    :param function: the function to time
+    :param repeat: the number of times to call it
+    :returns: the fastest time in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def bench_json_write(args):
+    """
+    Compares writing counters the old way (an object per counter turned
+    into a dict by an encoder callback, indented) against the plain
+    tuple path used now.
+    """
+    counters = make_synthetic_counters(args.races, args.armour_types, args.rows)
+
+    class LegacyDamageInfo():
+        def __init__(self, troop_file, weapon, damage):
+            self.troop_file = troop_file
+            self.weapon = weapon
+            self.damage = damage
+
+    class LegacyEncoder(json.JSONEncoder):
+        def default(self, obj):
+            return {"troop_file": obj.troop_file, "weapon": obj.weapon, "damage": obj.damage}
+
+    legacy_counters = {
+        race: {armour_type: [LegacyDamageInfo(*row) for row in bucket] for armour_type, bucket in buckets.items()}
+        for race, buckets in counters.items()
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "counters.json")
+
+        def legacy():
+            with open(path, "w") as outfile:
+                json.dump(legacy_counters, outfile, cls=LegacyEncoder, indent=4)
+
+        def current():
+            with open(path, "wb") as outfile:
+                outfile.write(encode_json(counters, False))
+
+        def json_c_encoder():
+            with open(path, "w") as outfile:
+                outfile.write(json.dumps(counters, separators=(",", ":")))
+
+        results = [("legacy (callback, indent=4)", legacy), ("tuples (json C encoder)", json_c_encoder)]
+        if orjson:
+            results.append(("tuples (orjson)", current))
+        rows = args.races * args.armour_types * args.rows
+        print(f"Writing {rows} counters")
+        for name, function in results:
+            seconds = time_call(function, args.repeat)
+            size = os.path.getsize(path) / 1e6
+            print(f"{name:40} {seconds:8.3f}s {size:8.1f}MB {rows / seconds:12.0f} rows/s {size / seconds:8.1f}MB/s")
+
+
+def write_synthetic_weapon_csv(path: str, rows: int, armour_types: int, dirty: bool=False, seed: int=0):
+    """
+    Writes a synthetic Corsix weapon DPS csv.
+
+    :param path: the path to write the csv to
+    :param rows: the number of weapon rows
+    :param armour_types: the number of armour type columns
+    :param dirty: whether to write it the way a European Excel would
+                    (semicolons, decimal commas, thousands separators
+                    and some empty cells)
+    :param seed: the random seed
+    """
+    rng = random.Random(seed)
+    delimiter = ";" if dirty else ","
+    lines = ["DoW DPS Calculator", "File" + delimiter + delimiter.join(f"armour_type_{i}" for i in range(armour_types))]
+    for row in range(rows):
+        cells = []
+        for _ in range(armour_types):
+            damage = rng.random() * 2000
+            if not dirty:
+                cells.append(f"{damage:.3f}")
+            elif rng.random() < 0.001:
+                cells.append("")
+            else:
+                cells.append(f"{damage:,.2f}".replace(",", " ").replace(".", ","))
+        lines.append(f"weapon_{row}.rgd" + delimiter + delimiter.join(cells))
+
+    with open(path, "w", encoding="utf-8") as csv_file:
+        csv_file.write("\n".join(lines) + "\n")
+
+
+def bench_weapon_csv(args):
+    """
+    Compares reading the weapon DPS csv the old way (float() per cell,
+    comma separated only) against the dialect detecting reader, on clean
+    and Excel mangled files.
+    """
+    import csv
+    import logging
+
+    from weapons import weapon_file_reader
+
+    # The mangled file logs a diagnostic per empty cell
+    logging.disable(logging.WARNING)
+
+    def legacy(path):
+        with open(path) as csv_file:
+            armour_types = None
+            weapons_dict = {}
+            for line in csv.reader(csv_file, delimiter=","):
+                if not armour_types and line[0] == "File":
+                    armour_types = line[1:]
+                if ".rgd" not in line[0]:
+                    continue
+                weapons_dict[line[0].replace(".rgd", ".lua")] = dict(zip(armour_types, [float(num) for num in line[1:]]))
+        return weapons_dict
+
+    def current(path):
+        return weapon_file_reader(path)[1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        clean_path = os.path.join(directory, "clean.csv")
+        dirty_path = os.path.join(directory, "dirty.csv")
+        write_synthetic_weapon_csv(clean_path, args.csv_rows, args.armour_types)
+        write_synthetic_weapon_csv(dirty_path, args.csv_rows, args.armour_types, dirty=True)
+
+        assert legacy(clean_path) == current(clean_path)
+
+        cells = args.csv_rows * args.armour_types
+        print(f"Reading {args.csv_rows} weapons x {args.armour_types} armour types")
+        results = [
+            ("legacy (clean)", lambda: legacy(clean_path)),
+            ("detecting (clean)", lambda: current(clean_path)),
+            ("detecting (semicolons, decimal commas)", lambda: current(dirty_path))
+        ]
+        for name, function in results:
+            seconds = time_call(function, args.repeat)
+            print(f"{name:40} {seconds:8.3f}s {args.csv_rows / seconds:12.0f} rows/s {cells / seconds:12.0f} cells/s")
+
+
+def make_troop_lua(rng, weapons: list, fuzz: bool=False):
+    """
+    Creates a synthetic Corsix troop dump, shaped like the real ones with
+    many keys that aren't read.
+
+    :param rng: the random.Random to use
+    :param weapons: the weapon files to choose from
+    :param fuzz: whether to vary the layout the way other tools and hand
+                    edits do (spacing, quoting, line breaks, CRLF, table
+                    constructors, comments)
+    :returns: (the lua text, the expected (name, weapons, stats))
+    """
+    name = f"Troop {rng.randrange(10 ** 6)}"
+    troop_weapons = rng.sample(weapons, rng.randint(1, 4))
+    stats = {
+        "health": float(rng.randint(50, 5000)),
+        "requisition": float(rng.randint(0, 500)),
+        "power": float(rng.randint(0, 300)),
+        "squad_size": float(rng.randint(1, 12))
+    }
+    stat_paths = {
+        "health": ("health_ext", "hitpoints"),
+        "requisition": ("cost_ext", "time_cost", "cost", "requisition"),
+        "power": ("cost_ext", "time_cost", "cost", "power"),
+        "squad_size": ("squad_loadout_ext", "unit_max")
+    }
+
+    assignments = [(("ui_ext", "screen_name_id"), "string", "$15000023", name)]
+    for hardpoint, weapon in enumerate(troop_weapons, 1):
+        path = ("combat_ext", "hardpoints", f"hardpoint_{hardpoint:02}", "weapon_table", "weapon_01", "weapon")
+        assignments.append((path, "string", f"weapon\\{weapon}", None))
+    assignments.append((("combat_ext", "hardpoints", "hardpoint_09", "weapon_table", "weapon_01", "weapon"),
+                        "string", "", None))
+    for stat, path in stat_paths.items():
+        assignments.append((path, "number", stats[stat], None))
+    for filler in range(120):
+        assignments.append((("misc_ext", f"group_{filler % 7}", f"value_{filler}"), "number", rng.random() * 100, None))
+    rng.shuffle(assignments)
+
+    def quote(value):
+        if not fuzz:
+            return f"[[{value}]]"
+        style = rng.randrange(4)
+        if style == 0:
+            return f"[[{value}]]"
+        if style == 1:
+            return '"' + value.replace("\\", "\\\\") + '"'
+        if style == 2:
+            return f"[==[{value}]==]"
+        return f"Reference([[{value}]])"
+
+    def format_number(value):
+        return f"{value:.5f}" if not fuzz or rng.random() < 0.5 else repr(value)
+
+    if fuzz and rng.random() < 0.3:
+        # Nested table constructors, as written by other tools
+        tree = {}
+        for path, kind, value, comment in assignments:
+            node = tree
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            node[path[-1]] = (kind, value, comment)
+
+        def write_table(node, depth):
+            lines = []
+            for key, item in node.items():
+                indent = "    " * depth
+                field = key if rng.random() < 0.5 else f'["{key}"]'
+                if isinstance(item, dict):
+                    lines.append(f"{indent}{field} = {{")
+                    lines += write_table(item, depth + 1)
+                    lines.append(f"{indent}}},")
+                else:
+                    kind, value, comment = item
+                    text = quote(value) if kind == "string" else format_number(value)
+                    lines.append(f"{indent}{field} = {text}," + (f" -- {comment}" if comment else ""))
+            return lines
+
+        lines = ["GameData = {"] + write_table(tree, 1) + ["}"]
+    else:
+        lines = ["GameData = Inherit([[ebps\\races\\orks\\troops\\base.nil]])"]
+        for path, kind, value, comment in assignments:
+            key = "".join(f'["{part}"]' for part in path)
+            text = quote(value) if kind == "string" else format_number(value)
+            equals = " = "
+            if fuzz:
+                key = key.replace("][", rng.choice(["][", "] [", "]\t["]))
+                equals = rng.choice([" = ", "=", "  =\t", " =\n    "])
+                if rng.random() < 0.05:
+                    lines.append("-- a comment with GameData[\"x\"] = [[not a value]]")
+                if rng.random() < 0.02:
+                    lines.append("--[[ a long comment\n spanning = lines ]]")
+            lines.append(f"GameData{key}{equals}{text}" + (f" -- {comment}" if comment else ""))
+
+    line_ending = "\r\n" if fuzz and rng.random() < 0.3 else "\n"
+    expected = (name, set(troop_weapons), stats)
+    return line_ending.join(lines) + line_ending, expected
+
+
+def bench_lua_parser(args):
+    """
+    Compares the old line based key/value heuristics against the lua
+    tokenizer, for speed on clean Corsix dumps and correctness on a
+    fuzzed corpus.
+    """
+    import troops
+
+    rng = random.Random(0)
+    weapons = [f"weapon_{i}.lua" for i in range(500)]
+    troops.WEAPONS = dict.fromkeys(weapons)
+    stat_keys = {stat: key for key, stat in troops.TROOP_STAT_KEYS.items()}
+
+    def legacy(lua_text):
+        name = None
+        found_weapons = set()
+        found_stats = {"health": 0.0, "requisition": 0.0, "power": 0.0, "squad_size": 1}
+        for line in lua_text.splitlines(True):
+            value_index = line.find("=")
+            key = ""
+            key_start = line[:value_index].find("[")
+            while key_start >= 0:
+                key_end = line[:value_index].find("]", key_start)
+                if key_end < 0:
+                    # The old code looped forever on an unclosed [
+                    break
+                key += line[:value_index][key_start:key_end + 1]
+                key_start = line[:value_index].find("[", key_end)
+            value = line[value_index + 2:].strip().strip("[]()")
+            value = value[value.rfind("\\") + 1:]
+            if "screen_name_id" in key and line.find("--") >= 0:
+                name = line[line.find("--") + 2:].strip()
+            if key in troops.TROOP_STAT_KEYS:
+                try:
+                    found_stats[troops.TROOP_STAT_KEYS[key]] = float(line[value_index + 1:].split("--")[0].strip())
+                except ValueError:
+                    pass
+            elif "weapon_table" in key and value in troops.WEAPONS:
+                found_weapons.add(value)
+        return name, found_weapons, found_stats
+
+    def current(lua_text):
+        return troops.get_troop_info(lua_text)[:3]
+
+    def is_correct(result, expected):
+        name, found_weapons, found_stats = result
+        expected_name, expected_weapons, expected_stats = expected
+        return (name == expected_name and found_weapons == expected_weapons
+                and all(found_stats[stat] == expected_stats[stat] for stat in stat_keys))
+
+    clean = [make_troop_lua(rng, weapons) for _ in range(args.lua_files)]
+    fuzzed = [make_troop_lua(rng, weapons, fuzz=True) for _ in range(args.lua_files)]
+
+    print(f"Parsing {args.lua_files} troop files")
+    for name, function in (("legacy (line heuristics)", legacy), ("tokenizer", current)):
+        seconds = time_call(lambda: [function(text) for text, _ in clean], args.repeat)
+        clean_correct = sum(is_correct(function(text), expected) for text, expected in clean)
+        fuzzed_correct = sum(is_correct(function(text), expected) for text, expected in fuzzed)
+        print(f"{name:30} {seconds:8.3f}s {args.lua_files / seconds:10.0f} files/s  "
+              f"correct: {clean_correct}/{len(clean)} clean, {fuzzed_correct}/{len(fuzzed)} fuzzed")
+
+
+def bench_whatif(args):
+    """
+    Times what-if edits re-ranking only the counter lists they touch,
+    against scoring every race from scratch.
+    """
+    import logging
+
+    from scoring import calculate_scores
+    from whatif import WhatIf
+
+    logging.disable(logging.INFO)
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(
+        args.races, args.armour_types, args.troops, args.weapons)
+    rows = sum(len(troop["weapons"]) for race_troops in troops_dict.values() for troop in race_troops.values())
+    print(f"{args.races} races, {len(weapons_dict)} weapons, {args.armour_types} armour types, "
+          f"{rows} troop and weapon rows")
+
+    seconds = time_call(lambda: calculate_scores(troops_dict, weapons_dict, armour_types), args.repeat)
+    print(f"{'full rescore':40} {seconds * 1000:10.2f}ms")
+
+    what_if = WhatIf(troops_dict, weapons_dict, armour_types)
+    rng = random.Random(0)
+    weapons = list(weapons_dict)
+    edits = [
+        ("weapon vs one armour type", lambda: what_if.scale_weapon(rng.choice(weapons), 1.2, rng.choice(armour_types))),
+        ("weapon vs every armour type", lambda: what_if.scale_weapon(rng.choice(weapons), 0.8)),
+        ("every weapon vs one armour type", lambda: what_if.scale_armour_type(rng.choice(armour_types), 1.1))
+    ]
+    for name, edit in edits:
+        latencies = []
+        for _ in range(args.edits):
+            start = time.perf_counter()
+            edit()
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"{name:40} p50 {latencies[len(latencies) // 2] * 1000:8.2f}ms  "
+              f"max {latencies[-1] * 1000:8.2f}ms")
+
+
+def bench_troop_index(args):
+    """
+    Times race, armour type and weapon filters on the troop bitsets,
+    against filtering sets of troop filenames, and compares their sizes.
+    """
+    from indexes import TroopSetIndex
+    from metrics import deep_size
+
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(
+        args.races, args.armour_types, args.troops, args.weapons)
+    troop_index = TroopSetIndex.from_troops(troops_dict)
+    print(f"{len(troop_index.troops)} troops, {len(weapons_dict)} weapons, {args.armour_types} armour types")
+
+    # The sets armour_types.py and troops.py keep, keyed the same way
+    race_sets = {race: {(race, troop_file) for troop_file in race_troops}
+                 for race, race_troops in troops_dict.items()}
+    armour_type_sets = {}
+    weapon_sets = {}
+    for race, race_troops in troops_dict.items():
+        for troop_file, troop in race_troops.items():
+            armour_type_sets.setdefault(troop["armour_types"], set()).add((race, troop_file))
+            for weapon in troop["weapons"]:
+                weapon_sets.setdefault(weapon, set()).add((race, troop_file))
+
+    def filter_sets(races, armour_types, weapons):
+        troops = set().union(*(race_sets[race] for race in races))
+        troops &= set().union(*(armour_type_sets.get(armour_type, set()) for armour_type in armour_types))
+        return troops & set().union(*(weapon_sets.get(weapon, set()) for weapon in weapons))
+
+    rng = random.Random(0)
+    races = list(troops_dict)
+    weapons = list(weapons_dict)
+    filters = [(rng.sample(races, len(races) // 2), rng.sample(armour_types, len(armour_types) // 4),
+                rng.sample(weapons, len(weapons) // 10)) for _ in range(args.edits)]
+    for troop_filter in filters:
+        assert set(troop_index.get_troops(troop_index.select(*troop_filter))) == filter_sets(*troop_filter)
+
+    seconds = time_call(lambda: [filter_sets(*troop_filter) for troop_filter in filters], args.repeat)
+    print(f"{'sets':20} {seconds / len(filters) * 1e6:10.1f}us per filter  "
+          f"{deep_size((race_sets, armour_type_sets, weapon_sets)) / 2 ** 20:8.2f}MB")
+    seconds = time_call(lambda: [troop_index.select(*troop_filter) for troop_filter in filters], args.repeat)
+    bitsets = (troop_index.races, troop_index.armour_types, troop_index.weapons)
+    print(f"{'bitsets':20} {seconds / len(filters) * 1e6:10.1f}us per filter  "
+          f"{deep_size(bitsets) / 2 ** 20:8.2f}MB")
+    seconds = time_call(lambda: [troop_index.get_troops(troop_index.select(*troop_filter))
+                                 for troop_filter in filters], args.repeat)
+    print(f"{'bitsets, listed':20} {seconds / len(filters) * 1e6:10.1f}us per filter")
+    print(f"{'on disk':20} {len(encode_json(troop_index.to_json(), False)) / 2 ** 10:10.1f}KB")
+
+
+def bench_skyline(args):
+    """
+    Times finding the skyline and dominance depths of one race's troop and
+    weapon pairs, as the number of pairs grows, for DPS shaped like real
+    weapons and for unrelated random DPS (where almost every pair is on
+    the skyline).
+    """
+    from skyline import dominance_depths
+
+    rng = random.Random(0)
+    # Real weapons mostly differ in damage, with each kind of weapon
+    # (anti-infantry, anti-vehicle, ...) piercing the armour types the same way
+    profiles = [[rng.choice((0.1, 0.25, 0.5, 1.0)) for _ in range(args.armour_types)] for _ in range(12)]
+    print(f"{args.armour_types} armour types, {len(profiles)} kinds of weapon")
+
+    rows = 1000
+    while rows <= args.skyline_rows:
+        shaped = list({tuple(round(damage * piercing, 2) for piercing in rng.choice(profiles))
+                       for damage in (rng.uniform(1, 200) for _ in range(rows))})
+        unrelated = list({tuple(rng.random() for _ in range(args.armour_types)) for _ in range(rows)})
+        for name, vectors in (("weapon shaped", shaped), ("random", unrelated)):
+            start = time.perf_counter()
+            depths = dominance_depths(vectors)
+            seconds = time.perf_counter() - start
+            print(f"{len(vectors):7} pairs {name:14} {seconds:8.3f}s  {depths.count(0):7} on the skyline, "
+                  f"{max(depths) + 1:4} depths")
+        rows *= 4
+
+
+def bench_army(args):
+    """
+    Times optimising an army against random opposing armies, and how far
+    the armies found are from the bound on the best possible army.
+    """
+    from army import optimise_army
+
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(
+        args.races, args.armour_types, args.troops, args.weapons)
+    counters = {
+        race: calculate_race_counters(race_troops, weapons_dict, armour_types)
+        for race, race_troops in troops_dict.items()
+    }
+    races = list(troops_dict)
+    print(f"{args.races} races, {args.troops} troops per race, {args.armour_types} armour types, "
+          f"{args.army_squads} opposing squads, budget {args.budget}, squad cap {args.squad_cap}")
+
+    rng = random.Random(0)
+    for objective in ("dps", "time_to_kill"):
+        latencies = []
+        gaps = []
+        for _ in range(args.armies):
+            opponent_race = rng.choice(races)
+            opponents = [(opponent_race, rng.choice(list(troops_dict[opponent_race])), rng.randint(1, 3))
+                         for _ in range(args.army_squads)]
+            start = time.perf_counter()
+            result = optimise_army(troops_dict, counters, rng.choice(races), opponents,
+                                   args.budget, args.squad_cap, objective)
+            latencies.append(time.perf_counter() - start)
+            if result["value"] and result["bound"] is not None:
+                gaps.append(abs(result["value"] - result["bound"]) / result["value"])
+
+        latencies.sort()
+        gaps.sort()
+        print(f"{objective:15} p50 {latencies[len(latencies) // 2] * 1000:8.2f}ms  "
+              f"max {latencies[-1] * 1000:8.2f}ms  "
+              f"gap to bound p50 {gaps[len(gaps) // 2]:6.2%}  max {gaps[-1]:6.2%}")
+
+
+def add_duplicate_damages(weapons_dict: dict, armour_types: list, fraction: float, seed: int=0):
+    """
+    Copies DPS rows and columns the way big mods repeat them, with weapon
+    upgrades and cosmetic copies doing the same DPS as another weapon and
+    armour types every weapon does the same DPS against.
+
+    :param weapons_dict: the weapons to change in place
+    :param armour_types: the armour types
+    :param fraction: the fraction of weapons and armour types to copy
+    :param seed: the random seed
+    """
+    rng = random.Random(seed)
+    weapons = list(weapons_dict)
+    for weapon in rng.sample(weapons, int(len(weapons) * fraction)):
+        weapons_dict[weapon] = dict(weapons_dict[rng.choice(weapons)])
+
+    for armour_type in rng.sample(armour_types, int(len(armour_types) * fraction)):
+        copied_armour_type = rng.choice(armour_types)
+        for damages in weapons_dict.values():
+            damages[armour_type] = damages[copied_armour_type]
+
+
+def bench_counters(args):
+    """
+    Measures how the counters stage scales from 1 to N processes with the
+    class DPS in shared memory, against ranking every weapon and armour
+    type separately in a single process. Also compares how much is sent to
+    the processes against pickling every weapon to each of them.
+    """
+    import logging
+    import pickle
+
+    from generate_data import DamageClasses, calculate_counters_in_parallel, rank_race_counters
+
+    logging.disable(logging.INFO)
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(
+        args.races, args.armour_types, args.troops, args.weapons)
+    add_duplicate_damages(weapons_dict, armour_types, args.duplicates)
+
+    def serial():
+        return sort_counters({
+            race: calculate_race_counters(race_troops, weapons_dict, armour_types)
+            for race, race_troops in troops_dict.items()
+        })
+
+    def deduplicated():
+        damage_classes = DamageClasses(weapons_dict, armour_types)
+        return {race: rank_race_counters(race_troops, damage_classes) for race, race_troops in troops_dict.items()}
+
+    naive_bytes = len(pickle.dumps(weapons_dict)) * len(troops_dict)
+    shared_bytes = sum(
+        len(pickle.dumps([(troop, weapon, 0) for troop in race_troops for weapon in race_troops[troop]["weapons"]]))
+        for race_troops in troops_dict.values())
+    print(f"{args.races} races, {len(weapons_dict)} weapons, {args.armour_types} armour types, {os.cpu_count()} CPUs")
+    print(f"Sent to the processes: {naive_bytes / 1e6:.1f}MB pickling the weapons to each race, "
+          f"{shared_bytes / 1e6:.2f}MB with the weapons in shared memory")
+
+    damage_classes = DamageClasses(weapons_dict, armour_types)
+    print(f"{len(weapons_dict)} weapons in {damage_classes.class_count} DPS classes, {len(armour_types)} armour "
+          f"types in {len(damage_classes.unique_columns)} classes")
+
+    expected = serial()
+    seconds = time_call(serial, args.repeat)
+    print(f"{'without classes':20} {seconds:8.3f}s")
+    assert deduplicated() == expected
+    deduplicated_seconds = time_call(deduplicated, args.repeat)
+    print(f"{'single process':20} {deduplicated_seconds:8.3f}s {seconds / deduplicated_seconds:6.2f}x")
+
+    processes = 1
+    while processes <= args.max_processes:
+        assert calculate_counters_in_parallel(troops_dict, damage_classes, processes) == expected
+        parallel_seconds = time_call(
+            lambda: calculate_counters_in_parallel(troops_dict, DamageClasses(weapons_dict, armour_types),
+                                                   processes), args.repeat)
+        print(f"{f'{processes} processes':20} {parallel_seconds:8.3f}s {seconds / parallel_seconds:6.2f}x")
+        processes *= 2
+
+
+def bench_logging(args):
+    """
+    Times logging a per-file debug message the way the hot loops used to
+    (an f-string to a file handler) against %-style formatting through a
+    queue and against counting the file into a stage summary, with the
+    log level at DEBUG and at INFO.
+    """
+    import logging
+
+    from logs import LOG_FORMAT, StageSummary, create_queue_handler
+
+    paths = [f"input/race_{path % 12}/troop_{path}.lua" for path in range(args.log_messages)]
+    with tempfile.TemporaryDirectory() as directory:
+        def create_file_handler():
+            file_handler = logging.FileHandler(os.path.join(directory, "benchmark.log"), "w", encoding="utf-8")
+            file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            return file_handler
+
+        def log_f_strings(logger):
+            for path in paths:
+                logger.debug(f"Reading data from lua file ({path})")
+
+        def log_lazily(logger):
+            for path in paths:
+                logger.debug("Reading data from lua file (%s)", path)
+
+        def log_summary(logger):
+            summary = StageSummary()
+            for path in paths:
+                summary.count_file("lua files read", len(path))
+            logger.info("Finished stage %s: %s", "troops", summary.files)
+
+        print(f"{args.log_messages} debug messages, time spent in the thread logging them")
+        for level in ("DEBUG", "INFO"):
+            for name, queued, log in (("file handler, f-string", False, log_f_strings),
+                                      ("file handler, %-style", False, log_lazily),
+                                      ("queue, %-style", True, log_lazily),
+                                      ("queue, stage summary", True, log_summary)):
+                logger = logging.getLogger(f"benchmark.{level}.{name}")
+                logger.propagate = False
+                logger.setLevel(level)
+                file_handler = create_file_handler()
+                if queued:
+                    handler, listener = create_queue_handler(file_handler)
+                else:
+                    handler, listener = file_handler, None
+                logger.addHandler(handler)
+
+                start = time.perf_counter()
+                log(logger)
+                seconds = time.perf_counter() - start
+                if listener is not None:
+                    listener.stop()
+                written_seconds = time.perf_counter() - start
+
+                logger.removeHandler(handler)
+                file_handler.close()
+                print(f"{level:6} {name:25} {seconds * 1e6 / len(paths):8.2f}us per message  "
+                      f"(all written after {written_seconds * 1000:8.2f}ms)")
+
+
+def build_counter_requests(config: dict, count: int, seed: int=0):
+    """
+    Builds random /counters requests from the troops in the data files.
+
+    :param config: the configuration for the program
+    :param count: the number of requests to build
+    :param seed: the random seed
+    :returns: a list of request targets
+    """
+    rng = random.Random(seed)
+    troops_dict = load_from_json(config["data"]["troops"])
+    races = list(troops_dict)
+    troops = [(race, troop_file) for race in races for troop_file in troops_dict[race]]
+
+    requests = []
+    for _ in range(count):
+        opponent_race, troop_file = rng.choice(troops)
+        params = {"player_race": rng.choice(races), "opponent_race": opponent_race, "troop": troop_file, "k": 10}
+        requests.append(f"/counters?{urlencode(params)}")
+
+    return requests
+
+
+async def run_load_test(host: str, port: int, requests: list, connections: int):
+    """
+    Sends requests over several keep-alive connections at once.
+
+    :param host: the host of the service
+    :param port: the port of the service
+    :param requests: the request targets to send
+    :param connections: the number of connections to send them over
+    :returns: (a list of latencies in seconds, a count of each status code)
+    """
+    latencies = []
+    statuses = {}
+
+    async def client(targets):
+        reader, writer = await asyncio.open_connection(host, port)
+        for target in targets:
+            start = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            content_length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    content_length = int(value)
+            await reader.readexactly(content_length)
+
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+
+    await asyncio.gather(*(client(requests[index::connections]) for index in range(connections)))
+    return latencies, statuses
+
+
+def bench_server(args):
+    """
+    Load tests a running query service (python server.py) and reports
+    the latency percentiles.
+    """
+    config = load_from_json(args.config, True)
+    requests = build_counter_requests(config, args.requests)
+
+    start = time.perf_counter()
+    latencies, statuses = asyncio.run(run_load_test(args.host, args.port, requests, args.connections))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(fraction):
+        return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+    print(f"{len(latencies)} requests over {args.connections} connections in {seconds:.2f}s "
+          f"({len(latencies) / seconds:.0f} requests/s), statuses: {statuses}")
+    print(f"p50 {percentile(0.5):.2f}ms  p90 {percentile(0.9):.2f}ms  "
+          f"p99 {percentile(0.99):.2f}ms  max {latencies[-1] * 1000:.2f}ms")
+
+
+BENCHMARKS = {
+    "json": bench_json_write,
+    "server": bench_server,
+    "csv": bench_weapon_csv,
+    "lua": bench_lua_parser,
+    "whatif": bench_whatif,
+    "army": bench_army,
+    "counters": bench_counters,
+    "troopIndex": bench_troop_index,
+    "logging": bench_logging,
+    "skyline": bench_skyline,
+}
+
+
+def main(args: list=None):
+    parser = argparse.ArgumentParser(description="Run a DoW Troop Counters benchmark.")
+    parser.add_argument("benchmark", choices=list(BENCHMARKS))
+    parser.add_argument("--races", type=int, default=12)
+    parser.add_argument("--armour-types", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=1000, help="rows per race and armour type")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv-rows", type=int, default=50000, help="the number of weapons (csv)")
+    parser.add_argument("--lua-files", type=int, default=2000, help="the number of troop files (lua)")
+    parser.add_argument("--troops", type=int, default=150, help="the number of troops per race (whatif, troopIndex)")
+    parser.add_argument("--weapons", type=int, default=300, help="the number of weapons per race (whatif)")
+    parser.add_argument("--edits", type=int, default=200, help="the number of edits (whatif) or filters (troopIndex) to time")
+    parser.add_argument("--duplicates", type=float, default=0.3,
+                        help="the fraction of weapons and armour types copying another's DPS (counters)")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count(),
+                        help="the most processes to scale to (counters)")
+    parser.add_argument("--armies", type=int, default=50, help="the number of opposing armies (army)")
+    parser.add_argument("--army-squads", type=int, default=10, help="the squads in each opposing army (army)")
+    parser.add_argument("--budget", type=float, default=5000, help="the army budget (army)")
+    parser.add_argument("--squad-cap", type=int, default=20, help="the army squad cap (army)")
+    parser.add_argument("--skyline-rows", type=int, default=16000,
+                        help="the most troop and weapon pairs to find the skyline of (skyline)")
+    parser.add_argument("--log-messages", type=int, default=20000, help="the number of messages to log (logging)")
+    parser.add_argument("--config", default="config.json", help="the config file (server)")
+    parser.add_argument("--host", default="127.0.0.1", help="the query service host (server)")
+    parser.add_argument("--port", type=int, default=8080, help="the query service port (server)")
+    parser.add_argument("--requests", type=int, default=20000, help="the number of requests to send (server)")
+    parser.add_argument("--connections", type=int, default=16, help="the number of connections (server)")
+    args = parser.parse_args(args)
+
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+A content-addressed cache of generated data.
+
+The key for a set of generated data is a hash of everything that goes
+into generating it: the weapon DPS csv, every troop .lua file, the race
+names, data files and output settings in the config, the JSON encoder
+and the source of the modules that generate the data. Two runs with the
+same inputs and code give the same key, so generation can be skipped and
+the cached data files copied into place instead.
+
+It also holds a cache of parsed troop files, so that when only some
+troop files change (e.g. a mod patch) only those files are parsed again.
+"""
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+from pathlib import Path
+
+from file_handlers import get_json_encoder_name, write_atomically
+
+# Bump this whenever a change to the data generation changes its output
+# other than through the generating modules' source, e.g. a dependency
+CACHE_VERSION = 2
+# Bump this whenever a change to the troop file parsing changes its output
+# other than through the parsing modules' source
+PARSE_CACHE_VERSION = 2
+# The modules whose source is hashed into the cache keys, so a code change
+# can never return stale cached data
+GENERATING_MODULES = ("armour_types", "cache", "database", "file_handlers", "generate_data", "indexes",
+                      "lua_parser", "scoring", "skyline", "troops", "validation", "weapons")
+PARSING_MODULES = ("lua_parser", "troops")
+PARSE_CACHE_FILE = "parsed_troops.pickle"
+# Files modified more recently than this could change again without
+# their modification time changing, so they aren't cached
+RACY_NANOSECONDS = 2 * 10 ** 9
+# Config settings that change the generated data, hashed along with the
+# inputs. Add any new setting that changes the output here
+OUTPUT_CONFIG_KEYS = ("skylineMetric",)
+# Data files recording the generation itself rather than its output, so
+# they are written fresh instead of being copied from the cache
+UNCACHED_DATA_FILES = ("manifest",)
+
+
+@functools.lru_cache(maxsize=None)
+def get_source_hash(modules: tuple):
+    """
+    Hashes the source of some of the program's modules.
+
+    :param modules: the names of the modules, next to this one
+    :returns: the hash as a hex string
+    """
+    source_hash = hashlib.sha256()
+    directory = Path(__file__).resolve().parent
+    for module in modules:
+        source = (directory / f"{module}.py").read_bytes()
+        source_hash.update(f"{module} {len(source)}\n".encode("utf-8"))
+        source_hash.update(source)
+
+    return source_hash.hexdigest()
+
+
+def get_input_hash(config: dict):
+    """
+    Hashes every input that affects the generated data.
+
+    :param config: the configuration for the program
+    :returns: the hash as a hex string
+    """
+    input_hash = hashlib.sha256()
+
+    def add(value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        # Length prefixed so that neighbouring values can't run together
+        input_hash.update(len(value).to_bytes(8, "little"))
+        input_hash.update(value)
+
+    add(f"cache version {CACHE_VERSION}")
+    add(get_source_hash(GENERATING_MODULES))
+    add(get_json_encoder_name())
+    for data_file in sorted(config["data"]):
+        add(data_file)
+    for key in OUTPUT_CONFIG_KEYS:
+        add(key)
+        add(repr(config.get(key)))
+
+    add(Path(config["corsixWeaponDPS"]).read_bytes())
+
+    for race_name, race_troops_directory in config["troops"].items():
+        add(race_name)
+        race_troops_path = Path(race_troops_directory)
+        troop_paths = sorted(race_troops_path.glob("*.lua")) if race_troops_path.exists() else []
+        for troop_path in troop_paths:
+            add(troop_path.name)
+            add(troop_path.read_bytes())
+
+    return input_hash.hexdigest()
+
+
+def get_cache_entry(config: dict, input_hash: str):
+    """
+    Gets the cache directory for a set of inputs.
+
+    :param config: the configuration for the program
+    :param input_hash: the hash of the inputs
+    :returns: the Path of the cache entry directory
+    """
+    return Path(config["cacheDirectory"]) / input_hash
+
+
+def load_from_cache(config: dict, input_hash: str):
+    """
+    Copies cached data files into place if they exist for these inputs.
+
+    :param config: the configuration for the program
+    :param input_hash: the hash of the inputs
+    :returns: whether or not the cached data was used
+    """
+    cache_entry = get_cache_entry(config, input_hash)
+    cached_files = {
+        data_file: cache_entry / f"{data_file}{Path(data_path).suffix}"
+        for data_file, data_path in config["data"].items() if data_file not in UNCACHED_DATA_FILES
+    }
+
+    if not all(cached_file.exists() for cached_file in cached_files.values()):
+        return False
+
+    logging.info(f"Using cached data ({cache_entry})")
+    for data_file, cached_file in cached_files.items():
+        write_atomically(config["data"][data_file], cached_file.read_bytes())
+
+    return True
+
+
+def save_to_cache(config: dict, input_hash: str):
+    """
+    Copies the generated data files into the cache. The cache entry is
+    built in a temporary directory and renamed into place so that a
+    half-built entry is never used.
+
+    :param config: the configuration for the program
+    :param input_hash: the hash of the inputs
+    """
+    cache_entry = get_cache_entry(config, input_hash)
+    if cache_entry.exists():
+        return
+
+    cache_entry.parent.mkdir(parents=True, exist_ok=True)
+    temp_entry = Path(tempfile.mkdtemp(dir=cache_entry.parent, prefix=f".{input_hash}."))
+    try:
+        for data_file, data_path in config["data"].items():
+            if data_file in UNCACHED_DATA_FILES:
+                continue
+            shutil.copyfile(data_path, temp_entry / f"{data_file}{Path(data_path).suffix}")
+        os.replace(temp_entry, cache_entry)
+        logging.info(f"Saved generated data to cache ({cache_entry})")
+    except OSError as e:
+        # Another run may have saved the same entry first
+        shutil.rmtree(temp_entry, ignore_errors=True)
+        if not cache_entry.exists():
+            logging.warning(f"Failed to save generated data to cache: {e}")
+
+
+def get_parse_cache_version():
+    """
+    :returns: the version of the parsed troop cache, which changes with
+                the parsing modules' source
+    """
+    return f"{PARSE_CACHE_VERSION} {get_source_hash(PARSING_MODULES)}"
+
+
+class ParseCache():
+    """
+    A persistent cache of parsed files, keyed by each file's path,
+    modification time and size.
+    """
+
+    def __init__(self, cache_directory: str):
+        """
+        :param cache_directory: the directory to keep the cache in
+        """
+        self.path = Path(cache_directory) / PARSE_CACHE_FILE
+        self.entries = self.load()
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """
+        Loads the cache from disk.
+
+        :returns: a dictionary mapping file paths to (mtime, size, parsed
+                    value), empty if there is no usable cache
+        """
+        try:
+            with open(self.path, "rb") as cache_file:
+                version, entries = pickle.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable parse cache ({self.path}): {e}")
+            return {}
+
+        if version != get_parse_cache_version():
+            logging.info("Ignoring parse cache from another version")
+            return {}
+
+        return entries
+
+    def get(self, file_path: str, parse):
+        """
+        Gets a file's parsed value from the cache, parsing it if it isn't
+        cached or has changed.
+
+        :param file_path: the path to the file
+        :param parse: the function to parse the file with
+        :returns: the parsed value
+        """
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        value = parse(file_path)
+        if time.time_ns() - stat.st_mtime_ns > RACY_NANOSECONDS:
+            self.entries[key] = (stat.st_mtime_ns, stat.st_size, value)
+            self.changed = True
+
+        return value
+
+    def save(self):
+        """
+        Saves the cache to disk if anything was added. Entries saved by
+        other runs in the meantime (e.g. other profiles) are kept, unless
+        their file has been deleted.
+        """
+        logging.info(f"Parse cache: {self.hits} hit(s), {self.misses} miss(es)")
+        if not self.changed:
+            return
+
+        entries = {key: entry for key, entry in self.load().items() if os.path.exists(key)}
+        entries.update(self.entries)
+        try:
+            write_atomically(str(self.path), pickle.dumps((get_parse_cache_version(), entries), pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            # The cache only saves time, so it's fine to carry on without it
+            logging.warning(f"Failed to save the parse cache: {e}")
+            return
+
+        self.entries = entries
+        self.changed = False
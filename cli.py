@@ -0,0 +1,370 @@
+"""
+A command line interface for generating and querying the data without
+the GUI.
+
+Usage:
+    python cli.py generate [--stages weapons,troops,...] [--no-cache] [--profile NAME ... | --all-profiles]
+    python cli.py watch [--interval 1.0] [--debounce 0.5] [--poll]
+    python cli.py query --player-race RACE (--armour-type TYPE | --opponent-race RACE --troop TROOP)
+    python cli.py batch [--input FILE] [--output FILE]
+    python cli.py army --player-race RACE --opponent "RACE:TROOP:COUNT" ... (--budget N | --squad-cap N)
+    python cli.py troops [--race RACE ...] [--armour-type TYPE ...] [--weapon WEAPON ...]
+    python cli.py skyline --player-race RACE [--metric dps] [--max-depth 0]
+
+Batch mode reads one JSON query per line, e.g.
+    {"player_race": "Orks", "opponent_race": "Eldar", "troop": "Guardian", "k": 5}
+    {"profile": "UA Salcol", "player_race": "Orks", "armour_type": "infantry_low"}
+and writes one JSON result per line.
+
+`python cli.py --metrics COMMAND ...` prints how long each step took when
+the command finishes.
+"""
+import argparse
+import json
+import sys
+
+import generate_data
+import metrics
+import watcher
+
+from army import OBJECTIVES, ArmyError, optimise_army
+
+from file_handlers import PathNotFoundError, load_from_json
+from indexes import TroopSetIndex, count_bits, load_troop_index
+from profiles import ProfileNotFoundError, get_profile_names, load_profile_config
+from query import CounterQuery, QueryError, load_counter_queries
+from scoring import METRICS, METRIC_LABELS
+from skyline import SKYLINE_METRICS, SkylineError, calculate_race_skyline
+
+QUERY_FIELDS = ("player_race", "armour_type", "opponent_race", "troop", "k", "metric")
+
+
+def generate(args):
+    """
+    Runs the data generation, optionally only some of the stages.
+    """
+    stages = args.stages.split(",") if args.stages else None
+    unknown_stages = set(stages or []) - generate_data.STAGES.keys()
+    if unknown_stages:
+        sys.exit(f"Error: unknown stage(s): {', '.join(sorted(unknown_stages))}")
+
+    profiles = args.profile
+    if args.all_profiles:
+        profiles = get_profile_names(load_from_json(args.config, True))
+
+    if profiles and len(profiles) > 1:
+        if stages:
+            sys.exit("Error: stages can only be selected when generating a single profile")
+        generate_data.run_profiles(profiles, not args.no_cache, args.config, args.processes)
+    else:
+        profile = profiles[0] if profiles else None
+        generate_data.run(use_cache=not args.no_cache, stages=stages, config_path=args.config, profile=profile)
+
+
+def watch(args):
+    """
+    Watches the input files and regenerates the data when they change.
+    """
+    watcher.watch(args.config, args.interval, args.debounce, args.poll, args.profile)
+
+
+def query(args):
+    """
+    Answers a single counter query.
+    """
+    try:
+        counter_query = CounterQuery.from_config(load_profile_config(args.config, args.profile))
+        result = counter_query.counters(args.player_race, args.armour_type, args.opponent_race,
+                                        args.troop, args.k, args.metric)
+    except (QueryError, ProfileNotFoundError, PathNotFoundError) as e:
+        sys.exit(f"Error: {e}")
+
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    print(f"Counters to {result['armour_type']} by {METRIC_LABELS[args.metric]}:")
+    for rank, counter in enumerate(result["counters"], 1):
+        value = counter[args.metric]
+        value = "-" if value is None else f"{value:.1f}"
+        print(f"{rank:4}. {counter['display_name']} ({counter['troop_file']}) - {counter['weapon']} - {value}")
+
+
+def batch(args):
+    """
+    Answers a JSON query per line, loading the data only once.
+    """
+    config = load_from_json(args.config, True)
+    profiles = args.profile or [None]
+    try:
+        counter_queries = load_counter_queries(config, profiles)
+    except (ProfileNotFoundError, PathNotFoundError) as e:
+        sys.exit(f"Error: {e}")
+
+    input_file = open(args.input, "r") if args.input else sys.stdin
+    output_file = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for line in input_file:
+            if line.strip():
+                output_file.write(answer_query_line(counter_queries, profiles[0], line))
+                output_file.write("\n")
+    finally:
+        if args.input:
+            input_file.close()
+        if args.output:
+            output_file.close()
+
+
+def army(args):
+    """
+    Finds the mix of squads that best counters an opposing army.
+    """
+    try:
+        opponents = [parse_opponent(opponent) for opponent in args.opponent]
+        config = load_profile_config(args.config, args.profile)
+        troops_dict = load_from_json(config["data"]["troops"])
+        counters = load_from_json(config["data"]["counters"])
+        result = optimise_army(troops_dict, counters, args.player_race, opponents,
+                               args.budget, args.squad_cap, args.objective)
+    except (ArmyError, ProfileNotFoundError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    if result["unkillable"]:
+        print(f"Nothing in {args.player_race} can damage: {', '.join(result['unkillable'])}")
+
+    value = result["value"]
+    bound = result["bound"]
+    if args.objective == "dps":
+        print(f"Army DPS (weighted by the opponent's health): {value:.1f} (best possible <= {bound:.1f})")
+    elif value is None:
+        print("The army can't kill every squad")
+    else:
+        bound = "unknown" if bound is None else f"{bound:.1f}s"
+        print(f"Time to kill the whole army: {value:.1f}s (best possible >= {bound})")
+    print(f"Cost {result['cost']:.0f}, {result['squads']} squads:")
+    for squad in result["army"]:
+        print(f"{squad['count']:4} x {squad['display_name']} ({squad['troop_file']}) - {squad['weapon']}")
+
+
+def troops(args):
+    """
+    Lists the troops in any of the given races, with any of the given
+    armour types and using any of the given weapons.
+    """
+    try:
+        config = load_profile_config(args.config, args.profile)
+    except ProfileNotFoundError as e:
+        sys.exit(f"Error: {e}")
+
+    if "troopIndex" in config["data"]:
+        troop_index = load_troop_index(config["data"]["troopIndex"])
+    else:
+        troop_index = TroopSetIndex.from_troops(load_from_json(config["data"]["troops"]))
+
+    bits = troop_index.select(args.race, args.armour_type, args.weapon)
+    if args.count_by:
+        bitsets = {"race": troop_index.races, "armour_type": troop_index.armour_types,
+                   "weapon": troop_index.weapons}[args.count_by]
+        result = troop_index.count_by(bits, bitsets)
+    else:
+        result = [{"race": race, "troop_file": troop_file} for race, troop_file in troop_index.get_troops(bits)]
+
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    print(f"{count_bits(bits)} troops")
+    if args.count_by:
+        for name, count in sorted(result.items(), key=lambda item: (-item[1], item[0])):
+            print(f"{count:6} {name}")
+    else:
+        for troop in result:
+            print(f"{troop['race']}: {troop['troop_file']}")
+
+
+def skyline(args):
+    """
+    Lists a race's troop and weapon pairs that nothing else in the race
+    beats against every armour type, and optionally the pairs only beaten
+    by a few layers of others.
+    """
+    try:
+        config = load_profile_config(args.config, args.profile)
+        troops_dict = load_from_json(config["data"]["troops"])
+        if args.player_race not in troops_dict:
+            raise SkylineError(f"Unknown race: {args.player_race}")
+        race_skyline = calculate_race_skyline(troops_dict[args.player_race],
+                                              load_from_json(config["data"]["weapons"]),
+                                              generate_data.get_armour_types(config), args.metric)
+    except (SkylineError, ProfileNotFoundError) as e:
+        sys.exit(f"Error: {e}")
+
+    race_troops = troops_dict[args.player_race]
+    result = [
+        {
+            "troop_file": troop_file,
+            "display_name": race_troops[troop_file]["display_name"],
+            "weapon": weapon,
+            "depth": depth
+        }
+        for depth, (troop_file, weapon) in sorted(zip(race_skyline["depth"], race_skyline["rows"]))
+        if depth <= args.max_depth
+    ]
+
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    print(f"{len(race_skyline['skyline'])} of {len(race_skyline['rows'])} troop and weapon pairs are never beaten "
+          f"against every armour type by {METRIC_LABELS[args.metric]}:")
+    for pair in result:
+        print(f"{pair['depth']:4}  {pair['display_name']} ({pair['troop_file']}) - {pair['weapon']}")
+
+
+def parse_opponent(opponent: str):
+    """
+    Parses an opposing squad given as RACE:TROOP or RACE:TROOP:COUNT.
+
+    :param opponent: the opposing squad
+    :returns: a (race, troop, count) tuple
+    :raises ValueError: when the squad is malformed
+    """
+    parts = opponent.split(":")
+    if len(parts) == 2:
+        return parts[0], parts[1], 1
+    if len(parts) == 3:
+        return parts[0], parts[1], int(parts[2])
+
+    raise ValueError(f"Opponents are given as RACE:TROOP or RACE:TROOP:COUNT, not {opponent}")
+
+
+def answer_query_line(counter_queries: dict, default_profile: str, line: str):
+    """
+    Answers a query given as a line of JSON.
+
+    :param counter_queries: a dictionary mapping each loaded profile to
+                            the CounterQuery to answer its queries with
+    :param default_profile: the profile to use when a query doesn't
+                            give one
+    :param line: the query as a JSON object
+    :returns: the result (or error) as a line of JSON
+    """
+    try:
+        query_fields = json.loads(line)
+        if not isinstance(query_fields, dict):
+            raise QueryError("A query must be a JSON object")
+        unknown_fields = query_fields.keys() - set(QUERY_FIELDS) - {"profile"}
+        if unknown_fields:
+            raise QueryError(f"Unknown query field(s): {', '.join(sorted(unknown_fields))}")
+        if "player_race" not in query_fields:
+            raise QueryError("A query needs a player_race")
+
+        counter_query_fields = dict(query_fields)
+        profile = counter_query_fields.pop("profile", default_profile)
+        if profile not in counter_queries:
+            raise QueryError(f"Profile not loaded: {profile}")
+
+        result = counter_queries[profile].counters(**counter_query_fields)
+        result["query"] = query_fields
+    except (QueryError, ValueError, TypeError) as e:
+        result = {"query": line.strip(), "error": str(e)}
+
+    return json.dumps(result)
+
+
+def main(args: list=None):
+    parser = argparse.ArgumentParser(description="Generate and query DoW Troop Counters data.")
+    parser.add_argument("--config", default="config.json", help="the config file to use")
+    parser.add_argument("--metrics", action="store_true",
+                        help="print how long each step took (and how often it ran) when finished")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="generate the data files")
+    generate_parser.add_argument("--stages", help=f"comma separated stages to run ({','.join(generate_data.STAGES)})")
+    generate_parser.add_argument("--no-cache", action="store_true", help="don't use the generated data cache")
+    generate_parser.add_argument("--profile", action="append",
+                                 help="a config profile to generate (can be given more than once)")
+    generate_parser.add_argument("--all-profiles", action="store_true", help="generate every config profile")
+    generate_parser.add_argument("--processes", type=int,
+                                 help="the most processes to generate profiles with (default: one per CPU)")
+    generate_parser.set_defaults(function=generate)
+
+    watch_parser = subparsers.add_parser("watch", help="regenerate the data when the input files change")
+    watch_parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks for changes")
+    watch_parser.add_argument("--debounce", type=float, default=0.5,
+                              help="seconds the files must stop changing for before regenerating")
+    watch_parser.add_argument("--poll", action="store_true", help="poll the files even if watchdog is installed")
+    watch_parser.add_argument("--profile", help="the config profile to watch")
+    watch_parser.set_defaults(function=watch)
+
+    query_parser = subparsers.add_parser("query", help="find the counters to a troop or armour type")
+    query_parser.add_argument("--player-race", required=True, help="the race you are playing")
+    query_parser.add_argument("--armour-type", help="the armour type to counter")
+    query_parser.add_argument("--opponent-race", help="the race of the troop to counter")
+    query_parser.add_argument("--troop", help="the filename or name of the troop to counter")
+    query_parser.add_argument("-k", type=int, default=10, help="the number of counters to show")
+    query_parser.add_argument("--metric", choices=METRICS, default="dps", help="the metric to rank counters by")
+    query_parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    query_parser.add_argument("--profile", help="the config profile to query")
+    query_parser.set_defaults(function=query)
+
+    batch_parser = subparsers.add_parser("batch", help="answer JSON queries, one per line")
+    batch_parser.add_argument("--input", help="the file to read queries from (default: stdin)")
+    batch_parser.add_argument("--output", help="the file to write results to (default: stdout)")
+    batch_parser.add_argument("--profile", action="append",
+                              help="a config profile to load (can be given more than once, the first is "
+                                   "the default for queries without a profile field)")
+    batch_parser.set_defaults(function=batch)
+
+    army_parser = subparsers.add_parser("army", help="find the army that best counters an opposing army")
+    army_parser.add_argument("--player-race", required=True, help="the race you are playing")
+    army_parser.add_argument("--opponent", action="append", required=True,
+                             help="an opposing squad as RACE:TROOP:COUNT, the troop being a filename or name "
+                                  "(give once for each kind of squad)")
+    army_parser.add_argument("--budget", type=float, help="the most the army can cost (requisition plus power)")
+    army_parser.add_argument("--squad-cap", type=int, help="the most squads the army can have")
+    army_parser.add_argument("--objective", choices=OBJECTIVES, default="dps",
+                             help="maximise DPS weighted by the opponent's health, or minimise the time to kill "
+                                  "the whole army")
+    army_parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    army_parser.add_argument("--profile", help="the config profile to use")
+    army_parser.set_defaults(function=army)
+
+    troops_parser = subparsers.add_parser("troops", help="list the troops matching race, armour type and weapon filters")
+    troops_parser.add_argument("--race", action="append", help="a race to match (can be given more than once)")
+    troops_parser.add_argument("--armour-type", action="append",
+                               help="an armour type to match (can be given more than once)")
+    troops_parser.add_argument("--weapon", action="append",
+                               help="a weapon the troop uses (can be given more than once)")
+    troops_parser.add_argument("--count-by", choices=("race", "armour_type", "weapon"),
+                               help="count the matching troops by race, armour type or weapon instead of listing them")
+    troops_parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    troops_parser.add_argument("--profile", help="the config profile to use")
+    troops_parser.set_defaults(function=troops)
+
+    skyline_parser = subparsers.add_parser("skyline", help="find the troops nothing beats against every armour type")
+    skyline_parser.add_argument("--player-race", required=True, help="the race you are playing")
+    skyline_parser.add_argument("--metric", choices=list(SKYLINE_METRICS), default="dps",
+                                help="the metric to compare troops by")
+    skyline_parser.add_argument("--max-depth", type=int, default=0,
+                                help="also list troops beaten only by this many layers of others")
+    skyline_parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    skyline_parser.add_argument("--profile", help="the config profile to use")
+    skyline_parser.set_defaults(function=skyline)
+
+    args = parser.parse_args(args)
+    if args.metrics:
+        metrics.enable()
+    try:
+        args.function(args)
+    finally:
+        if args.metrics:
+            print(metrics.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
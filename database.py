@@ -0,0 +1,173 @@
+"""
+Exports the generated data to a SQLite database, so that questions the
+GUI doesn't answer can be asked with SQL instead of by walking the JSON.
+
+The database is normalised into:
+ - races, armour_types and weapons -- one row per name
+ - troops -- every troop with its race, armour type, health, cost and
+   squad size
+ - troop_weapons -- which weapons each troop has
+ - weapon_dps -- every weapon's DPS against every armour type
+
+The counters view joins these back together into one row per race,
+troop, weapon and armour type, e.g. the top 10 Ork counters to an armour
+type are:
+
+    SELECT troop_file, weapon, dps FROM counters
+    WHERE race = 'Orks' AND armour_type = 'infantry_heavy_high'
+    ORDER BY dps DESC LIMIT 10
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE races (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE armour_types (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE weapons (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE troops (
+    id INTEGER PRIMARY KEY,
+    race_id INTEGER NOT NULL REFERENCES races (id),
+    troop_file TEXT NOT NULL,
+    display_name TEXT,
+    armour_type_id INTEGER REFERENCES armour_types (id),
+    health REAL,
+    requisition REAL,
+    power REAL,
+    squad_size INTEGER,
+    UNIQUE (race_id, troop_file)
+);
+CREATE TABLE troop_weapons (
+    troop_id INTEGER NOT NULL REFERENCES troops (id),
+    weapon_id INTEGER NOT NULL REFERENCES weapons (id),
+    PRIMARY KEY (troop_id, weapon_id)
+) WITHOUT ROWID;
+CREATE TABLE weapon_dps (
+    weapon_id INTEGER NOT NULL REFERENCES weapons (id),
+    armour_type_id INTEGER NOT NULL REFERENCES armour_types (id),
+    dps REAL NOT NULL,
+    PRIMARY KEY (weapon_id, armour_type_id)
+) WITHOUT ROWID;
+CREATE VIEW counters AS
+    SELECT races.name AS race, troops.troop_file, troops.display_name,
+           weapons.name AS weapon, armour_types.name AS armour_type, weapon_dps.dps
+    FROM troops
+    JOIN races ON races.id = troops.race_id
+    JOIN troop_weapons ON troop_weapons.troop_id = troops.id
+    JOIN weapons ON weapons.id = troop_weapons.weapon_id
+    JOIN weapon_dps ON weapon_dps.weapon_id = weapons.id
+    JOIN armour_types ON armour_types.id = weapon_dps.armour_type_id;
+"""
+
+# Created after the rows are loaded, which is quicker than updating them
+# for every row
+INDEXES = """
+CREATE INDEX troops_armour_type ON troops (armour_type_id);
+CREATE INDEX troop_weapons_weapon ON troop_weapons (weapon_id);
+CREATE INDEX weapon_dps_armour_type ON weapon_dps (armour_type_id, dps DESC);
+"""
+
+
+def save_to_sqlite(database_path: str, weapons_dict: dict, armour_types: list, troops_dict: dict):
+    """
+    Saves the weapon and troop data to a new SQLite database. The
+    database is built in a temporary file and moved into place, so a
+    reader never sees a half built database.
+
+    :param database_path: the path to save the database to
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: every armour type in DoW
+    :param troops_dict: every troop in DoW organised by race
+    """
+    database_path = Path(database_path)
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+
+    logging.info(f"Saving data to SQLite database ({database_path})")
+    file_descriptor, temp_path = tempfile.mkstemp(dir=database_path.parent, prefix=f".{database_path.name}.")
+    os.close(file_descriptor)
+    try:
+        connection = sqlite3.connect(temp_path)
+        try:
+            fill_database(connection, weapons_dict, armour_types, troops_dict)
+        finally:
+            connection.close()
+        os.replace(temp_path, database_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    logging.info("Done")
+
+
+def fill_database(connection, weapons_dict: dict, armour_types: list, troops_dict: dict):
+    """
+    Creates the tables in an empty database and bulk loads the data into
+    them in a single transaction.
+
+    :param connection: the sqlite3 connection to the database
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: every armour type in DoW
+    :param troops_dict: every troop in DoW organised by race
+    """
+    # The file is only moved into place once it is complete, so there is
+    # nothing for a journal to protect
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.executescript(SCHEMA)
+
+    race_ids = {race: race_id for race_id, race in enumerate(troops_dict, 1)}
+    armour_type_ids = {armour_type: armour_type_id for armour_type_id, armour_type in enumerate(armour_types, 1)}
+    weapon_ids = {weapon: weapon_id for weapon_id, weapon in enumerate(sorted(weapons_dict), 1)}
+
+    troop_rows = []
+    troop_weapon_rows = []
+    for race, race_troops in troops_dict.items():
+        for troop_file, troop in race_troops.items():
+            troop_id = len(troop_rows) + 1
+            cost = troop.get("cost") or {}
+            troop_rows.append((
+                troop_id, race_ids[race], troop_file, troop["display_name"],
+                armour_type_ids.get(troop["armour_types"]), troop.get("health"),
+                cost.get("requisition"), cost.get("power"), troop.get("squad_size")
+            ))
+            troop_weapon_rows += [
+                (troop_id, weapon_ids[weapon]) for weapon in troop["weapons"] if weapon in weapon_ids
+            ]
+
+    weapon_dps_rows = [
+        (weapon_ids[weapon], armour_type_ids[armour_type], damage)
+        for weapon, damages in weapons_dict.items()
+        for armour_type, damage in damages.items()
+        if armour_type in armour_type_ids
+    ]
+
+    with connection:
+        connection.executemany("INSERT INTO races VALUES (?, ?)", ((i, name) for name, i in race_ids.items()))
+        connection.executemany("INSERT INTO armour_types VALUES (?, ?)",
+                               ((i, name) for name, i in armour_type_ids.items()))
+        connection.executemany("INSERT INTO weapons VALUES (?, ?)", ((i, name) for name, i in weapon_ids.items()))
+        connection.executemany("INSERT INTO troops VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", troop_rows)
+        connection.executemany("INSERT INTO troop_weapons VALUES (?, ?)", troop_weapon_rows)
+        connection.executemany("INSERT INTO weapon_dps VALUES (?, ?, ?)", weapon_dps_rows)
+        for statement in INDEXES.strip().splitlines():
+            connection.execute(statement)
+
+    # Lets the query planner choose between the indexes
+    connection.execute("ANALYZE")
+
+    logging.info(f"Saved {len(troop_rows)} troops, {len(weapon_ids)} weapons and "
+                 f"{len(weapon_dps_rows)} DPS values")
@@ -0,0 +1,189 @@
+"""
+Compares two sets of generated data (e.g. before and after a mod update)
+and writes out what changed as JSON lines. Both datasets are loaded into
+memory as indexes; only the changes are written out as they are found.
+
+It reports:
+ - Weapons -- weapons that were added or removed, and DPS changes for
+   each weapon against each armour type
+ - Troops -- troops that were added to or removed from each race
+ - Counters -- troop and weapon pairs that moved rank, or were added to
+   or removed from each race's counters for each armour type
+
+Usage: python diff_data.py old_data_directory new_data_directory
+"""
+import argparse
+import json
+import sys
+
+from file_handlers import load_from_json
+from indexes import StringTable, get_data_paths, load_data_index
+
+
+def diff_datasets(old_index, new_index, min_rank_shift: int=1, tolerance: float=1e-9):
+    """
+    Compares two DataIndexes. Both indexes must share the same string
+    table so that their IDs can be compared directly.
+
+    :param old_index: the DataIndex of the old data
+    :param new_index: the DataIndex of the new data
+    :param min_rank_shift: the smallest change in rank to report
+    :param tolerance: the smallest change in DPS to report
+    :returns: a generator of dictionaries, one for each change
+    """
+    if old_index.strings is not new_index.strings:
+        raise ValueError("Both data indexes must share the same string table")
+
+    name = old_index.name
+
+    yield from diff_weapons(old_index, new_index, tolerance)
+    yield from diff_troops(old_index, new_index)
+
+    for bucket in sorted(old_index.counters.keys() | new_index.counters.keys()):
+        race, armour_type = bucket
+        for change in diff_bucket(old_index.counters.get(bucket, []),
+                                  new_index.counters.get(bucket, []), min_rank_shift):
+            yield dict(change, race=name(race), armour_type=name(armour_type),
+                       troop=name(change["troop"]), weapon=name(change["weapon"]))
+
+
+def diff_weapons(old_index, new_index, tolerance: float):
+    """
+    Compares the weapons and their DPS in two DataIndexes.
+
+    :param old_index: the DataIndex of the old data
+    :param new_index: the DataIndex of the new data
+    :param tolerance: the smallest change in DPS to report
+    :returns: a generator of dictionaries, one for each change
+    """
+    name = old_index.name
+    old_weapons = old_index.weapon_dps.keys()
+    new_weapons = new_index.weapon_dps.keys()
+
+    for weapon in sorted(old_weapons - new_weapons):
+        yield {"type": "weapon_removed", "weapon": name(weapon)}
+    for weapon in sorted(new_weapons - old_weapons):
+        yield {"type": "weapon_added", "weapon": name(weapon)}
+
+    # Only compare armour types that are in both datasets
+    old_columns = old_index.armour_columns
+    new_columns = new_index.armour_columns
+    shared_armour_types = [armour_type for armour_type in old_index.armour_types if armour_type in new_columns]
+    same_columns = old_index.armour_types == new_index.armour_types
+
+    for weapon in sorted(old_weapons & new_weapons):
+        old_row = old_index.weapon_dps[weapon]
+        new_row = new_index.weapon_dps[weapon]
+        # Most weapons don't change between versions
+        if same_columns and old_row == new_row:
+            continue
+
+        for armour_type in shared_armour_types:
+            old_dps = old_row[old_columns[armour_type]]
+            new_dps = new_row[new_columns[armour_type]]
+            if abs(new_dps - old_dps) > tolerance:
+                yield {
+                    "type": "dps_changed",
+                    "weapon": name(weapon),
+                    "armour_type": name(armour_type),
+                    "old": old_dps,
+                    "new": new_dps
+                }
+
+
+def diff_troops(old_index, new_index):
+    """
+    Compares the troops in each race of two DataIndexes.
+
+    :param old_index: the DataIndex of the old data
+    :param new_index: the DataIndex of the new data
+    :returns: a generator of dictionaries, one for each change
+    """
+    name = old_index.name
+
+    for race in sorted(old_index.troops.keys() | new_index.troops.keys()):
+        old_troops = old_index.troops.get(race, {}).keys()
+        new_troops = new_index.troops.get(race, {}).keys()
+
+        for troop in sorted(old_troops - new_troops):
+            yield {"type": "troop_removed", "race": name(race), "troop": name(troop)}
+        for troop in sorted(new_troops - old_troops):
+            yield {"type": "troop_added", "race": name(race), "troop": name(troop)}
+
+
+def diff_bucket(old_bucket: list, new_bucket: list, min_rank_shift: int):
+    """
+    Compares the ranks of the troop and weapon pairs in two counter
+    buckets (a race's counters against one armour type).
+
+    :param old_bucket: the old (troop ID, weapon ID, damage) counters
+    :param new_bucket: the new (troop ID, weapon ID, damage) counters
+    :param min_rank_shift: the smallest change in rank to report
+    :returns: a generator of dictionaries, one for each change, with the
+                troop and weapon as IDs
+    """
+    old_ranks = {(troop, weapon): rank for rank, (troop, weapon, _) in enumerate(old_bucket)}
+
+    for new_rank, (troop, weapon, _) in enumerate(new_bucket):
+        old_rank = old_ranks.pop((troop, weapon), None)
+        if old_rank is None:
+            yield {"type": "counter_added", "troop": troop, "weapon": weapon, "new_rank": new_rank}
+        elif abs(new_rank - old_rank) >= min_rank_shift:
+            yield {
+                "type": "rank_changed",
+                "troop": troop,
+                "weapon": weapon,
+                "old_rank": old_rank,
+                "new_rank": new_rank
+            }
+
+    # Whatever is left over was not in the new bucket
+    for (troop, weapon), old_rank in sorted(old_ranks.items(), key=lambda item: item[1]):
+        yield {"type": "counter_removed", "troop": troop, "weapon": weapon, "old_rank": old_rank}
+
+
+def write_diff(changes, output_file):
+    """
+    Writes each change to a file as a line of JSON.
+
+    :param changes: an iterable of change dictionaries
+    :param output_file: the open file to write to
+    :returns: a dictionary counting how many of each type of change
+                were written
+    """
+    totals = {}
+    for change in changes:
+        output_file.write(json.dumps(change))
+        output_file.write("\n")
+        totals[change["type"]] = totals.get(change["type"], 0) + 1
+
+    return totals
+
+
+def main(args: list=None):
+    parser = argparse.ArgumentParser(description="Compare two generated data directories.")
+    parser.add_argument("old", help="the directory of the old data files")
+    parser.add_argument("new", help="the directory of the new data files")
+    parser.add_argument("-o", "--output", help="the file to write the changes to (default: stdout)")
+    parser.add_argument("--min-rank-shift", type=int, default=1,
+                        help="the smallest change in counter rank to report")
+    parser.add_argument("--config", default="config.json", help="the config file holding the data file names")
+    args = parser.parse_args(args)
+
+    config = load_from_json(args.config, True)
+    strings = StringTable()
+    old_index = load_data_index(get_data_paths(args.old, config), strings)
+    new_index = load_data_index(get_data_paths(args.new, config), strings)
+    changes = diff_datasets(old_index, new_index, args.min_rank_shift)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            totals = write_diff(changes, output_file)
+    else:
+        totals = write_diff(changes, sys.stdout)
+
+    print(json.dumps({"type": "summary", "totals": totals}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
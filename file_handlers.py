@@ -6,9 +6,19 @@ May 2020
 """
 import json
 import logging
+import os
+import tempfile
 
+from logs import count_file
+from metrics import timed
 from pathlib import Path
 
+# orjson is optional, the json module is used if it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class PathNotFoundError(Exception):
     """
@@ -28,22 +38,53 @@ class PathNotFoundError(Exception):
         super().__init__(message)
 
 
-class CustomEncoder(json.JSONEncoder):
+def encode_default(obj):
+    """
+    Converts objects the json encoders can't handle. The data pipeline
+    hands over plain dicts, lists and tuples so this is only a fallback
+    for sets.
+
+    :param obj: the object that couldn't be encoded
+    :returns: a JSON serialisable version of the object
+    :raises TypeError: when the object can't be converted
+    """
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def encode_json(data, indent: bool=True):
     """
-    A custom JSON encoder allowing me to pass in sets with changing them
-    in code and also DamageInfo objects (from generate_data.py).
+    Encodes data to JSON bytes, using orjson if it is installed.
+
+    Without indentation the json module's C encoder is used (json.dump
+    and indented output always use the pure Python encoder). Both
+    encoders write UTF-8 and indent by two spaces so their output
+    matches as closely as possible.
+
+    :param data: the data to encode
+    :param indent: whether or not to indent the output
+    :returns: the encoded data as bytes
     """
-    def default(self, obj):
-        if isinstance(obj, set):
-            return list(obj)
-        elif obj.__class__.__name__ == "DamageInfo":
-            return {
-                "troop_file": obj.troop_file,
-                "weapon": obj.weapon,
-                "damage": obj.damage
-            }
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(data, default=encode_default, option=option)
 
-        return json.JSONEncoder.default(self, obj)
+    indent = 2 if indent else None
+    separators = None if indent else (",", ":")
+    return json.dumps(data, default=encode_default, indent=indent, separators=separators,
+                      ensure_ascii=False).encode("utf-8")
+
+
+def get_json_encoder_name():
+    """
+    Gets the name of the JSON encoder being used, since the encoders
+    don't format every number identically.
+
+    :returns: the encoder name
+    """
+    return f"orjson {orjson.__version__}" if orjson is not None else "json"
 
 
 def create_directories(path: str):
@@ -87,27 +128,51 @@ def create_and_check_path(path: str, reading: bool, suppress_logging: bool=False
     return path_object
 
 
-def save_to_json(file_path: str, dict_to_save: dict):
+def write_atomically(file_path: str, data: bytes):
     """
-    Saves a given dictionary to a json file.
+    Writes data to a temporary file next to the file path, then swaps
+    it into place so the file is never seen half written.
 
-    :param file_path: the path to file to save to
-    :dict_to_save: the data to save to file
+    :param file_path: the path to file to write to
+    :param data: the bytes to write
     """
     file_path_object = create_and_check_path(file_path, False)
+    directory = file_path_object.parent
 
+    file_descriptor, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{file_path_object.name}.", suffix=".tmp")
     try:
-        logging.debug(f"Saving data to json file ({file_path})")
+        with os.fdopen(file_descriptor, "wb") as outfile:
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(temp_path, file_path_object)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
 
-        with open(file_path_object, "w") as outfile:
-            json.dump(dict_to_save, outfile, cls=CustomEncoder, indent=4)
+def save_to_json(file_path: str, dict_to_save: dict, indent: bool=True):
+    """
+    Saves a given dictionary to a json file. The file is replaced in
+    one step so readers never see it half written.
 
-        logging.debug("Done")
+    :param file_path: the path to file to save to
+    :dict_to_save: the data to save to file
+    :param indent: whether or not to indent the output, compact output
+                    is much faster
+    """
+    try:
+        logging.debug("Saving data to json file (%s)", file_path)
+        data = encode_json(dict_to_save, indent)
+        write_atomically(file_path, data)
+        count_file("json files saved", len(data))
     except Exception as e:
         logging.error(f"Failed to save data to json file ({file_path}): {e}")
         raise e
 
 
+@timed("load_from_json")
 def load_from_json(file_path: str, suppress_logging=False):
     """
     Reads from a given json file to a dictionary.
@@ -119,11 +184,10 @@ def load_from_json(file_path: str, suppress_logging=False):
 
     try:
         if not suppress_logging:
-            logging.debug(f"Reading data from json file ({file_path})")
-        with open(file_path_object, "r") as json_file:
+            logging.debug("Reading data from json file (%s)", file_path)
+        with open(file_path_object, "r", encoding="utf-8") as json_file:
             data = json.load(json_file)
-            if not suppress_logging:
-                logging.debug("Done")
+            count_file("json files loaded", json_file.tell())
             return data
     except Exception as e:
         if not suppress_logging:
@@ -133,19 +197,20 @@ def load_from_json(file_path: str, suppress_logging=False):
 
 def read_from_lua(file_path: str):
     """
-    Reads from a given lua file to a list of lines.
+    Reads the text of a given lua file.
 
     :param file_path: the path to file to read from
-    :return: the data read from the file as a list
+    :return: the text read from the file
     """
     file_path_object = create_and_check_path(file_path, True)
 
     try:
-        logging.debug(f"Reading data from lua file ({file_path})")
-        with open(file_path_object, "r") as lua_file:
-            lines = lua_file.readlines()
-            logging.debug("Done")
-            return lines
+        # Counted into the stage summary rather than logged, there can be
+        # thousands of them
+        with open(file_path_object, "r", encoding="utf-8", errors="replace") as lua_file:
+            text = lua_file.read()
+            count_file("lua files read", len(text))
+            return text
     except Exception as e:
         logging.error(f"Failed to read data from lua file ({file_path}): {e}")
         raise e
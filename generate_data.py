@@ -7,109 +7,443 @@ It does this by generating data files for:
  - Armour types -- A list of armour types that exist in DoW
  - Optimised armour types -- A list off armour types that are used in DoW
  - Troops -- Every troop in DoW and which weapons they have. Organised by race
+ - Counters -- Each race's troops ranked by DPS against each armour type.
+   Weapons with the same DPS against every armour type, and armour types
+   every weapon does the same DPS against, are only ranked once
+ - Scores -- Each race's troops scored by cost and health weighted metrics
+ - Database -- Optionally, all of the above as a SQLite database
+ - Troop index -- Optionally, bitsets of the troops in each race, with
+   each armour type and using each weapon
+ - Skyline -- Optionally, each race's troops that no other troop in the
+   race beats against every armour type, and how deeply the rest are beaten
+ - Manifest -- Optionally, a record of the finished generation, written
+   after every other data file
 
 Harrison Cook
 May 2020
 """
 import logging
+import os
+import time
 import traceback
 
+import logs
+import metrics
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from itertools import chain, groupby, repeat
+from operator import itemgetter
+from multiprocessing import shared_memory
+
 from weapons import collate_weapon_data
 from troops import collate_troop_data
 from armour_types import map_troops_to_armour_types
+from database import save_to_sqlite
+from indexes import save_troop_index
+from skyline import calculate_skylines
+from cache import ParseCache, get_input_hash, load_from_cache, save_to_cache
+from scoring import calculate_scores
+from validation import validate_data
 from file_handlers import create_and_check_path, load_from_json, save_to_json, PathNotFoundError
+from profiles import get_profile_config, load_profile_config
+
+
+def calculate_counters(config: dict):
+    """
+    Ranks each troop in each race damage against each armour type and
+    saves the result to file.
+
+    :param config: the configuration for the program
+    """
+    counters = {}
+    armour_types = get_armour_types(config)
+    weapons_dict = load_from_json(config["data"]["weapons"])
+    troops_dict = load_from_json(config["data"]["troops"])
 
+    start = time.perf_counter()
+    damage_classes = DamageClasses(weapons_dict, armour_types)
+    damage_classes.log_ratios()
 
-class DamageInfo():
+    processes = config.get("counterProcesses", 1) or os.cpu_count()
+    if processes > 1 and len(troops_dict) > 1:
+        counters = calculate_counters_in_parallel(troops_dict, damage_classes, processes)
+    else:
+        for race in troops_dict:
+            logging.debug("Finding counters for %s", race)
+            counters[race] = rank_race_counters(troops_dict[race], damage_classes)
+
+    damage_classes.log_sorting_ratio(troops_dict, time.perf_counter() - start)
+    save_to_json(config["data"]["counters"], counters, indent=False)
+
+
+class DamageClasses():
     """
-    A class to store information about a troop's damage.
-    It has comparison functions so that we can .sort()
-    a list of DamageInfo objects.
+    Groups the weapons into classes with the same DPS against every
+    armour type (upgrades and cosmetic copies of a weapon usually are),
+    and the armour types into classes every weapon does the same DPS
+    against. Counters are ranked once for each class rather than for each
+    weapon and armour type, then expanded back to every weapon and armour
+    type.
     """
 
-    def __init__(self, troop_file: str, weapon: str, damage: float):
+    def __init__(self, weapons_dict: dict, armour_types: list):
+        """
+        :param weapons_dict: every weapon mapped to its DPS against each
+                                armour type
+        :param armour_types: the armour types to find counters for
+        """
+        self.armour_types = list(armour_types)
+        self.weapon_count = len(weapons_dict)
+
+        # Each weapon's class, and each class's DPS row
+        self.weapon_classes = {}
+        class_ids = {}
+        class_rows = []
+        get_row = itemgetter(*self.armour_types) if len(self.armour_types) > 1 else \
+            lambda damages: tuple(damages[armour_type] for armour_type in self.armour_types)
+        for weapon, damages in weapons_dict.items():
+            row = get_row(damages)
+            if row not in class_ids:
+                class_ids[row] = len(class_rows)
+                class_rows.append(row)
+            self.weapon_classes[weapon] = class_ids[row]
+
+        # Each armour type's class, the first armour type with the same
+        # DPS column
+        column_ids = {}
+        self.column_classes = [column_ids.setdefault(column, index)
+                               for index, column in enumerate(zip(*class_rows))]
+        if not class_rows:
+            self.column_classes = list(range(len(self.armour_types)))
+        self.unique_columns = sorted(set(self.column_classes))
+
+        # The class DPS as a matrix with a row per class, in armour type
+        # column order
+        self.class_count = len(class_rows)
+        self.matrix = array("d", chain.from_iterable(class_rows))
+
+    def log_ratios(self):
+        """
+        Writes how many weapons and armour types were merged to the log.
+        """
+        logging.info(f"Deduplicated {self.weapon_count} weapons into {self.class_count} DPS classes "
+                     f"({get_ratio(self.weapon_count, self.class_count)}) and {len(self.armour_types)} armour types "
+                     f"into {len(self.unique_columns)} classes "
+                     f"({get_ratio(len(self.armour_types), len(self.unique_columns))})")
+
+    def log_sorting_ratio(self, troops_dict: dict, seconds: float):
         """
-        :param troop_file: the troop's .lua filename
-        :param weapon: the associated weapon filename with this damage
-        :param damage: the damage (per second) this weapon does to the
-                        selected armour type
+        Writes how long finding the counters took to the log, along with
+        the ratio of the entries sorting every counter would take to the
+        class entries actually sorted (each race's distinct classes once
+        per armour type class). The ratio is a count of entries, not a
+        measured speedup (see benchmarks.py counters for that).
+
+        :param troops_dict: every troop in DoW organised by race
+        :param seconds: how long finding the counters took
         """
-        self.troop_file = troop_file
-        self.weapon = weapon
-        self.damage = damage
+        sorted_entries = 0
+        class_entries = 0
+        for race_troops in troops_dict.values():
+            rows = [weapon for troop in race_troops.values() for weapon in troop["weapons"]]
+            sorted_entries += len(rows) * len(self.armour_types)
+            class_entries += len({self.weapon_classes[weapon] for weapon in rows}) * len(self.unique_columns)
 
-    def __eq__(self, other):
-        return self.damage == other.damage
+        logging.info(f"Found counters in {seconds:.3f}s, sorting {class_entries} class entries instead of "
+                     f"{sorted_entries} counters ({get_ratio(sorted_entries, class_entries)} fewer entries)")
 
-    def __ne__(self, other):
-        return not (self.damage == other.damage)
+    def get_race_rows(self, race_troops_dict: dict):
+        """
+        Lists a race's (troop, weapon) rows in tie-break order and the
+        class of each row's weapon.
 
-    def __lt__(self, other):
-        return self.damage < other.damage
+        :param race_troops_dict: every troop in the race
+        :returns: (a sorted list of (troop, weapon) rows, an array of
+                    each row's class)
+        """
+        rows = sorted((troop, weapon) for troop in race_troops_dict for weapon in race_troops_dict[troop]["weapons"])
+        return rows, array("I", [self.weapon_classes[weapon] for _, weapon in rows])
 
-    def __le__(self, other):
-        return self.damage <= other.damage
+    def expand(self, rows: list, row_classes: array, orders: list):
+        """
+        Expands the orders of a race's rows back to the (troop, weapon,
+        damage) counters of every armour type. Armour types in the same
+        class share the same counters list.
+
+        :param rows: the race's (troop, weapon) rows
+        :param row_classes: the class of each row's weapon
+        :param orders: the order of the rows for each unique column
+        :returns: a dictionary mapping each armour type to its sorted
+                    counters
+        """
+        troops = [troop for troop, _ in rows]
+        weapons = [weapon for _, weapon in rows]
+        column_damages = get_column_damages(row_classes, self.matrix, len(self.armour_types), self.unique_columns)
+        class_counters = {}
+        for column, order, damages in zip(self.unique_columns, orders, column_damages):
+            class_counters[column] = list(zip(map(troops.__getitem__, order), map(weapons.__getitem__, order),
+                                              map(damages.__getitem__, order)))
 
-    def __gt__(self, other):
-        return self.damage > other.damage
+        return {armour_type: class_counters[self.column_classes[column]]
+                for column, armour_type in enumerate(self.armour_types)}
 
-    def __ge__(self, other):
-        return self.damage >= other.damage
 
+def rank_race_counters(race_troops_dict: dict, damage_classes: DamageClasses):
+    """
+    Ranks each troop in a race by damage against each armour type.
 
-# I need to reduce the size of this function, it's a bit bloated
-def calculate_counters(config: dict):
+    :param race_troops_dict: every troop in the race
+    :param damage_classes: the weapon and armour type classes
+    :returns: a dictionary mapping each armour type to a list of
+                (troop, weapon, damage) counters, highest damage first
+                with ties broken by troop and then weapon
+    """
+    rows, row_classes = damage_classes.get_race_rows(race_troops_dict)
+    orders = rank_rows(row_classes, damage_classes.matrix, len(damage_classes.armour_types),
+                       damage_classes.unique_columns)
+    return damage_classes.expand(rows, row_classes, orders)
+
+
+def rank_rows(row_classes: array, matrix, armour_type_count: int, columns: list):
+    """
+    Orders a race's rows by damage against each column. Only the race's
+    distinct classes are sorted, then each class is expanded back to its
+    rows. The rows are already in tie-break order (troop then weapon), so
+    a class's rows stay in that order, and only the rows of different
+    classes with the same damage need merging, which gives the same order
+    as sorting every row by (-damage, troop, weapon).
+
+    :param row_classes: the class of each row's weapon, the rows being
+                        sorted by troop then weapon
+    :param matrix: the class DPS matrix
+    :param armour_type_count: the number of columns in the matrix
+    :param columns: the columns to order the rows by
+    :returns: a list of arrays of row indexes, best counter first, one
+                for each column
+    """
+    race_classes = {}
+    class_rows = []
+    for row, damage_class in enumerate(row_classes):
+        local_class = race_classes.setdefault(damage_class, len(race_classes))
+        if local_class == len(class_rows):
+            class_rows.append([])
+        class_rows[local_class].append(row)
+
+    orders = []
+    for class_damages in get_class_damages(race_classes, matrix, armour_type_count, columns):
+        # A reversed sort keeps equal damages in their original order
+        class_order = sorted(range(len(class_rows)), key=class_damages.__getitem__, reverse=True)
+        sorted_damages = list(map(class_damages.__getitem__, class_order))
+        if len(set(sorted_damages)) == len(sorted_damages):
+            orders.append(array("I", chain.from_iterable(map(class_rows.__getitem__, class_order))))
+            continue
+
+        order = array("I")
+        start = 0
+        for _, tied in groupby(sorted_damages):
+            end = start + sum(1 for _ in tied)
+            if end - start == 1:
+                order.extend(class_rows[class_order[start]])
+            else:
+                order.extend(sorted(chain.from_iterable(map(class_rows.__getitem__, class_order[start:end]))))
+            start = end
+        orders.append(order)
+
+    return orders
+
+
+def get_class_damages(race_classes: dict, matrix, armour_type_count: int, columns: list):
+    """
+    Gets the damage of a race's classes against each column.
+
+    :param race_classes: the race's classes, mapped to their index in
+                            the race
+    :param matrix: the class DPS matrix
+    :param armour_type_count: the number of columns in the matrix
+    :param columns: the columns to get the damage against
+    :returns: a generator of lists of each class's damage, in race class
+                order, one for each column
+    """
+    for column in columns:
+        yield [matrix[damage_class * armour_type_count + column] for damage_class in race_classes]
+
+
+def get_column_damages(row_classes: array, matrix, armour_type_count: int, columns: list):
+    """
+    Gets the damage of a race's rows against each column, looking up each
+    class's damage only once.
+
+    :param row_classes: the class of each row's weapon
+    :param matrix: the class DPS matrix
+    :param armour_type_count: the number of columns in the matrix
+    :param columns: the columns to get the damage against
+    :returns: a generator of lists of each row's damage, one for each
+                column
+    """
+    # Renumber the race's classes so each column only looks up theirs
+    race_classes = {}
+    local_classes = [race_classes.setdefault(damage_class, len(race_classes)) for damage_class in row_classes]
+
+    for class_damages in get_class_damages(race_classes, matrix, armour_type_count, columns):
+        yield list(map(class_damages.__getitem__, local_classes))
+
+
+def get_ratio(total: int, unique: int):
+    """
+    :param total: the number of things before deduplication
+    :param unique: the number of things after deduplication
+    :returns: the deduplication ratio as text, e.g. "3.2x"
+    """
+    return f"{total / unique:.1f}x" if unique else "1.0x"
+
+
+def calculate_counters_in_parallel(troops_dict: dict, damage_classes: DamageClasses, processes: int):
+    """
+    Ranks each race's troops against each armour type, a race per
+    process. The class DPS matrix is put in shared memory once, so it
+    isn't copied to every process. Each race is sent only the class of
+    each of its rows, and only sends back the order of its rows for each
+    armour type class.
+
+    :param troops_dict: every troop in DoW organised by race
+    :param damage_classes: the weapon and armour type classes
+    :param processes: the most processes to use
+    :returns: each race's sorted counters for each armour type, in the
+                same order as the races in troops_dict
+    """
+    matrix = damage_classes.matrix
+    race_rows = {race: damage_classes.get_race_rows(race_troops) for race, race_troops in troops_dict.items()}
+
+    logging.info(f"Finding counters for {len(race_rows)} races in up to {processes} processes")
+    shared_matrix = shared_memory.SharedMemory(create=True, size=max(len(matrix) * matrix.itemsize, 1))
+    try:
+        shared_matrix.buf[:len(matrix) * matrix.itemsize] = matrix.tobytes()
+        with ProcessPoolExecutor(max_workers=min(processes, len(race_rows)), initializer=attach_weapon_matrix,
+                                 initargs=(shared_matrix.name, len(damage_classes.armour_types))) as executor:
+            # map gives the results back in the order the races were sent
+            race_orders = list(executor.map(calculate_shared_race_orders,
+                                            [row_classes for _, row_classes in race_rows.values()],
+                                            repeat(damage_classes.unique_columns)))
+    finally:
+        shared_matrix.close()
+        shared_matrix.unlink()
+
+    counters = {
+        race: damage_classes.expand(rows, row_classes, orders)
+        for (race, (rows, row_classes)), orders in zip(race_rows.items(), race_orders)
+    }
+
+    logging.info("Finished finding counters")
+    return counters
+
+
+# The shared class DPS matrix, attached once in each counters process
+weapon_matrix = None
+
+
+def attach_weapon_matrix(name: str, armour_type_count: int):
+    """
+    Attaches a counters process to the shared class DPS matrix.
+
+    :param name: the name of the shared memory
+    :param armour_type_count: the number of columns in the matrix
+    """
+    global weapon_matrix
+    shared_matrix = shared_memory.SharedMemory(name=name)
+    # Reads go straight to the shared memory, nothing is copied
+    weapon_matrix = (shared_matrix, shared_matrix.buf.cast("d"), armour_type_count)
+
+
+def calculate_shared_race_orders(row_classes: array, columns: list):
+    """
+    Orders a race's rows for each armour type class using the shared
+    class DPS matrix. Only the order of the rows is sent back, as compact
+    arrays, since pickling every counter back would cost more than
+    sorting them.
+
+    :param row_classes: the class of each of the race's rows
+    :param columns: the armour type columns to order the rows by
+    :returns: a list of arrays of row indexes, best counter first, one
+                for each column
+    """
+    _, matrix, armour_type_count = weapon_matrix
+    return rank_rows(row_classes, matrix, armour_type_count, columns)
+
+
+def generate_scores(config: dict):
     """
-    Ranks each troop in each race damage against each armour type.
+    Scores each troop in each race against each armour type by the cost
+    and health weighted metrics and saves the result to file.
 
     :param config: the configuration for the program
-    :returns: a dictionary containing each race's troop damage against
-                each armour type
     """
-    counters = {}
     armour_types = get_armour_types(config)
     weapons_dict = load_from_json(config["data"]["weapons"])
     troops_dict = load_from_json(config["data"]["troops"])
 
-    for race in troops_dict:
-        logging.info(f"Starting finding counters for {race}")
+    logging.info("Scoring troops against armour types")
+    scores = calculate_scores(troops_dict, weapons_dict, armour_types)
+
+    save_to_json(config["data"]["scores"], scores, indent=False)
+
+
+def export_database(config: dict):
+    """
+    Saves the weapon and troop data to a SQLite database, if a database
+    file is set in the config.
+
+    :param config: the configuration for the program
+    """
+    if "database" not in config["data"]:
+        logging.debug("No database file in the config, skipping the database export")
+        return
 
-        counters[race] = create_dict_from_list(armour_types)
+    weapons_dict = load_from_json(config["data"]["weapons"])
+    armour_types_dict = load_from_json(config["data"]["armourTypes"])
+    troops_dict = load_from_json(config["data"]["troops"])
 
-        for troop in troops_dict[race]:  # For each troop in a race
-            # For each weapon that troop has
-            for weapon in troops_dict[race][troop]["weapons"]:
-                for armour_type in armour_types:
+    save_to_sqlite(config["data"]["database"], weapons_dict,
+                   list(armour_types_dict["armourTypeToTroops"]), troops_dict)
 
-                    new_damage_info = DamageInfo(
-                        troop,
-                        weapon,
-                        weapons_dict[weapon][armour_type]
-                    )
 
-                    counters[race][armour_type].append(new_damage_info)
+def export_troop_index(config: dict):
+    """
+    Saves the bitsets of the troops in each race, with each armour type
+    and using each weapon, if a troop index file is set in the config.
 
-        logging.info(f"Finished finding counters for {race}")
+    :param config: the configuration for the program
+    """
+    if "troopIndex" not in config["data"]:
+        logging.debug("No troop index file in the config, skipping the troop index")
+        return
 
-    save_to_json(config["data"]["counters"], sort_counters(counters))
+    save_troop_index(config["data"]["troopIndex"], load_from_json(config["data"]["troops"]))
 
 
-def sort_counters(counters: dict):
+def generate_skylines(config: dict):
     """
-    Sorts the counters into descending order.
+    Finds each race's all-round troop and weapon pairs and the dominance
+    depth of every pair, if a skyline file is set in the config.
 
-    :param counters: the counters to sort
-    :returns: the counters dict with sorted armour type counters
+    :param config: the configuration for the program
     """
-    for race in counters:
-        logging.info(f"Starting counters sorting for {race}")
+    if "skyline" not in config["data"]:
+        logging.debug("No skyline file in the config, skipping the skyline")
+        return
 
-        for armour_type in counters[race]:
-            counters[race][armour_type].sort(reverse=True)
+    armour_types = get_armour_types(config)
+    weapons_dict = load_from_json(config["data"]["weapons"])
+    troops_dict = load_from_json(config["data"]["troops"])
 
-        logging.info(f"Finished counters sorting for {race}")
+    logging.info("Finding each race's all-round troops")
+    skylines = calculate_skylines(troops_dict, weapons_dict, armour_types, config.get("skylineMetric", "dps"))
+    for race, race_skyline in skylines["races"].items():
+        logging.info("%s: %d of %d troop and weapon pairs on the skyline, %d depths", race,
+                     len(race_skyline["skyline"]), len(race_skyline["rows"]),
+                     max(race_skyline["depth"], default=-1) + 1)
 
-    return counters
+    save_to_json(config["data"]["skyline"], skylines, indent=False)
 
 
 def get_armour_types(config: dict):
@@ -132,21 +466,6 @@ def get_armour_types(config: dict):
     return armour_types
 
 
-def create_dict_from_list(input_list: list):
-    """
-    Creates a dictionary from an input list where the keys
-    are the list items and the values are empty lists.
-
-    :param input_list: a list of value to turn into a dictionary
-    :returns: a dictionary with list items mapped to empty lists
-    """
-    new_dict = {}
-    for item in input_list:
-        new_dict[item] = []
-
-    return new_dict
-
-
 def optimise_armour_types(config: dict):
     """
     Removes any un-used armour types from the armour types and 
@@ -210,49 +529,168 @@ def generate_troop_info(config: dict):
     weapons_dict = load_from_json(config["data"]["weapons"])
     armour_types_dict = load_from_json(config["data"]["armourTypes"])
 
+    parse_cache = ParseCache(config["cacheDirectory"]) if config.get("cacheDirectory") else None
+
     logging.info("Collating troop data")
     troops_dict = collate_troop_data(
-        config["troops"], weapons_dict, armour_types_dict["troopsToArmourType"])
+        config["troops"], weapons_dict, armour_types_dict["troopsToArmourType"], parse_cache)
+
+    if parse_cache is not None:
+        parse_cache.save()
 
     save_to_json(config["data"]["troops"], troops_dict)
 
 
-def setup_logging(config: dict):
+def setup_logging(config: dict, filemode: str=None):
     """
-    Sets up the logging configuration
+    Sets up the logging configuration. The log file is written on a
+    background thread (see logs.py).
+
     :param config: the configuration for the program
+    :param filemode: the mode to open the log file in, or None to use
+                        the config's loggingOverwrite setting
     """
-    logging_level = config["loggingLevel"]
-    log_file = config["logFile"]
-    filemode = "w" if config["loggingOverwrite"] else "a"
-    FORMAT = "%(asctime)s %(levelname)s: %(message)s"
-    
-    logging.basicConfig(filename=log_file, level=logging_level, format=FORMAT,
-                        filemode=filemode)
+    if filemode is None:
+        filemode = "w" if config["loggingOverwrite"] else "a"
 
+    logs.setup_queue_logging(config["logFile"], config["loggingLevel"], filemode)
 
-def run():
-    config = load_from_json("config.json", True)
 
-    setup_logging(config)
+def validate_troop_data(config: dict):
+    """
+    Validates the weapon and troop data, failing before the counters are
+    calculated if the inputs are bad.
 
-    try:
-        logging.info("Starting generation of data")
+    :param config: the configuration for the program
+    """
+    logging.info("Validating weapon and troop data")
+    validate_data(config)
+
+
+# Each stage of data generation, in the order they run
+STAGES = {
+    "weapons": generate_weapon_info_and_armour_types,
+    "troops": generate_troop_info,
+    "validate": validate_troop_data,
+    "armourTypes": optimise_armour_types,
+    "counters": calculate_counters,
+    "scores": generate_scores,
+    "skyline": generate_skylines,
+    "database": export_database,
+    "troopIndex": export_troop_index
+}
 
-        generate_weapon_info_and_armour_types(config)
 
-        generate_troop_info(config)
+def write_manifest(config: dict, input_hash: str=None):
+    """
+    Records a finished generation in the manifest, when one is set in the
+    config. The manifest is written after every other data file, so
+    anything reading the data can wait for it to change rather than
+    guessing when the other files have finished changing.
+
+    :param config: the configuration for the program
+    :param input_hash: the hash of the inputs the data was generated from,
+                        or None if it wasn't hashed
+    """
+    if "manifest" not in config["data"]:
+        return
+
+    manifest = {
+        "generated": time.time_ns(),
+        "inputHash": input_hash,
+        "dataFiles": {data_file: data_path for data_file, data_path in config["data"].items()
+                      if data_file != "manifest"}
+    }
+    save_to_json(config["data"]["manifest"], manifest)
+
+
+def run(use_cache: bool=True, stages: list=None, config_path: str="config.json",
+        profile: str=None, log_filemode: str=None):
+    """
+    Generates the data files.
+
+    :param use_cache: whether or not to use the cache of generated data
+                        (when a cacheDirectory is set in the config)
+    :param stages: the names of the stages to run, or None to run all of
+                    them. The cache is only used when every stage runs
+    :param config_path: the path to the config file
+    :param profile: the name of the config profile to generate, or None
+                    for the top level config
+    :param log_filemode: the mode to open the log file in, or None to use
+                            the config's loggingOverwrite setting
+    """
+    config = load_profile_config(config_path, profile)
 
-        optimise_armour_types(config)
+    setup_logging(config, log_filemode)
+    if config.get("metrics"):
+        metrics.enable()
 
-        calculate_counters(config)
+    unknown_stages = set(stages or []) - STAGES.keys()
+    if unknown_stages:
+        raise ValueError(f"Unknown stage(s): {', '.join(sorted(unknown_stages))}")
 
+    try:
+        logging.info(f"Starting generation of data{f' for profile {profile}' if profile else ''}")
+
+        input_hash = None
+        if use_cache and not stages and config.get("cacheDirectory"):
+            input_hash = get_input_hash(config)
+            if load_from_cache(config, input_hash):
+                write_manifest(config, input_hash)
+                logging.info("Finished generating data\n\n")
+                return
+
+        for stage, generate_stage in STAGES.items():
+            if not stages or stage in stages:
+                start = time.perf_counter()
+                with metrics.timer(f"generate_data.{stage}"):
+                    generate_stage(config)
+                logs.log_stage_summary(stage, time.perf_counter() - start)
+
+        if input_hash:
+            save_to_cache(config, input_hash)
+        write_manifest(config, input_hash)
+
+        metrics.log_report()
         logging.info("Finished generating data\n\n")
     except Exception as e:
         logging.exception(f"Failed to generate data: {e}")
         raise e
 
 
+def run_profiles(profiles: list, use_cache: bool=True, config_path: str="config.json",
+                 processes: int=None):
+    """
+    Generates the data files for several profiles at once, each in its
+    own process.
+
+    :param profiles: the names of the profiles to generate
+    :param use_cache: whether or not to use the cache of generated data
+    :param config_path: the path to the config file
+    :param processes: the most processes to use, or None for one per CPU
+    :raises Exception: the first exception raised by a profile, after
+                        every profile has finished
+    """
+    config = load_from_json(config_path, True)
+    for profile in profiles:
+        get_profile_config(config, profile)  # Fail early on unknown profiles
+
+    # The processes share a log file, so only truncate it once
+    if config["loggingOverwrite"]:
+        open(config["logFile"], "w").close()
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            profile: executor.submit(run, use_cache, None, config_path, profile, "a")
+            for profile in profiles
+        }
+        wait(futures.values())
+
+    for profile, future in futures.items():
+        if future.exception():
+            raise future.exception()
+
+
 if __name__ == "__main__":
     print("Starting...")
     run()
@@ -0,0 +1,397 @@
+"""
+Builds integer ID based indexes over the generated data files so they
+can be compared and queried without walking the nested dictionaries.
+
+- Every race, troop, weapon and armour type name is interned to an ID
+- Each weapon's DPS is stored as a flat array in armour type column order
+- Each counter bucket is stored as a list of (troop ID, weapon ID, damage)
+- Which troops are in each race, have each armour type and use each
+  weapon is stored as a bitset, a Python int with a bit per troop, so
+  filters like "troops in these races with these armour types using
+  these weapons" are a few integer ANDs and ORs
+"""
+import base64
+import logging
+
+from array import array
+from pathlib import Path
+
+from file_handlers import load_from_json, save_to_json
+from metrics import timed
+
+DATA_FILES = ("weapons", "troops", "counters")
+
+
+class StringTable():
+    """
+    Interns strings to integer IDs so that names are only stored once
+    and can be compared and hashed as integers.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, string: str):
+        """
+        Gets the ID for a string, adding the string if it's new.
+
+        :param string: the string to intern
+        :returns: the string's ID
+        """
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[string] = string_id
+            self.strings.append(string)
+
+        return string_id
+
+    def get_id(self, string: str):
+        """
+        Gets the ID for a string without adding it.
+
+        :param string: the string to look up
+        :returns: the string's ID or None if it hasn't been interned
+        """
+        return self.ids.get(string)
+
+    def __getitem__(self, string_id: int):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class InternPool():
+    """
+    Shares identical values between data files that are loaded side by
+    side (e.g. several profiles), so memory doesn't grow with every copy
+    of the same data.
+
+    - Every string is replaced by a single shared instance
+    - Every list of plain values (e.g. a counter) is replaced by a
+      single shared tuple
+    - Every dictionary of plain values (e.g. a weapon's DPS row) is
+      replaced by a single shared dictionary
+
+    Shared values must be treated as read only.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.values = {}
+
+    def share(self, value):
+        """
+        Gets the shared version of a loaded JSON value.
+
+        :param value: the value to share
+        :returns: an equal value that shares identical parts with every
+                    other value shared by this pool
+        """
+        if isinstance(value, str):
+            return self.strings.setdefault(value, value)
+
+        if isinstance(value, list):
+            items = [self.share(item) for item in value]
+            if all(is_plain(item) for item in items):
+                items = tuple(items)
+                return self.values.setdefault(("list", items), items)
+            return items
+
+        if isinstance(value, dict):
+            items = {self.share(key): self.share(item) for key, item in value.items()}
+            if all(is_plain(item) for item in items.values()):
+                return self.values.setdefault(("dict", tuple(items.items())), items)
+            return items
+
+        return value
+
+    @timed("intern_pool.load_json")
+    def load_json(self, file_path: str):
+        """
+        Loads a json file, sharing its values with everything else loaded
+        through this pool.
+
+        :param file_path: the path to file to read from
+        :returns: the shared data read from the file
+        """
+        return self.share(load_from_json(file_path))
+
+
+def is_plain(value):
+    """
+    Checks if a value is a plain JSON value (not a list or dictionary).
+
+    :param value: the value to check
+    :returns: whether or not the value is plain
+    """
+    return value is None or isinstance(value, (str, int, float, tuple))
+
+
+class DataIndex():
+    """
+    An ID based index over one set of generated weapons, troops and
+    counters data.
+    """
+
+    def __init__(self, weapons_dict: dict, troops_dict: dict, counters: dict,
+                 strings: StringTable=None):
+        """
+        :param weapons_dict: every weapon mapped to its DPS against each
+                                armour type
+        :param troops_dict: every troop organised by race
+        :param counters: each race's counters for each armour type
+        :param strings: the string table to intern names into, so that
+                        several indexes can share the same IDs
+        """
+        self.strings = strings if strings is not None else StringTable()
+        intern = self.strings.intern
+
+        armour_type_names = next(iter(weapons_dict.values()), {}).keys()
+        self.armour_types = [intern(armour_type) for armour_type in armour_type_names]
+        self.armour_columns = {armour_id: column for column, armour_id in enumerate(self.armour_types)}
+
+        self.weapon_dps = {}
+        for weapon, damages in weapons_dict.items():
+            self.weapon_dps[intern(weapon)] = array("d", [damages.get(name, 0.0) for name in armour_type_names])
+
+        self.troops = {}
+        for race, race_troops in troops_dict.items():
+            self.troops[intern(race)] = {intern(troop_file): troop for troop_file, troop in race_troops.items()}
+
+        self.counters = {}
+        for race, race_counters in counters.items():
+            race_id = intern(race)
+            for armour_type, bucket in race_counters.items():
+                self.counters[(race_id, intern(armour_type))] = [
+                    (intern(troop_file), intern(weapon), damage)
+                    for troop_file, weapon, damage in bucket
+                ]
+
+    def name(self, string_id: int):
+        """
+        Gets the name for an ID.
+
+        :param string_id: the ID to look up
+        :returns: the name the ID was interned from
+        """
+        return self.strings[string_id]
+
+
+class TroopSetIndex():
+    """
+    Bitsets of the troops in each race, with each armour type and using
+    each weapon. Troop IDs are positions in the troops list, and a set of
+    troops is an int with the bit of each troop in it set, so the sets
+    can be combined with &, | and ^ (and subtracted with & ~).
+    """
+
+    def __init__(self, troops: list, races: dict, armour_types: dict, weapons: dict):
+        """
+        :param troops: every troop as a (race, troop file) pair, in ID order
+        :param races: each race mapped to its troops' bitset
+        :param armour_types: each armour type mapped to its troops' bitset
+        :param weapons: each weapon mapped to the bitset of the troops
+                        that use it
+        """
+        self.troops = troops
+        self.races = races
+        self.armour_types = armour_types
+        self.weapons = weapons
+        self.all = (1 << len(troops)) - 1
+
+    @classmethod
+    def from_troops(cls, troops_dict: dict):
+        """
+        Builds the bitsets from the troops data.
+
+        :param troops_dict: every troop organised by race
+        :returns: the TroopSetIndex of the troops
+        """
+        troops = []
+        races = {}
+        armour_types = {}
+        weapons = {}
+        for race, race_troops in troops_dict.items():
+            race_bits = 0
+            for troop_file, troop in race_troops.items():
+                bit = 1 << len(troops)
+                troops.append((race, troop_file))
+                race_bits |= bit
+                armour_types[troop["armour_types"]] = armour_types.get(troop["armour_types"], 0) | bit
+                for weapon in troop["weapons"]:
+                    weapons[weapon] = weapons.get(weapon, 0) | bit
+            races[race] = race_bits
+
+        # Troops without an armour type aren't in any armour type's set
+        armour_types.pop(None, None)
+        return cls(troops, races, armour_types, weapons)
+
+    def select(self, races: list=None, armour_types: list=None, weapons: list=None):
+        """
+        Finds the troops in any of the races, with any of the armour types
+        and using any of the weapons. A filter that isn't given matches
+        every troop, and names that don't exist match no troops.
+
+        :param races: the races to match, or None for every race
+        :param armour_types: the armour types to match, or None for every
+                                armour type
+        :param weapons: the weapons to match, or None for every weapon
+        :returns: the bitset of the matching troops
+        """
+        bits = self.all
+        for names, bitsets in ((races, self.races), (armour_types, self.armour_types), (weapons, self.weapons)):
+            if names is not None:
+                matches = 0
+                for name in names:
+                    matches |= bitsets.get(name, 0)
+                bits &= matches
+
+        return bits
+
+    def get_troops(self, bits: int):
+        """
+        Lists the troops in a bitset.
+
+        :param bits: the bitset
+        :returns: a list of (race, troop file) pairs, in ID order
+        """
+        troops = self.troops
+        # The binary string reversed puts troop ID n at index n
+        binary = bin(bits)[:1:-1]
+        found = []
+        index = binary.find("1")
+        while index >= 0:
+            found.append(troops[index])
+            index = binary.find("1", index + 1)
+
+        return found
+
+    def count_by(self, bits: int, bitsets: dict):
+        """
+        Counts the troops in a bitset by race, armour type or weapon, e.g.
+        index.count_by(bits, index.armour_types).
+
+        :param bits: the bitset
+        :param bitsets: the races, armour_types or weapons bitsets
+        :returns: a dictionary mapping each name to the number of its
+                    troops in the bitset, leaving out names with none
+        """
+        counts = {}
+        for name, name_bits in bitsets.items():
+            count = count_bits(bits & name_bits)
+            if count:
+                counts[name] = count
+
+        return counts
+
+    def to_json(self):
+        """
+        :returns: the index as JSON serialisable data, with each bitset
+                    encoded by encode_bits
+        """
+        return {
+            "troops": self.troops,
+            "races": {name: encode_bits(bits) for name, bits in self.races.items()},
+            "armourTypes": {name: encode_bits(bits) for name, bits in self.armour_types.items()},
+            "weapons": {name: encode_bits(bits) for name, bits in self.weapons.items()}
+        }
+
+    @classmethod
+    def from_json(cls, data: dict):
+        """
+        Loads an index saved by to_json.
+
+        :param data: the saved index
+        :returns: the TroopSetIndex
+        """
+        return cls(
+            [tuple(troop) for troop in data["troops"]],
+            {name: decode_bits(bits) for name, bits in data["races"].items()},
+            {name: decode_bits(bits) for name, bits in data["armourTypes"].items()},
+            {name: decode_bits(bits) for name, bits in data["weapons"].items()}
+        )
+
+
+def count_bits(bits: int):
+    """
+    :param bits: a bitset
+    :returns: the number of troops in the bitset
+    """
+    return bin(bits).count("1")
+
+
+def encode_bits(bits: int):
+    """
+    Encodes a bitset as "offset:bytes", the bytes being base64 little
+    endian. Most bitsets only cover the troops of one race, so the zero
+    bytes before the first troop are left out and counted by the offset.
+
+    :param bits: a bitset
+    :returns: the encoded bitset
+    """
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    offset = len(data) - len(data.lstrip(b"\0"))
+    return f"{offset}:{base64.b64encode(data[offset:]).decode('ascii')}"
+
+
+def decode_bits(encoded: str):
+    """
+    :param encoded: a bitset encoded by encode_bits
+    :returns: the bitset
+    """
+    offset, data = encoded.split(":")
+    return int.from_bytes(base64.b64decode(data), "little") << (8 * int(offset))
+
+
+def save_troop_index(file_path: str, troops_dict: dict):
+    """
+    Builds the troop bitsets and saves them to file.
+
+    :param file_path: the path to save the index to
+    :param troops_dict: every troop organised by race
+    """
+    troop_index = TroopSetIndex.from_troops(troops_dict)
+    logging.info(f"Saving troop index of {len(troop_index.troops)} troops ({file_path})")
+    save_to_json(file_path, troop_index.to_json(), indent=False)
+
+
+def load_troop_index(file_path: str):
+    """
+    Loads the troop bitsets saved by save_troop_index.
+
+    :param file_path: the path to load the index from
+    :returns: the TroopSetIndex
+    """
+    return TroopSetIndex.from_json(load_from_json(file_path))
+
+
+def get_data_paths(directory: str, config: dict):
+    """
+    Gets the paths of the generated data files inside a data directory,
+    using the file names from the config.
+
+    :param directory: the directory holding the generated data files
+    :param config: the configuration for the program
+    :returns: a dictionary mapping each data file to its path
+    """
+    return {name: str(Path(directory) / Path(config["data"][name]).name) for name in DATA_FILES}
+
+
+def load_data_index(data_paths: dict, strings: StringTable=None):
+    """
+    Loads the generated data files into a DataIndex.
+
+    :param data_paths: a dictionary mapping each data file to its path
+    :param strings: the string table to intern names into
+    :returns: the DataIndex of the data files
+    """
+    logging.info(f"Indexing data files ({data_paths['counters']})")
+    return DataIndex(
+        load_from_json(data_paths["weapons"]),
+        load_from_json(data_paths["troops"]),
+        load_from_json(data_paths["counters"]),
+        strings
+    )
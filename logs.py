@@ -0,0 +1,138 @@
+"""
+Sets up logging so that writing the log never holds up data generation.
+
+Log records are put on a queue by a QueueHandler and written to the log
+file by a QueueListener on a background thread, so a hot loop only pays
+for putting the record on the queue. Messages logged on hot paths use
+lazy %-style formatting, so they aren't formatted at all when their level
+is turned off.
+
+Rather than logging every file read or written, file_handlers counts them
+into the current stage's summary, which is logged once the stage
+finishes:
+
+    Finished stage troops in 0.231s: 540 lua files read (1.27 MB), 2 json files loaded (0.41 MB)
+"""
+import atexit
+import logging
+import os
+import queue
+
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s %(levelname)s: %(message)s"
+
+# The listener writing the log file, and the process it was started in
+listener = None
+listener_pid = None
+
+
+class ThreadQueueHandler(QueueHandler):
+    """
+    A QueueHandler for a listener in the same process. QueueHandler
+    formats each record before queueing it so it can be pickled to
+    another process, this leaves the formatting to the listener's thread
+    too.
+    """
+
+    def prepare(self, record: logging.LogRecord):
+        return record
+
+
+def create_queue_handler(handler: logging.Handler):
+    """
+    Puts a handler behind a queue, so records are formatted and handled
+    on a background thread.
+
+    :param handler: the handler to write the records with
+    :returns: (the QueueHandler to log to, the started QueueListener)
+    """
+    record_queue = queue.SimpleQueue()
+    queue_listener = QueueListener(record_queue, handler, respect_handler_level=True)
+    queue_listener.start()
+    return ThreadQueueHandler(record_queue), queue_listener
+
+
+def setup_queue_logging(log_file: str, level: str, filemode: str="a"):
+    """
+    Logs to a file through a queue. Like logging.basicConfig, nothing is
+    changed if logging has already been set up in this process, so the
+    first call decides the log file.
+
+    :param log_file: the file to save logs to
+    :param level: the logging level, e.g. "INFO"
+    :param filemode: the mode to open the log file in
+    """
+    global listener, listener_pid
+    root = logging.getLogger()
+    if listener is not None and listener_pid != os.getpid():
+        # A forked process doesn't have the listener's thread, so records
+        # put on its queue would never be written
+        root.handlers = [handler for handler in root.handlers if not isinstance(handler, QueueHandler)]
+        listener = None
+    if root.handlers:
+        return
+
+    file_handler = logging.FileHandler(log_file, filemode, encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    queue_handler, listener = create_queue_handler(file_handler)
+    listener_pid = os.getpid()
+
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    atexit.register(stop_queue_logging)
+
+
+def stop_queue_logging():
+    """
+    Writes any records still on the queue and stops the listener.
+    """
+    global listener
+    if listener is not None and listener_pid == os.getpid():
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    listener = None
+
+
+class StageSummary():
+    """
+    Counts the files read and written during a stage, and how big they
+    were.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def count_file(self, kind: str, size: int=0):
+        """
+        Counts a file towards the current stage.
+
+        :param kind: what was done with the file, e.g. "lua files read"
+        :param size: the size of the file in bytes
+        """
+        counts = self.files.get(kind)
+        if counts is None:
+            self.files[kind] = [1, size]
+        else:
+            counts[0] += 1
+            counts[1] += size
+
+    def log(self, stage: str, seconds: float):
+        """
+        Logs the stage's summary and starts counting the next stage.
+
+        :param stage: the name of the stage
+        :param seconds: how long the stage took
+        """
+        files = ", ".join(f"{count} {kind} ({size / 2 ** 20:.2f} MB)"
+                          for kind, (count, size) in self.files.items())
+        logging.info("Finished stage %s in %.3fs%s", stage, seconds, f": {files}" if files else "")
+        self.files = {}
+
+
+# The summary of the stage currently running
+stage_summary = StageSummary()
+
+count_file = stage_summary.count_file
+log_stage_summary = stage_summary.log
@@ -0,0 +1,449 @@
+"""
+Reads the key/value assignments out of lua table dumps, such as the ones
+made by Corsix's "Dump RGD to lua".
+
+The file is split into tokens by a single regular expression, then a
+small parser walks the tokens once, keeping track of the nested table
+path of every value. Both the Corsix format:
+
+    GameData["health_ext"]["hitpoints"] = 1291.00000
+
+and table constructors from other tools:
+
+    GameData = { health_ext = { hitpoints = 1291 } }
+
+give the same assignment: ('["health_ext"]["hitpoints"]', 1291.0, None).
+A comment on the same line as a value (e.g. the troop name after its
+screen_name_id) is kept with it. Anything that can't be parsed is skipped
+rather than stopping the whole file.
+
+Most files are plain Corsix dumps, one assignment per line, so those are
+first read a line at a time with string methods, which is quicker than
+the tokenizer. The first line that isn't exactly in the Corsix layout
+sends the whole file to the tokenizer instead, so both give the same
+assignments.
+"""
+import re
+
+# A whole simple assignment (the usual Corsix line) is matched as one
+# token, everything else is matched a token at a time
+TOKEN = re.compile(r"""
+    (?P<assignment>
+        (?<![\w.])[A-Za-z_]\w*
+        (?P<assignment_path>(?:[ \t]*\[[ \t]*(?:"[^"\n]*"|'[^'\n]*'|-?\d+)[ \t]*\])+)
+        \s*=\s*
+        (?:
+            \[(?P<assignment_equals>=*)\[(?P<assignment_long_string>.*?)\](?P=assignment_equals)\]
+          | "(?P<assignment_double_quoted>(?:[^"\\\n]|\\.)*)"
+          | '(?P<assignment_single_quoted>(?:[^'\\\n]|\\.)*)'
+          | (?P<assignment_number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?![\w.])
+        )
+        (?:[ \t]*,?[ \t]*--(?!\[=*\[)(?P<assignment_comment>[^\n]*))?
+        (?P<assignment_newline>[ \t\r\f]*\n[ \t\r\f]*)?
+    )
+  | (?P<newline>[ \t\r\f]*\n[ \t\r\f\n]*)
+  | [ \t\r\f]+
+  | --\[(?P<long_comment>=*)\[.*?\](?P=long_comment)\]
+  | --(?P<comment>[^\n]*)
+  | \[(?P<long_equals>=*)\[(?P<long_string>.*?)\](?P=long_equals)\]
+  | (?P<path>(?:[ \t]*\[[ \t]*(?:"[^"\n]*"|'[^'\n]*'|-?\d+)[ \t]*\])+)
+  | "(?P<double_quoted>(?:[^"\\\n]|\\.)*)"
+  | '(?P<single_quoted>(?:[^'\\\n]|\\.)*)'
+  | (?P<number>-?(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?))
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<op>[\[\]{}()=,;.])
+""", re.DOTALL | re.VERBOSE)
+
+ESCAPE = re.compile(r"\\(.)")
+# A chain of keys is one token, usually already in the form Corsix writes it
+KEY = re.compile(r"""\[[ \t]*(?:"([^"\n]*)"|'([^'\n]*)'|(-?\d+))[ \t]*\]""")
+CONSTANTS = {"true": True, "false": False, "nil": None}
+SEPARATORS = {("op", ","), ("op", ";")}
+
+# Token kinds
+STRING = "string"
+NUMBER = "number"
+NAME = "name"
+PATH = "path"
+ASSIGNMENT = "assignment"
+OP = "op"
+COMMENT = "comment"
+
+
+def tokenize_lua(lua_text: str):
+    """
+    Splits lua text into tokens. Whitespace and comments are dropped,
+    except for comments on the same line as the token before them.
+
+    :param lua_text: the lua text
+    :returns: a list of (kind, value) tokens, where strings are already
+                unquoted and numbers converted
+    """
+    tokens = []
+    append = tokens.append
+    newline_seen = True
+
+    for match in TOKEN.finditer(lua_text):
+        kind = match.lastgroup
+        if kind == "assignment":
+            append((ASSIGNMENT, read_assignment(match)))
+            newline_seen = match.group("assignment_newline") is not None
+            continue
+        elif kind == "newline":
+            newline_seen = True
+            continue
+        elif kind is None or kind == "long_comment":
+            continue
+        elif kind == "comment":
+            if not newline_seen:
+                append((COMMENT, match.group("comment").strip()))
+            continue
+        elif kind == "long_string":
+            append((STRING, match.group("long_string")))
+        elif kind == "double_quoted" or kind == "single_quoted":
+            append((STRING, ESCAPE.sub(r"\1", match.group(kind))))
+        elif kind == "number":
+            append((NUMBER, parse_lua_number(match.group("number"))))
+        elif kind == "path":
+            append((PATH, format_path(match.group("path"))))
+        else:
+            append((kind, match.group(kind)))
+        newline_seen = False
+
+    return tokens
+
+
+def read_assignment(match):
+    """
+    Reads a simple assignment matched as a single token.
+
+    :param match: the assignment's match
+    :returns: a (path, value, comment) assignment
+    """
+    path, long_string, double_quoted, single_quoted, number, comment = match.group(
+        "assignment_path", "assignment_long_string", "assignment_double_quoted",
+        "assignment_single_quoted", "assignment_number", "assignment_comment")
+
+    if number is not None:
+        value = float(number)
+    elif long_string is not None:
+        value = long_string
+    else:
+        value = ESCAPE.sub(r"\1", double_quoted if double_quoted is not None else single_quoted)
+
+    if comment is not None:
+        comment = comment.strip()
+
+    return format_path(path), value, comment
+
+
+def format_path(keys: str):
+    """
+    Formats a chain of keys the way it appears in a Corsix dump, e.g.
+    [ 'health_ext' ] ["hitpoints"] becomes ["health_ext"]["hitpoints"].
+
+    :param keys: the chain of keys
+    :returns: the formatted keys
+    """
+    if " " not in keys and "\t" not in keys and "'" not in keys:
+        return keys
+
+    return "".join(
+        f'["{double_quoted}"]' if number == "" and not single_quoted else
+        f'["{single_quoted}"]' if number == "" else f"[{number}]"
+        for double_quoted, single_quoted, number in KEY.findall(keys)
+    )
+
+
+def parse_lua_number(number: str):
+    """
+    Converts a lua number literal to a float.
+
+    :param number: the number literal
+    :returns: the number as a float
+    """
+    if "x" in number or "X" in number:
+        return float(int(number, 16))
+
+    return float(number)
+
+
+def parse_lua_assignments(lua_text: str):
+    """
+    Reads every value assigned in lua text along with its full table
+    path. The name being assigned to (e.g. GameData) isn't part of the
+    path.
+
+    :param lua_text: the lua text
+    :returns: a list of (path, value, comment) assignments, where the path
+                is e.g. '["ui_ext"]["screen_name_id"]' and the comment is
+                the comment on the same line as the value (or None)
+    """
+    assignments = parse_corsix_lines(lua_text)
+    if assignments is not None:
+        return assignments
+
+    tokens = tokenize_lua(lua_text)
+    assignments = []
+    index = 0
+    end = len(tokens)
+
+    while index < end:
+        kind, value = tokens[index]
+        if kind == ASSIGNMENT:
+            assignments.append(value)
+            index += 1
+            continue
+        if kind != NAME:
+            # Not the start of a statement, e.g. junk from a broken file
+            index += 1
+            continue
+
+        path, index = read_path(tokens, index + 1)
+        if path is None or index >= end or tokens[index] != (OP, "="):
+            continue
+
+        index = read_value(tokens, index + 1, path, assignments)
+
+    return assignments
+
+
+def parse_corsix_lines(lua_text: str):
+    """
+    Reads the assignments of a file written exactly the way Corsix dumps
+    them, e.g.
+
+        GameData = Inherit([[ebps\\races\\orks\\troops\\base.nil]])
+        GameData["ui_ext"]["screen_name_id"] = [[$15000023]] -- Boyz
+        GameData["health_ext"]["hitpoints"] = 1291.00000
+
+    along with blank lines and whole line comments.
+
+    :param lua_text: the lua text
+    :returns: a list of (path, value, comment) assignments the same as the
+                tokenizer would give, or None if any line isn't in the
+                Corsix layout
+    """
+    assignments = []
+    append = assignments.append
+    for line in lua_text.split("\n"):
+        target, equals, value = line.partition(" = ")
+        if not equals:
+            line = line.strip()
+            if not line or (line.startswith("--") and not line.startswith("--[")):
+                continue
+            return None
+
+        bracket = target.find("[")
+        if bracket < 0:
+            # The file this one inherits from
+            value = value.rstrip()
+            if target.isidentifier() and value.startswith(("Inherit([[", "Reference([[")) and value.endswith("]])"):
+                reference = value[value.find("[[") + 2:-3]
+                if "]]" not in reference:
+                    append(("", reference, None))
+                    continue
+            return None
+
+        # Only ["key"]["key"] paths, which are already formatted
+        path = target[bracket:]
+        if not (target[:bracket].isidentifier() and path.startswith('["') and path.endswith('"]')
+                and '"' not in path[2:-2].replace('"]["', "")):
+            return None
+
+        comment = None
+        if value.startswith("[["):
+            end = value.find("]]")
+            if end < 0:
+                return None
+            rest = value[end + 2:].strip()
+            value = value[2:end]
+        else:
+            value, dashes, rest = value.partition("--")
+            rest = dashes + rest
+            value = value.strip()
+            # Only the number literals the tokenizer reads as numbers
+            if not value or not value.isascii() or value[0] not in "-.0123456789" or "_" in value:
+                return None
+            try:
+                value = float(value)
+            except ValueError:
+                return None
+
+        if rest:
+            if not rest.startswith("--") or rest.startswith("--["):
+                return None
+            comment = rest[2:].strip()
+
+        append((path, value, comment))
+
+    return assignments
+
+
+def read_path(tokens: list, index: int):
+    """
+    Reads the keys indexing a name, e.g. ["health_ext"]["hitpoints"] or
+    .health_ext.hitpoints.
+
+    :param tokens: the tokens
+    :param index: the index of the token after the name
+    :returns: (the path, the index after the path), the path being None
+                if the keys are malformed
+    """
+    path = ""
+    end = len(tokens)
+    while index < end:
+        token = tokens[index]
+        if token[0] == PATH:
+            path += token[1]
+            index += 1
+        elif token == (OP, "[") and index + 2 < end and tokens[index + 2] == (OP, "]"):
+            key = format_key(tokens[index + 1])
+            if key is None:
+                return None, index + 1
+            path += key
+            index += 3
+        elif token == (OP, ".") and index + 1 < end and tokens[index + 1][0] == NAME:
+            path += format_key((STRING, tokens[index + 1][1]))
+            index += 2
+        else:
+            break
+
+    return path, index
+
+
+def format_key(token: tuple):
+    """
+    Formats a key token the way it appears in a Corsix dump.
+
+    :param token: a (kind, value) token
+    :returns: the key, e.g. '["hitpoints"]' or '[1]', or None if the
+                token can't be a key
+    """
+    kind, value = token
+    if kind == STRING:
+        return f'["{value}"]'
+    if kind == NUMBER:
+        return f"[{int(value) if value.is_integer() else value}]"
+
+    return None
+
+
+def read_value(tokens: list, index: int, path: str, assignments: list):
+    """
+    Reads the value assigned to a path, adding it (or every value in it
+    for a table) to the assignments.
+
+    :param tokens: the tokens
+    :param index: the index of the value's first token
+    :param path: the path being assigned to
+    :param assignments: the list to add the assignments to
+    :returns: the index after the value
+    """
+    end = len(tokens)
+    if index >= end:
+        return index
+
+    kind, value = tokens[index]
+    index += 1
+
+    if kind == OP or kind == ASSIGNMENT:
+        if value == "{":
+            return read_table(tokens, index, path, assignments)
+        # Not a value, let the statement loop carry on from here
+        return index - 1
+
+    if kind == NAME:
+        if value in CONSTANTS:
+            value = CONSTANTS[value]
+        elif index < end and tokens[index] == (OP, "("):
+            # A call, e.g. Reference([[ebpextensions\health_ext.lua]]),
+            # stands for the file it references
+            value, index = read_call(tokens, index + 1)
+        elif index < end and tokens[index][0] == STRING:
+            # A call without brackets, e.g. Reference[[...]]
+            value = tokens[index][1]
+            index += 1
+        else:
+            value = None
+
+    # The comment may come after a table field's separator
+    comment = None
+    comment_index = index + 1 if index < end and tokens[index] in SEPARATORS else index
+    if comment_index < end and tokens[comment_index][0] == COMMENT:
+        comment = tokens[comment_index][1]
+        index = comment_index + 1
+
+    assignments.append((path, value, comment))
+    return index
+
+
+def read_call(tokens: list, index: int):
+    """
+    Reads a call's arguments up to its closing bracket.
+
+    :param tokens: the tokens
+    :param index: the index of the token after the opening bracket
+    :returns: (the first string argument or None, the index after the
+                closing bracket)
+    """
+    value = None
+    depth = 1
+    end = len(tokens)
+    while index < end and depth:
+        kind, token_value = tokens[index]
+        if kind == OP and token_value == "(":
+            depth += 1
+        elif kind == OP and token_value == ")":
+            depth -= 1
+        elif kind == STRING and value is None:
+            value = token_value
+        index += 1
+
+    return value, index
+
+
+def read_table(tokens: list, index: int, path: str, assignments: list):
+    """
+    Reads a table constructor's fields up to its closing brace.
+
+    :param tokens: the tokens
+    :param index: the index of the token after the opening brace
+    :param path: the path of the table
+    :param assignments: the list to add the assignments to
+    :returns: the index after the closing brace
+    """
+    position = 1
+    end = len(tokens)
+    while index < end:
+        kind, value = tokens[index]
+
+        if kind == OP and value == "}":
+            return index + 1
+        if kind == ASSIGNMENT:
+            # A statement, so the table was never closed
+            return index
+        if kind == COMMENT or (kind == OP and value in ",;"):
+            index += 1
+            continue
+
+        if kind == PATH:
+            # [key] = value
+            if index + 1 >= end or tokens[index + 1] != (OP, "="):
+                index += 1
+                continue
+            index = read_value(tokens, index + 2, path + value, assignments)
+        elif kind == NAME and index + 1 < end and tokens[index + 1] == (OP, "="):
+            # name = value
+            index = read_value(tokens, index + 2, path + format_key((STRING, value)), assignments)
+        else:
+            # A value without a key gets the next position
+            next_index = read_value(tokens, index, f"{path}[{position}]", assignments)
+            if next_index > index:
+                position += 1
+                index = next_index
+            else:
+                # Skip anything that isn't a value
+                index += 1
+
+    return index
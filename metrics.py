@@ -0,0 +1,327 @@
+"""
+Collects runtime metrics (counters, histograms, timers and memory
+gauges) so a slow GUI interaction or query can be pinned to the code
+that caused it.
+
+Collection is off by default. While it is off, timing a function costs
+one attribute check per call and nothing is recorded. Turn it on with
+`"metrics": true` in the config, or with enable(). For example:
+
+    @timed("view.populate_table")
+    def populate_table(self, selected_race):
+        ...
+
+    with timer("generate_data.counters"):
+        calculate_counters(config)
+
+    set_gauge("memory.Default.troops", deep_size(troops_dict))
+
+report() formats everything recorded into a table for the log or the
+GUI's metrics window.
+"""
+import functools
+import logging
+import sys
+import time
+
+from collections import deque
+
+# The most recent samples a histogram keeps for its percentiles
+HISTOGRAM_SAMPLES = 1000
+
+
+class Histogram():
+    """
+    The distribution of a value, e.g. the milliseconds a slot takes.
+    Totals cover every sample, the percentiles only the most recent
+    samples.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = None
+        self.samples = deque(maxlen=HISTOGRAM_SAMPLES)
+
+    def observe(self, value: float):
+        """
+        Records a sample.
+
+        :param value: the value of the sample
+        """
+        self.count += 1
+        self.total += value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        self.samples.append(value)
+
+    def percentile(self, fraction: float):
+        """
+        Gets a percentile of the recent samples.
+
+        :param fraction: the percentile as a fraction, e.g. 0.95
+        :returns: the percentile, or None if there are no samples
+        """
+        if not self.samples:
+            return None
+
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def summary(self):
+        """
+        :returns: a dictionary of the count, mean, p50, p95 and maximum
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.maximum
+        }
+
+
+class Timer():
+    """
+    Times a block of code into a histogram of milliseconds.
+    """
+
+    def __init__(self, metrics, name: str):
+        """
+        :param metrics: the Metrics to record into
+        :param name: the name of the timer
+        """
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe_time(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class NullTimer():
+    """
+    Stands in for a Timer while collection is off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics():
+    """
+    Holds every metric recorded while collection is on.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self.timers = {}
+        self.gauges = {}
+
+    def enable(self, enabled: bool=True):
+        """
+        Turns collection on or off. Metrics already recorded are kept.
+
+        :param enabled: whether or not to collect metrics
+        """
+        self.enabled = enabled
+
+    def reset(self):
+        """
+        Forgets every metric recorded so far.
+        """
+        self.counters = {}
+        self.histograms = {}
+        self.timers = {}
+        self.gauges = {}
+
+    def increment(self, name: str, amount: int=1):
+        """
+        Adds to a counter.
+
+        :param name: the name of the counter
+        :param amount: the amount to add
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float):
+        """
+        Records a sample in a histogram.
+
+        :param name: the name of the histogram
+        :param value: the value of the sample
+        """
+        if self.enabled:
+            self.histograms.setdefault(name, Histogram()).observe(value)
+
+    def observe_time(self, name: str, milliseconds: float):
+        """
+        Records how long something took.
+
+        :param name: the name of the timer
+        :param milliseconds: how long it took
+        """
+        if self.enabled:
+            self.timers.setdefault(name, Histogram()).observe(milliseconds)
+
+    def set_gauge(self, name: str, value: float):
+        """
+        Sets a value that is replaced rather than added to, e.g. the
+        memory a data file uses.
+
+        :param name: the name of the gauge
+        :param value: the new value
+        """
+        if self.enabled:
+            self.gauges[name] = value
+
+    def timer(self, name: str):
+        """
+        Times a with block.
+
+        :param name: the name of the timer
+        :returns: a context manager timing the block
+        """
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def timed(self, name: str):
+        """
+        A decorator timing every call to a function.
+
+        :param name: the name of the timer
+        :returns: the decorator
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe_time(name, (time.perf_counter() - start) * 1000)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self):
+        """
+        :returns: every metric recorded so far as JSON serialisable data
+        """
+        return {
+            "enabled": self.enabled,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {name: histogram.summary() for name, histogram in self.histograms.items()},
+            "timers_ms": {name: histogram.summary() for name, histogram in self.timers.items()}
+        }
+
+    def report(self):
+        """
+        Formats every metric recorded so far as a table.
+
+        :returns: the report as text
+        """
+        if not (self.counters or self.histograms or self.timers or self.gauges):
+            return "No metrics recorded" + ("" if self.enabled else " (collection is off)")
+
+        lines = []
+        for title, histograms in (("Timers (ms)", self.timers), ("Histograms", self.histograms)):
+            if histograms:
+                lines.append(f"{title:<40} {'count':>7} {'mean':>10} {'p50':>10} {'p95':>10} {'max':>10}")
+                for name in sorted(histograms):
+                    summary = histograms[name].summary()
+                    lines.append(f"  {name:<38} {summary['count']:>7} " + " ".join(
+                        f"{summary[column]:>10.2f}" for column in ("mean", "p50", "p95", "max")))
+
+        if self.counters:
+            lines.append("Counters")
+            lines += [f"  {name:<38} {self.counters[name]:>7}" for name in sorted(self.counters)]
+
+        if self.gauges:
+            lines.append("Gauges")
+            for name in sorted(self.gauges):
+                value = self.gauges[name]
+                if name.startswith("memory."):
+                    lines.append(f"  {name:<38} {value / 2 ** 20:>10.2f} MB")
+                else:
+                    lines.append(f"  {name:<38} {value:>10}")
+
+        return "\n".join(lines)
+
+    def log_report(self, level: int=logging.INFO):
+        """
+        Writes the report to the log, if anything has been recorded.
+
+        :param level: the logging level to write the report at
+        """
+        if self.enabled or self.timers or self.counters:
+            logging.log(level, f"Metrics:\n{self.report()}")
+
+
+def deep_size(value):
+    """
+    Estimates the memory used by a value and everything in it. Values
+    shared between several data files (see indexes.InternPool) are
+    counted for each file, so the sizes of several files can add up to
+    more than they use together.
+
+    :param value: the value to measure
+    :returns: the estimated size in bytes
+    """
+    seen = set()
+    stack = [value]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+
+        if isinstance(item, dict):
+            stack += item.keys()
+            stack += item.values()
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack += item
+
+    return size
+
+
+# The metrics the rest of the program records into
+registry = Metrics()
+
+enable = registry.enable
+reset = registry.reset
+increment = registry.increment
+observe = registry.observe
+set_gauge = registry.set_gauge
+timer = registry.timer
+timed = registry.timed
+snapshot = registry.snapshot
+report = registry.report
+log_report = registry.log_report
+
+
+def is_enabled():
+    """
+    :returns: whether or not metrics are being collected
+    """
+    return registry.enabled
@@ -0,0 +1,88 @@
+"""
+Handles named profiles in the config, so that several mods (e.g. vanilla
+Soulstorm and Ultimate Apocalypse) can be generated and loaded side by
+side.
+
+A profile is an object in the config's "profiles" mapping. Any top level
+config value can be overridden by a profile (e.g. "corsixWeaponDPS" and
+"troops"), and "dataDirectory" moves all of the profile's data files
+into their own directory:
+
+    "profiles": {
+        "UA Salcol": {
+            "corsixWeaponDPS": "input/salcol/weapon_stats.csv",
+            "troops": {"Orks": "input/salcol/orks"},
+            "dataDirectory": "data/salcol"
+        }
+    }
+
+The top level config is used when no profile is given.
+"""
+from pathlib import Path
+
+from file_handlers import load_from_json
+
+
+class ProfileNotFoundError(Exception):
+    """
+    An exception for when a profile isn't in the config.
+    """
+    def __init__(self, profile: str):
+        """
+        :param profile: the name of the profile that couldn't be found
+        """
+        super().__init__(f"The profile ({profile}) was not found in the config")
+
+
+def get_profile_names(config: dict):
+    """
+    Gets the names of the profiles in the config.
+
+    :param config: the configuration for the program
+    :returns: a list of profile names
+    """
+    return list(config.get("profiles", {}))
+
+
+def get_profile_config(config: dict, profile: str=None):
+    """
+    Gets the configuration for a profile by overriding the top level
+    config with the profile's values.
+
+    :param config: the configuration for the program
+    :param profile: the name of the profile, or None for the top level
+                    config
+    :returns: the configuration for the profile
+    :raises ProfileNotFoundError: when the profile isn't in the config
+    """
+    profile_config = {key: value for key, value in config.items() if key != "profiles"}
+    if profile is None:
+        return profile_config
+
+    profiles = config.get("profiles", {})
+    if profile not in profiles:
+        raise ProfileNotFoundError(profile)
+
+    overrides = dict(profiles[profile])
+    data_directory = overrides.pop("dataDirectory", None)
+    profile_config.update(overrides)
+
+    if data_directory:
+        profile_config["data"] = {
+            data_file: str(Path(data_directory) / Path(data_path).name)
+            for data_file, data_path in profile_config["data"].items()
+        }
+
+    return profile_config
+
+
+def load_profile_config(config_path: str="config.json", profile: str=None):
+    """
+    Loads the config file and gets the configuration for a profile.
+
+    :param config_path: the path to the config file
+    :param profile: the name of the profile, or None for the top level
+                    config
+    :returns: the configuration for the profile
+    """
+    return get_profile_config(load_from_json(config_path, True), profile)
@@ -0,0 +1,214 @@
+"""
+Answers counter queries from the generated data, for use without the GUI.
+
+The troops and scores data files are loaded once, and each race's troops
+are indexed by filename and display name, so each query is a few
+dictionary lookups plus a slice of a pre-sorted ranking.
+"""
+import logging
+
+from file_handlers import load_from_json
+from indexes import InternPool
+from metrics import timed
+from profiles import get_profile_config
+from scoring import METRICS
+
+
+class QueryError(Exception):
+    """
+    An exception for when a query can't be answered, e.g. because the
+    race or troop doesn't exist.
+    """
+    pass
+
+
+def check_text(name: str, value, optional: bool=False):
+    """
+    Checks a query field is a string, since queries can come from JSON or
+    anywhere else that doesn't guarantee it.
+
+    :param name: the name of the field, for the error message
+    :param value: the field's value
+    :param optional: whether or not the field can be None
+    :raises QueryError: when the value isn't a string
+    """
+    if not isinstance(value, str) and not (optional and value is None):
+        raise QueryError(f"{name} must be a string, not {type(value).__name__}")
+
+
+class CounterQuery():
+    """
+    Answers which player troops and weapons best counter an opponent's
+    troop or armour type.
+    """
+
+    def __init__(self, troops_dict: dict, scores: dict):
+        """
+        :param troops_dict: every troop organised by race
+        :param scores: the scores generated by the scoring stage
+        """
+        self.troops = troops_dict
+        self.scores = scores
+
+        # Troops can be looked up by filename or (case insensitive) display name
+        self.troop_lookup = {}
+        for race, race_troops in troops_dict.items():
+            lookup = {}
+            for troop_file, troop in race_troops.items():
+                if troop["display_name"]:
+                    lookup.setdefault(troop["display_name"].lower(), troop_file)
+                lookup[troop_file.lower()] = troop_file
+            self.troop_lookup[race] = lookup
+
+        # Every troop's lowercase searchable text, for troop searches
+        self.search_index = [
+            (f"{troop['display_name'] or ''} {troop_file}".lower(), race, troop_file)
+            for race, race_troops in troops_dict.items()
+            for troop_file, troop in race_troops.items()
+        ]
+
+    @classmethod
+    def from_config(cls, config: dict, pool: InternPool=None):
+        """
+        Loads the data files named in the config.
+
+        :param config: the configuration for the program
+        :param pool: the pool to share loaded values through, so that
+                        several profiles can be loaded side by side
+        :returns: a CounterQuery over the data files
+        """
+        logging.info(f"Loading data for counter queries ({config['data']['scores']})")
+        load = pool.load_json if pool is not None else load_from_json
+        return cls(load(config["data"]["troops"]), load(config["data"]["scores"]))
+
+    def find_troop(self, race: str, troop: str):
+        """
+        Finds a troop by filename or display name.
+
+        :param race: the race the troop belongs to
+        :param troop: the troop's filename or display name
+        :returns: the troop's information
+        :raises QueryError: when the race or troop can't be found
+        """
+        check_text("race", race)
+        check_text("troop", troop)
+        if race not in self.troops:
+            raise QueryError(f"Unknown race: {race}")
+
+        troop_file = self.troop_lookup[race].get(troop.lower())
+        if troop_file is None:
+            raise QueryError(f"Unknown troop for {race}: {troop}")
+
+        return self.troops[race][troop_file]
+
+    @timed("query.counters")
+    def counters(self, player_race: str, armour_type: str=None, opponent_race: str=None,
+                 troop: str=None, k: int=10, metric: str="dps"):
+        """
+        Finds the best counters to an armour type, or to an opponent's
+        troop (which is counted by its armour type).
+
+        :param player_race: the race the player is playing
+        :param armour_type: the armour type to counter
+        :param opponent_race: the race of the troop to counter
+        :param troop: the filename or display name of the troop to counter
+        :param k: the number of counters to return, or None for all of them
+        :param metric: the metric to rank the counters by
+        :returns: a dictionary of the armour type and a list of the
+                    counters, best first
+        :raises QueryError: when the query can't be answered
+        """
+        check_text("player_race", player_race)
+        check_text("armour_type", armour_type, True)
+        check_text("opponent_race", opponent_race, True)
+        check_text("troop", troop, True)
+        check_text("metric", metric)
+        if k is not None and (not isinstance(k, int) or isinstance(k, bool)):
+            raise QueryError(f"k must be an integer, not {type(k).__name__}")
+        if k is not None and k < 1:
+            raise QueryError(f"k must be at least 1: {k}")
+        if metric not in METRICS:
+            raise QueryError(f"Unknown metric: {metric}")
+        if player_race not in self.scores["races"]:
+            raise QueryError(f"Unknown race: {player_race}")
+
+        if troop is not None:
+            if opponent_race is None:
+                raise QueryError("A troop query needs the opponent's race")
+            armour_type = self.find_troop(opponent_race, troop)["armour_types"]
+            if armour_type is None:
+                raise QueryError(f"Troop has no armour type: {troop}")
+        elif armour_type is None:
+            raise QueryError("Either a troop or an armour type is needed")
+
+        race_scores = self.scores["races"][player_race]
+        armour_type_scores = race_scores["armourTypes"].get(armour_type)
+        if armour_type_scores is None:
+            raise QueryError(f"Unknown armour type: {armour_type}")
+
+        rows = race_scores["rows"]
+        values = armour_type_scores["values"][metric]
+        order = armour_type_scores["order"][metric]
+        race_troops = self.troops[player_race]
+
+        counters = []
+        for row in order[:k]:
+            troop_file, weapon = rows[row]
+            counters.append({
+                "troop_file": troop_file,
+                "display_name": race_troops[troop_file]["display_name"],
+                "weapon": weapon,
+                metric: values[row]
+            })
+
+        return {"armour_type": armour_type, "counters": counters}
+
+    @timed("query.search")
+    def search(self, text: str, race: str=None, limit: int=20):
+        """
+        Finds troops whose display name or filename contains some text.
+
+        :param text: the text to search for (case insensitive)
+        :param race: the race to search in, or None for every race
+        :param limit: the most troops to return
+        :returns: a list of the matching troops
+        :raises QueryError: when the race doesn't exist
+        """
+        check_text("text", text)
+        check_text("race", race, True)
+        if race is not None and race not in self.troops:
+            raise QueryError(f"Unknown race: {race}")
+
+        text = text.lower()
+        matches = []
+        for searchable, troop_race, troop_file in self.search_index:
+            if len(matches) >= limit:
+                break
+            if text in searchable and (race is None or race == troop_race):
+                troop = self.troops[troop_race][troop_file]
+                matches.append({
+                    "race": troop_race,
+                    "troop_file": troop_file,
+                    "display_name": troop["display_name"],
+                    "armour_type": troop["armour_types"]
+                })
+
+        return matches
+
+
+@timed("query.load_counter_queries")
+def load_counter_queries(config: dict, profiles: list=None):
+    """
+    Loads a CounterQuery for each profile, sharing identical values
+    between them.
+
+    :param config: the configuration for the program
+    :param profiles: the names of the profiles to load, None meaning the
+                        top level config
+    :returns: a dictionary mapping each profile name to its CounterQuery
+    """
+    pool = InternPool()
+    return {
+        profile: CounterQuery.from_config(get_profile_config(config, profile), pool)
+        for profile in profiles or [None]
+    }
@@ -0,0 +1,169 @@
+"""
+Scores every troop and weapon pair in each race against each armour type.
+
+Raw DPS ignores how much a troop costs and how much health its target has,
+so this module weights the DPS by:
+ - Squad DPS -- the DPS multiplied by the troop's squad size
+ - DPS per resource -- the squad DPS divided by the troop's requisition
+   and power cost
+ - Time to kill -- the average health of the troops with the armour type
+   divided by the squad DPS
+
+Each race's pairs are laid out once as columns, and every metric is worked
+out a whole column (one armour type) at a time. Each metric also has a
+pre-computed ranking so the GUI can sort by any metric without recomputing.
+"""
+import logging
+
+from array import array
+from operator import mul, truediv
+
+METRICS = ("dps", "squad_dps", "dps_per_resource", "time_to_kill")
+METRIC_LABELS = {
+    "dps": "DPS",
+    "squad_dps": "Squad DPS",
+    "dps_per_resource": "DPS/Cost",
+    "time_to_kill": "TTK (s)"
+}
+# Metrics where a lower value is better
+ASCENDING_METRICS = {"time_to_kill"}
+
+
+def calculate_scores(troops_dict: dict, weapons_dict: dict, armour_types: list):
+    """
+    Scores each race's troop and weapon pairs against each armour type.
+
+    :param troops_dict: every troop in DoW organised by race
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types to score against
+    :returns: a dictionary containing the metric names and, for each
+                race, the troop and weapon rows along with each metric's
+                values and ranking for each armour type
+    """
+    target_health = get_armour_type_health(troops_dict, armour_types)
+    scores = {"metrics": list(METRICS), "races": {}}
+
+    for race in troops_dict:
+        logging.debug("Scoring %s", race)
+
+        rows, squad_sizes, costs = get_race_columns(troops_dict[race])
+        race_scores = {"rows": rows, "armourTypes": {}}
+
+        for armour_type in armour_types:
+            dps = array("d", [weapons_dict[weapon][armour_type] for _, weapon in rows])
+            values = score_column(dps, squad_sizes, costs, target_health[armour_type])
+            race_scores["armourTypes"][armour_type] = {
+                "values": values,
+                "order": rank_metrics(values)
+            }
+
+        scores["races"][race] = race_scores
+
+    return scores
+
+
+def get_race_columns(race_troops_dict: dict):
+    """
+    Lays out a race's troop and weapon pairs as rows, along with the
+    squad size and cost columns for those rows.
+
+    :param race_troops_dict: every troop in a race
+    :returns: (a list of [troop file, weapon] rows, an array of squad
+                sizes, an array of costs)
+    """
+    rows = []
+    squad_sizes = array("d")
+    costs = array("d")
+
+    for troop_file, troop in race_troops_dict.items():
+        squad_size = troop.get("squad_size", 1)
+        cost = get_troop_cost(troop)
+        for weapon in sorted(troop["weapons"]):
+            rows.append([troop_file, weapon])
+            squad_sizes.append(squad_size)
+            costs.append(cost)
+
+    return rows, squad_sizes, costs
+
+
+def get_troop_cost(troop: dict):
+    """
+    Gets the total resource cost of a troop. Free troops are treated as
+    costing a single resource so they can still be divided by.
+
+    :param troop: the troop's information
+    :returns: the troop's total cost
+    """
+    cost = troop.get("cost", {})
+    return max(cost.get("requisition", 0) + cost.get("power", 0), 1)
+
+
+def get_armour_type_health(troops_dict: dict, armour_types: list):
+    """
+    Finds the average squad health of the troops with each armour type.
+    Armour types that no troop has use the average across all troops.
+
+    :param troops_dict: every troop in DoW organised by race
+    :param armour_types: the armour types to find the health of
+    :returns: a dictionary mapping each armour type to an average health
+    """
+    health_totals = {}
+    for race_troops in troops_dict.values():
+        for troop in race_troops.values():
+            squad_health = troop.get("health", 0) * troop.get("squad_size", 1)
+            health_totals.setdefault(troop["armour_types"], []).append(squad_health)
+
+    all_health = [health for totals in health_totals.values() for health in totals]
+    default_health = sum(all_health) / len(all_health) if all_health else 0
+
+    armour_type_health = {}
+    for armour_type in armour_types:
+        totals = health_totals.get(armour_type)
+        armour_type_health[armour_type] = sum(totals) / len(totals) if totals else default_health
+
+    return armour_type_health
+
+
+def score_column(dps: array, squad_sizes: array, costs: array, target_health: float):
+    """
+    Works out every metric for a column of DPS values.
+
+    :param dps: the DPS of each row against an armour type
+    :param squad_sizes: the squad size of each row's troop
+    :param costs: the cost of each row's troop
+    :param target_health: the average health of the armour type
+    :returns: a dictionary mapping each metric to a list of its values
+    """
+    squad_dps = list(map(mul, dps, squad_sizes))
+    dps_per_resource = list(map(truediv, squad_dps, costs))
+    # A troop that does no damage can never kill the target
+    time_to_kill = [target_health / damage if damage > 0 else None for damage in squad_dps]
+
+    return {
+        "dps": dps.tolist(),
+        "squad_dps": squad_dps,
+        "dps_per_resource": dps_per_resource,
+        "time_to_kill": time_to_kill
+    }
+
+
+def rank_metrics(values: dict):
+    """
+    Ranks the rows of each metric from best to worst.
+
+    :param values: a dictionary mapping each metric to a list of its values
+    :returns: a dictionary mapping each metric to a list of row indexes,
+                best first
+    """
+    order = {}
+    for metric, column in values.items():
+        if metric in ASCENDING_METRICS:
+            # Rows that can never kill the target go last
+            order[metric] = sorted(
+                range(len(column)),
+                key=lambda index: (column[index] is None, column[index] or 0))
+        else:
+            order[metric] = sorted(range(len(column)), key=column.__getitem__, reverse=True)
+
+    return order
@@ -0,0 +1,326 @@
+"""
+A small HTTP service that answers counter queries from memory, e.g. for
+a Discord bot or a stream overlay.
+
+The data files are loaded once, and reloaded in the background whenever
+the data is regenerated. When the config has a manifest data file, the
+data is reloaded once the manifest changes, as generate_data writes it
+after every other data file. Queries carry on being answered from the
+old data until the new data has fully loaded, then the new data is
+swapped in as a whole.
+
+Endpoints (all GET, all return JSON):
+    /counters?player_race=&opponent_race=&troop=&k=&metric=&profile=
+    /counters?player_race=&armour_type=&k=&metric=&profile=
+    /search?q=&race=&limit=&profile=
+    /health
+    /metrics (when started with --metrics)
+
+Usage: python server.py [--host 127.0.0.1] [--port 8080] [--profile NAME ...] [--metrics]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from urllib.parse import parse_qsl, urlsplit
+
+import metrics
+
+from file_handlers import load_from_json
+from profiles import get_profile_config
+from query import QueryError, load_counter_queries
+
+# The data files the service answers queries from, watched when there is
+# no manifest
+WATCHED_DATA_FILES = ("troops", "scores")
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+class QueryService():
+    """
+    Holds the CounterQuery being used to answer requests and reloads it
+    when the data files change.
+    """
+
+    def __init__(self, config: dict, profiles: list=None):
+        """
+        :param config: the configuration for the program
+        :param profiles: the names of the config profiles to serve, the
+                            first being the default. None serves the top
+                            level config
+        """
+        self.config = config
+        self.profiles = profiles or [None]
+        profile_data = [get_profile_config(config, profile)["data"] for profile in self.profiles]
+        self.use_manifest = all("manifest" in data for data in profile_data)
+        if self.use_manifest:
+            self.data_paths = [data["manifest"] for data in profile_data]
+        else:
+            self.data_paths = [data[data_file] for data in profile_data for data_file in WATCHED_DATA_FILES]
+        self.data_version = self.get_data_version()
+        self.counter_queries = self.load()
+        self.reloads = 0
+
+    def load(self, profiles: list=None):
+        """
+        Loads profiles' data, sharing identical values between them.
+
+        :param profiles: the profiles to load, or None for every profile
+        :returns: a dictionary mapping each profile to its CounterQuery
+        """
+        return load_counter_queries(self.config, profiles or self.profiles)
+
+    def get_data_version(self):
+        """
+        Gets the modification times of the manifests (or the data files
+        without them), which change every time the data is regenerated.
+        A manifest that hasn't been written yet (e.g. for data generated
+        before manifests were set in the config) has no time, and the
+        profile is reloaded once it is written.
+
+        :returns: a tuple of modification times, None for missing files
+        """
+        return tuple(get_modification_time(data_path) for data_path in self.data_paths)
+
+    async def watch(self, interval: float):
+        """
+        Reloads the data whenever it is regenerated. With manifests, a
+        profile is reloaded as soon as its manifest is rewritten, leaving
+        the other profiles as they are. Without them, a change is only
+        loaded once the data files have stopped changing for an interval,
+        so a half finished regeneration is never loaded.
+
+        :param interval: the number of seconds between checks
+        """
+        loop = asyncio.get_running_loop()
+        pending_version = None
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                version = self.get_data_version()
+            except OSError:
+                continue
+
+            if version == self.data_version:
+                pending_version = None
+                continue
+            if not self.use_manifest and None in version:
+                # The files are being replaced
+                continue
+            if not self.use_manifest and version != pending_version:
+                pending_version = version
+                continue
+
+            if self.use_manifest:
+                # There is a manifest per profile, in the same order
+                profiles = [profile for profile, new, old in zip(self.profiles, version, self.data_version)
+                            if new != old]
+            else:
+                profiles = self.profiles
+
+            try:
+                # Load in a thread so requests are answered while loading
+                counter_queries = await loop.run_in_executor(None, self.load, profiles)
+            except Exception as e:
+                logging.error(f"Failed to reload data: {e}")
+                continue
+
+            self.counter_queries = {**self.counter_queries, **counter_queries}
+            self.data_version = version
+            self.reloads += 1
+            pending_version = None
+            logging.info(f"Reloaded data for {', '.join(str(profile) for profile in profiles)}")
+
+    def handle(self, path: str, params: dict):
+        """
+        Answers a request.
+
+        :param path: the request path
+        :param params: the query string parameters
+        :returns: (the HTTP status, the response data)
+        """
+        if path == "/health":
+            return 200, {"status": "ok", "reloads": self.reloads, "profiles": self.profiles}
+        if path == "/metrics":
+            if not metrics.is_enabled():
+                return 404, {"error": "Metrics are not being collected, start the service with --metrics"}
+            return 200, metrics.snapshot()
+
+        profile = params.get("profile", self.profiles[0])
+        counter_query = self.counter_queries.get(profile)
+        if counter_query is None:
+            return 400, {"error": f"Profile not loaded: {profile}"}
+
+        try:
+            if path == "/counters":
+                k = int(params["k"]) if "k" in params else 10
+                return 200, counter_query.counters(
+                    params.get("player_race"), params.get("armour_type"),
+                    params.get("opponent_race"), params.get("troop"),
+                    k, params.get("metric", "dps"))
+            elif path == "/search":
+                limit = int(params["limit"]) if "limit" in params else 20
+                return 200, {"troops": counter_query.search(params.get("q", ""), params.get("race"), limit)}
+        except (QueryError, ValueError) as e:
+            return 400, {"error": str(e)}
+        except LookupError as e:
+            # The data doesn't match itself, e.g. it was regenerated with
+            # different data files
+            logging.exception(f"Failed to answer {path}: {e!r}")
+            return 500, {"error": f"Inconsistent data: {e!r}"}
+
+        return 404, {"error": f"Unknown path: {path}"}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Answers the requests on a connection, keeping it open between
+        requests unless the client asks for it to be closed.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = await read_headers(reader)
+                method, target, version = parse_request_line(request_line)
+
+                if method is None:
+                    status, data = 400, {"error": "Malformed request"}
+                elif method != "GET":
+                    status, data = 405, {"error": f"Unsupported method: {method}"}
+                else:
+                    url = urlsplit(target)
+                    try:
+                        status, data = self.handle(url.path, dict(parse_qsl(url.query)))
+                    except Exception as e:
+                        logging.exception(f"Failed to answer {target}: {e!r}")
+                        status, data = 500, {"error": "Internal error"}
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(build_response(status, data, keep_alive))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def get_modification_time(file_path: str):
+    """
+    :param file_path: the path to the file
+    :returns: the file's modification time in nanoseconds, or None if it
+                doesn't exist
+    """
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+async def read_headers(reader):
+    """
+    Reads the headers of a request.
+
+    :param reader: the connection's StreamReader
+    :returns: a dictionary of lowercase header names to values
+    """
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+def parse_request_line(request_line: bytes):
+    """
+    Splits a HTTP request line into its parts.
+
+    :param request_line: the first line of the request
+    :returns: (the method, the target, the HTTP version) or Nones if the
+                line is malformed
+    """
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3:
+        return None, None, None
+
+    return parts[0], parts[1], parts[2]
+
+
+def build_response(status: int, data: dict, keep_alive: bool):
+    """
+    Builds a HTTP response with a JSON body.
+
+    :param status: the HTTP status code
+    :param data: the data to send as JSON
+    :param keep_alive: whether or not to keep the connection open
+    :returns: the response as bytes
+    """
+    body = json.dumps(data).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def serve(config: dict, host: str, port: int, reload_interval: float, profiles: list=None):
+    """
+    Runs the service until it is stopped.
+
+    :param config: the configuration for the program
+    :param host: the host to listen on
+    :param port: the port to listen on
+    :param reload_interval: the number of seconds between data file checks
+    :param profiles: the names of the config profiles to serve
+    """
+    service = QueryService(config, profiles)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    watcher = asyncio.create_task(service.watch(reload_interval))
+
+    logging.info(f"Serving counter queries on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+def main(args: list=None):
+    parser = argparse.ArgumentParser(description="Serve DoW Troop Counters queries over HTTP.")
+    parser.add_argument("--config", default="config.json", help="the config file to use")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--reload-interval", type=float, default=1.0,
+                        help="the number of seconds between checks for new data")
+    parser.add_argument("--profile", action="append",
+                        help="a config profile to serve (can be given more than once, the first is the default)")
+    parser.add_argument("--metrics", action="store_true", help="collect query timings and serve them on /metrics")
+    args = parser.parse_args(args)
+
+    config = load_from_json(args.config, True)
+    logging.basicConfig(level=config["loggingLevel"], format="%(asctime)s %(levelname)s: %(message)s")
+    if args.metrics or config.get("metrics"):
+        metrics.enable()
+
+    try:
+        asyncio.run(serve(config, args.host, args.port, args.reload_interval, args.profile))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
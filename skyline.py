@@ -0,0 +1,214 @@
+"""
+Finds each race's all-round units: the troop and weapon pairs that no
+other pair in the race beats (or equals) against every armour type. When
+scouting is uncertain these are the safest picks, since whatever the
+opponent fields there is nothing strictly better to have built.
+
+A pair dominates another when it does at least as much against every
+armour type and more against at least one. The pairs nothing dominates
+are the skyline (depth 0). Every other pair's dominance depth is one more
+than the deepest pair dominating it, so depth 1 pairs are only beaten by
+skyline pairs, depth 2 pairs by depth 1 pairs, and so on.
+
+The pairs are sorted by their total DPS first, so every pair comes after
+all of the pairs that dominate it. The pairs dominating each pair are
+then found as a bitset (a Python int with a bit per pair, in that order),
+ANDing together the pairs doing at least as much against each armour
+type, and each pair's depth is found with a binary search over the
+bitsets of each depth. Pairs are handled in blocks so the bitsets for a
+race with tens of thousands of pairs still fit in memory.
+"""
+import logging
+
+from scoring import get_race_columns
+
+# Each metric's multiplier of a row's DPS, given its squad size and cost
+SKYLINE_METRICS = {
+    "dps": lambda squad_size, cost: 1,
+    "squad_dps": lambda squad_size, cost: squad_size,
+    "dps_per_resource": lambda squad_size, cost: squad_size / cost
+}
+# The most bits of dominator bitsets held at once (64MB). Each pass over
+# the columns finds the dominators of as many pairs as fit
+BLOCK_BITS = 2 ** 29
+# The fewest pairs whose dominators are found in each pass
+MIN_BLOCK_ROWS = 1024
+
+
+class SkylineError(Exception):
+    """
+    An exception for when a skyline can't be found, e.g. because the
+    metric doesn't exist.
+    """
+    pass
+
+
+def calculate_skylines(troops_dict: dict, weapons_dict: dict, armour_types: list, metric: str="dps"):
+    """
+    Finds the skyline and dominance depths of every race's troop and
+    weapon pairs.
+
+    :param troops_dict: every troop in DoW organised by race
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types to compare the pairs across
+    :param metric: the metric to compare the pairs by, one of
+                    SKYLINE_METRICS (time to kill ranks the same as
+                    squad DPS)
+    :returns: a dictionary of the metric, the armour types and each
+                race's skyline (see calculate_race_skyline)
+    :raises SkylineError: when the metric doesn't exist
+    """
+    skylines = {"metric": metric, "armourTypes": list(armour_types), "races": {}}
+    for race, race_troops in troops_dict.items():
+        skylines["races"][race] = calculate_race_skyline(race_troops, weapons_dict, armour_types, metric)
+        logging.debug("Found the skyline for %s", race)
+
+    return skylines
+
+
+def calculate_race_skyline(race_troops_dict: dict, weapons_dict: dict, armour_types: list, metric: str="dps"):
+    """
+    Finds the skyline and dominance depths of a race's troop and weapon
+    pairs. Pairs with exactly the same values (e.g. two troops with the
+    same weapon) share a depth and don't dominate each other.
+
+    :param race_troops_dict: every troop in the race
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types to compare the pairs across
+    :param metric: the metric to compare the pairs by
+    :returns: a dictionary of the [troop file, weapon] rows (in the same
+                order as scores.json), each row's depth and the rows on
+                the skyline
+    :raises SkylineError: when the metric doesn't exist
+    """
+    if metric not in SKYLINE_METRICS:
+        raise SkylineError(f"Unknown skyline metric: {metric}")
+    get_multiplier = SKYLINE_METRICS[metric]
+
+    rows, squad_sizes, costs = get_race_columns(race_troops_dict)
+    vector_ids = {}
+    row_vectors = []
+    for (_, weapon), squad_size, cost in zip(rows, squad_sizes, costs):
+        multiplier = get_multiplier(squad_size, cost)
+        damages = weapons_dict[weapon]
+        vector = tuple([damages[armour_type] * multiplier for armour_type in armour_types])
+        row_vectors.append(vector_ids.setdefault(vector, len(vector_ids)))
+
+    depths = dominance_depths(reduce_columns(list(vector_ids)))
+    row_depths = [depths[vector] for vector in row_vectors]
+    return {
+        "rows": rows,
+        "depth": row_depths,
+        "skyline": [row for row, depth in enumerate(row_depths) if depth == 0]
+    }
+
+
+def reduce_columns(vectors: list):
+    """
+    Drops the columns that can't change which vectors dominate which:
+    columns every vector has the same value in, and copies of an earlier
+    column.
+
+    :param vectors: a list of different vectors
+    :returns: the vectors without those columns, still all different
+    """
+    columns = []
+    seen = set()
+    for column in zip(*vectors):
+        if column not in seen and min(column) != max(column):
+            columns.append(column)
+        seen.add(column)
+
+    return list(zip(*columns)) if columns else [()] * len(vectors)
+
+
+def dominance_depths(vectors: list):
+    """
+    Finds the dominance depth of each vector, higher values being better.
+
+    :param vectors: a list of different vectors, all the same length
+    :returns: a list of each vector's depth, 0 for the skyline
+    """
+    count = len(vectors)
+    # Anything dominating a vector has a larger total, or the same total
+    # (after rounding) and a larger first differing value
+    order = sorted(range(count), key=lambda index: (sum(vectors[index]), vectors[index]), reverse=True)
+    columns = list(zip(*[vectors[index] for index in order]))
+    column_orders = [sorted(range(count), key=column.__getitem__, reverse=True) for column in columns]
+
+    # The bitset of the positions at each depth
+    layers = []
+    sorted_depths = []
+    block_rows = max(MIN_BLOCK_ROWS, BLOCK_BITS // max(count, 1))
+    for start in range(0, count, block_rows):
+        end = min(count, start + block_rows)
+        for position, dominators in enumerate(find_dominators(columns, column_orders, start, end), start):
+            # A vector dominated by one at depth n is also dominated by one
+            # at every depth before n, so the first depth without any of
+            # its dominators is its depth
+            low, high = 0, len(layers)
+            while low < high:
+                middle = (low + high) // 2
+                if dominators & layers[middle]:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            if low == len(layers):
+                layers.append(0)
+            layers[low] |= 1 << position
+            sorted_depths.append(low)
+
+    depths = [0] * count
+    for position, index in enumerate(order):
+        depths[index] = sorted_depths[position]
+
+    return depths
+
+
+def find_dominators(columns: list, column_orders: list, start: int, end: int):
+    """
+    Finds the vectors dominating each vector in a block.
+
+    :param columns: the values of each column, in position order
+    :param column_orders: the positions in each column from the largest
+                            value to the smallest
+    :param start: the first position in the block
+    :param end: the position after the block
+    :returns: a list of bitsets of the positions dominating each position
+                in the block
+    """
+    # Only earlier positions can dominate, which also leaves a vector out
+    # of its own dominators
+    dominators = [(1 << position) - 1 for position in range(start, end)]
+
+    for column, column_order in zip(columns, column_orders):
+        # The positions with at least the current value in this column
+        at_least = 0
+        # The block's positions with the current value
+        tied = []
+        remaining = end - start
+        previous = None
+        for position in column_order:
+            value = column[position]
+            if value != previous:
+                # Every position with the previous value has been added
+                for tied_position in tied:
+                    dominators[tied_position - start] &= at_least
+                tied = []
+                if not remaining:
+                    break
+                previous = value
+
+            if position < end:
+                at_least |= 1 << position
+                if position >= start:
+                    tied.append(position)
+                    remaining -= 1
+
+        for tied_position in tied:
+            dominators[tied_position - start] &= at_least
+
+    return dominators
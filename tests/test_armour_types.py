@@ -0,0 +1,35 @@
+"""
+Tests reading the armour type rows of the weapon file.
+"""
+from armour_types import map_troops_to_armour_types
+
+WEAPON_FILE = """DoW DPS Calculator{delimiter}{delimiter}
+File{delimiter}infantry_low{delimiter}vehicle_low
+bolter.rgd{delimiter}10.5{delimiter}1.0
+
+infantry_low{delimiter}"space marine squad, scout squad"
+vehicle_low{delimiter}"rhino"
+"""
+
+
+def map_weapon_file(tmp_path, delimiter: str, encoding: str="utf-8"):
+    path = tmp_path / "weapon_stats.csv"
+    path.write_text(WEAPON_FILE.format(delimiter=delimiter), encoding=encoding)
+    return map_troops_to_armour_types(str(path), {"infantry_low", "vehicle_low"})
+
+
+def test_comma_separated(tmp_path):
+    armour_types = map_weapon_file(tmp_path, ",")
+    assert armour_types["armourTypeToTroops"] == {
+        "infantry_low": ["scout_squad.lua", "space_marine_squad.lua"],
+        "vehicle_low": ["rhino.lua"]
+    }
+    assert armour_types["troopsToArmourType"]["rhino.lua"] == "vehicle_low"
+
+
+def test_semicolon_separated_with_byte_order_mark(tmp_path):
+    assert map_weapon_file(tmp_path, ";", "utf-8-sig") == map_weapon_file(tmp_path, ",")
+
+
+def test_tab_separated(tmp_path):
+    assert map_weapon_file(tmp_path, "\t") == map_weapon_file(tmp_path, ",")
@@ -0,0 +1,22 @@
+"""
+Tests totalling the health of the opponent's army.
+"""
+import pytest
+
+from army import ArmyError, get_target_health
+
+TROOPS = {
+    "Orks": {
+        "boyz.lua": {"display_name": "Boyz", "armour_types": "infantry_low", "health": 100, "squad_size": 5},
+        "squiggoth.lua": {"display_name": "Squiggoth", "armour_types": None, "health": 4000, "squad_size": 1}
+    }
+}
+
+
+def test_target_health():
+    assert get_target_health(TROOPS, [("Orks", "Boyz", 2)]) == {"infantry_low": 1000}
+
+
+def test_troop_without_armour_type():
+    with pytest.raises(ArmyError, match="no armour type"):
+        get_target_health(TROOPS, [("Orks", "Boyz", 1), ("Orks", "squiggoth.lua", 1)])
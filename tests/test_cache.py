@@ -0,0 +1,126 @@
+"""
+Tests the cache key of the generated data and the cache of parsed troop
+files.
+"""
+import os
+import time
+
+import cache
+
+from cache import ParseCache, get_input_hash
+
+# An hour ago, so the files aren't too new to be cached
+OLD_NANOSECONDS = time.time_ns() - 3600 * 10 ** 9
+
+
+def make_config(tmp_path, **settings):
+    weapon_file = tmp_path / "weapon_stats.csv"
+    weapon_file.write_text("File,infantry_low\n")
+    config = {
+        "corsixWeaponDPS": str(weapon_file),
+        "data": {"skyline": str(tmp_path / "skyline.json")},
+        "troops": {"Space Marines": str(tmp_path / "space_marines")}
+    }
+    config.update(settings)
+    return config
+
+
+def test_skyline_metric_changes_hash(tmp_path):
+    dps_hash = get_input_hash(make_config(tmp_path, skylineMetric="dps"))
+    squad_dps_hash = get_input_hash(make_config(tmp_path, skylineMetric="squad_dps"))
+    assert dps_hash != squad_dps_hash
+
+
+def test_other_settings_keep_hash(tmp_path):
+    assert get_input_hash(make_config(tmp_path)) == get_input_hash(make_config(tmp_path, counterProcesses=4))
+
+
+def test_generating_source_changes_hash(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    full_hash = get_input_hash(config)
+    monkeypatch.setattr(cache, "GENERATING_MODULES", cache.GENERATING_MODULES[:-1])
+    assert get_input_hash(config) != full_hash
+
+
+def make_troop_file(tmp_path, text: str="health = 100\n"):
+    troop_file = tmp_path / "boyz.lua"
+    troop_file.write_text(text)
+    os.utime(troop_file, ns=(OLD_NANOSECONDS, OLD_NANOSECONDS))
+    return troop_file
+
+
+class CountingParser():
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, file_path: str):
+        self.calls += 1
+        with open(file_path) as troop_file:
+            return troop_file.read()
+
+
+def test_unchanged_file_served_from_pickle(tmp_path):
+    troop_file = make_troop_file(tmp_path)
+    parse = CountingParser()
+
+    parse_cache = ParseCache(tmp_path)
+    assert parse_cache.get(troop_file, parse) == "health = 100\n"
+    parse_cache.save()
+    assert (tmp_path / cache.PARSE_CACHE_FILE).exists()
+
+    parse_cache = ParseCache(tmp_path)
+    assert parse_cache.get(troop_file, parse) == "health = 100\n"
+    assert parse.calls == 1
+    assert (parse_cache.hits, parse_cache.misses) == (1, 0)
+
+
+def test_changed_mtime_parses_again(tmp_path):
+    troop_file = make_troop_file(tmp_path)
+    parse = CountingParser()
+    parse_cache = ParseCache(tmp_path)
+    parse_cache.get(troop_file, parse)
+    parse_cache.save()
+
+    # Same contents and size, only the modification time changes
+    os.utime(troop_file, ns=(OLD_NANOSECONDS + 10 ** 9, OLD_NANOSECONDS + 10 ** 9))
+    parse_cache = ParseCache(tmp_path)
+    parse_cache.get(troop_file, parse)
+    assert parse.calls == 2
+    assert (parse_cache.hits, parse_cache.misses) == (0, 1)
+
+
+def test_changed_size_parses_again(tmp_path):
+    troop_file = make_troop_file(tmp_path)
+    parse = CountingParser()
+    parse_cache = ParseCache(tmp_path)
+    parse_cache.get(troop_file, parse)
+    parse_cache.save()
+
+    # Same modification time, only the size changes
+    make_troop_file(tmp_path, "health = 1000\n")
+    parse_cache = ParseCache(tmp_path)
+    assert parse_cache.get(troop_file, parse) == "health = 1000\n"
+    assert parse.calls == 2
+
+
+def test_recently_modified_file_not_cached(tmp_path):
+    troop_file = tmp_path / "boyz.lua"
+    troop_file.write_text("health = 100\n")
+    parse = CountingParser()
+    parse_cache = ParseCache(tmp_path)
+    parse_cache.get(troop_file, parse)
+    parse_cache.get(troop_file, parse)
+
+    assert parse.calls == 2
+    assert not parse_cache.changed
+
+
+def test_other_version_ignored(tmp_path, monkeypatch):
+    troop_file = make_troop_file(tmp_path)
+    parse = CountingParser()
+    parse_cache = ParseCache(tmp_path)
+    parse_cache.get(troop_file, parse)
+    parse_cache.save()
+
+    monkeypatch.setattr(cache, "get_parse_cache_version", lambda: "another version")
+    assert ParseCache(tmp_path).entries == {}
@@ -0,0 +1,44 @@
+"""
+Tests that ranking counters by weapon and armour type classes gives
+exactly the counters of ranking every weapon and armour type separately.
+"""
+import pytest
+
+from benchmarks import add_duplicate_damages, calculate_race_counters, make_synthetic_game, sort_counters
+from file_handlers import save_to_json
+from generate_data import DamageClasses, calculate_counters_in_parallel, rank_race_counters
+
+
+@pytest.fixture(params=[0, 1])
+def game(request):
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(3, 8, 40, 10, request.param)
+    # Repeated DPS rows and columns, plus ties between different weapons
+    add_duplicate_damages(weapons_dict, armour_types, 0.5, request.param)
+    for damages in list(weapons_dict.values())[::7]:
+        damages[armour_types[0]] = 10.0
+    return troops_dict, weapons_dict, armour_types
+
+
+def get_reference_counters(troops_dict: dict, weapons_dict: dict, armour_types: list):
+    return sort_counters({
+        race: calculate_race_counters(race_troops, weapons_dict, armour_types)
+        for race, race_troops in troops_dict.items()
+    })
+
+
+def test_classes_match_reference(game, tmp_path):
+    troops_dict, weapons_dict, armour_types = game
+    damage_classes = DamageClasses(weapons_dict, armour_types)
+    counters = {race: rank_race_counters(race_troops, damage_classes) for race, race_troops in troops_dict.items()}
+    expected = get_reference_counters(troops_dict, weapons_dict, armour_types)
+    assert counters == expected
+
+    save_to_json(str(tmp_path / "counters.json"), counters, indent=False)
+    save_to_json(str(tmp_path / "expected.json"), expected, indent=False)
+    assert (tmp_path / "counters.json").read_bytes() == (tmp_path / "expected.json").read_bytes()
+
+
+def test_parallel_matches_reference(game):
+    troops_dict, weapons_dict, armour_types = game
+    counters = calculate_counters_in_parallel(troops_dict, DamageClasses(weapons_dict, armour_types), 2)
+    assert counters == get_reference_counters(troops_dict, weapons_dict, armour_types)
@@ -0,0 +1,102 @@
+"""
+Tests exporting a small dataset to SQLite and querying the counters back
+out of it.
+"""
+import sqlite3
+
+import pytest
+
+from benchmarks import make_synthetic_game
+from database import save_to_sqlite
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(3, 4, 10, 6, seed=5)
+    troop = troops_dict["race_0"]["race_0_troop_0.lua"]
+    troop["armour_types"] = None
+    troop["weapons"].append("missing_weapon.lua")
+    return troops_dict, weapons_dict, armour_types
+
+
+@pytest.fixture(scope="module")
+def connection(dataset, tmp_path_factory):
+    troops_dict, weapons_dict, armour_types = dataset
+    database_path = tmp_path_factory.mktemp("data") / "counters.db"
+    save_to_sqlite(str(database_path), weapons_dict, armour_types, troops_dict)
+
+    connection = sqlite3.connect(database_path)
+    yield connection
+    connection.close()
+
+
+def get_counters(troops_dict: dict, weapons_dict: dict, race: str, armour_type: str):
+    return sorted(
+        ((troop_file, weapon, weapons_dict[weapon][armour_type])
+         for troop_file, troop in troops_dict[race].items()
+         for weapon in troop["weapons"] if weapon in weapons_dict),
+        key=lambda counter: (-counter[2], counter[0], counter[1])
+    )
+
+
+def test_counters_view(dataset, connection):
+    troops_dict, weapons_dict, armour_types = dataset
+
+    for race in troops_dict:
+        for armour_type in armour_types:
+            rows = connection.execute(
+                "SELECT troop_file, weapon, dps FROM counters WHERE race = ? AND armour_type = ? "
+                "ORDER BY dps DESC, troop_file, weapon", (race, armour_type)).fetchall()
+            assert rows == get_counters(troops_dict, weapons_dict, race, armour_type)
+
+
+def test_top_counters_through_indexes(dataset, connection):
+    troops_dict, weapons_dict, armour_types = dataset
+    armour_type = armour_types[1]
+
+    rows = connection.execute("""
+        SELECT troops.troop_file, weapons.name, weapon_dps.dps
+        FROM weapon_dps
+        JOIN armour_types ON armour_types.id = weapon_dps.armour_type_id
+        JOIN troop_weapons ON troop_weapons.weapon_id = weapon_dps.weapon_id
+        JOIN troops ON troops.id = troop_weapons.troop_id
+        JOIN races ON races.id = troops.race_id
+        JOIN weapons ON weapons.id = weapon_dps.weapon_id
+        WHERE armour_types.name = ? AND races.name = 'race_2'
+        ORDER BY weapon_dps.dps DESC, troops.troop_file, weapons.name LIMIT 5
+    """, (armour_type,)).fetchall()
+    assert rows == get_counters(troops_dict, weapons_dict, "race_2", armour_type)[:5]
+
+    indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"troops_armour_type", "troop_weapons_weapon", "weapon_dps_armour_type"} <= indexes
+
+
+def test_troops(dataset, connection):
+    troops_dict, _, _ = dataset
+
+    rows = connection.execute("""
+        SELECT races.name, troops.troop_file, armour_types.name, troops.health, troops.squad_size
+        FROM troops
+        JOIN races ON races.id = troops.race_id
+        LEFT JOIN armour_types ON armour_types.id = troops.armour_type_id
+    """).fetchall()
+    assert sorted(rows) == sorted(
+        (race, troop_file, troop["armour_types"], troop["health"], troop["squad_size"])
+        for race, race_troops in troops_dict.items()
+        for troop_file, troop in race_troops.items()
+    )
+
+    # The troop's weapon that isn't in the weapons data is left out
+    weapons = connection.execute("""
+        SELECT weapons.name FROM troop_weapons
+        JOIN troops ON troops.id = troop_weapons.troop_id
+        JOIN weapons ON weapons.id = troop_weapons.weapon_id
+        WHERE troops.troop_file = 'race_0_troop_0.lua'
+    """).fetchall()
+    assert sorted(weapon for weapon, in weapons) == \
+        sorted(set(troops_dict["race_0"]["race_0_troop_0.lua"]["weapons"]) - {"missing_weapon.lua"})
+
+
+def test_no_temporary_files_left(connection, tmp_path_factory):
+    database_directory = tmp_path_factory.getbasetemp()
+    assert not list(database_directory.glob("**/.counters.db.*"))
@@ -0,0 +1,87 @@
+"""
+Tests diffing two small data directories with an added, a removed and a
+moved counter, and a changed weapon.
+"""
+import json
+
+from diff_data import diff_bucket, main
+
+
+CONFIG = {
+    "data": {
+        "weapons": "data/weapons.json",
+        "troops": "data/troops.json",
+        "counters": "data/counters.json"
+    }
+}
+
+TROOPS = {
+    "Orks": {
+        "boyz.lua": {"display_name": "Boyz", "weapons": ["choppa.lua"]},
+        "nobz.lua": {"display_name": "Nobz", "weapons": ["choppa.lua", "shoota.lua"]}
+    }
+}
+
+
+def write_data(directory, weapons: dict, troops: dict, counters: dict):
+    directory.mkdir()
+    for name, data in (("weapons", weapons), ("troops", troops), ("counters", counters)):
+        with open(directory / f"{name}.json", "w") as data_file:
+            json.dump(data, data_file)
+
+
+def test_diff_directories(tmp_path):
+    config_path = tmp_path / "config.json"
+    with open(config_path, "w") as config_file:
+        json.dump(CONFIG, config_file)
+
+    write_data(
+        tmp_path / "old",
+        {"choppa.lua": {"infantry_low": 10.0}, "shoota.lua": {"infantry_low": 5.0}},
+        TROOPS,
+        {"Orks": {"infantry_low": [
+            ["nobz.lua", "choppa.lua", 10.0],
+            ["boyz.lua", "choppa.lua", 10.0],
+            ["nobz.lua", "shoota.lua", 5.0]
+        ]}}
+    )
+    new_troops = {"Orks": dict(TROOPS["Orks"], **{"burna.lua": {"display_name": "Burna Boyz",
+                                                                 "weapons": ["burna.lua"]}})}
+    write_data(
+        tmp_path / "new",
+        {"choppa.lua": {"infantry_low": 12.0}, "burna.lua": {"infantry_low": 20.0}},
+        new_troops,
+        {"Orks": {"infantry_low": [
+            ["burna.lua", "burna.lua", 20.0],
+            ["boyz.lua", "choppa.lua", 12.0],
+            ["nobz.lua", "choppa.lua", 12.0]
+        ]}}
+    )
+
+    output_path = tmp_path / "changes.jsonl"
+    main(["--config", str(config_path), "-o", str(output_path),
+          str(tmp_path / "old"), str(tmp_path / "new")])
+
+    with open(output_path) as output_file:
+        changes = [json.loads(line) for line in output_file]
+
+    assert changes == [
+        {"type": "weapon_removed", "weapon": "shoota.lua"},
+        {"type": "weapon_added", "weapon": "burna.lua"},
+        {"type": "dps_changed", "weapon": "choppa.lua", "armour_type": "infantry_low", "old": 10.0, "new": 12.0},
+        {"type": "troop_added", "race": "Orks", "troop": "burna.lua"},
+        {"type": "counter_added", "troop": "burna.lua", "weapon": "burna.lua", "new_rank": 0,
+         "race": "Orks", "armour_type": "infantry_low"},
+        {"type": "rank_changed", "troop": "nobz.lua", "weapon": "choppa.lua", "old_rank": 0, "new_rank": 2,
+         "race": "Orks", "armour_type": "infantry_low"},
+        {"type": "counter_removed", "troop": "nobz.lua", "weapon": "shoota.lua", "old_rank": 2,
+         "race": "Orks", "armour_type": "infantry_low"}
+    ]
+
+
+def test_min_rank_shift():
+    old_bucket = [(0, 1, 3.0), (2, 1, 2.0), (3, 1, 1.0)]
+    new_bucket = [(2, 1, 3.0), (0, 1, 2.0), (3, 1, 1.0)]
+
+    assert [change["troop"] for change in diff_bucket(old_bucket, new_bucket, 1)] == [2, 0]
+    assert list(diff_bucket(old_bucket, new_bucket, 2)) == []
@@ -0,0 +1,97 @@
+"""
+Tests the troop bitsets' filters against filtering plain sets of the same
+troops.
+"""
+import random
+
+from collections import Counter
+
+import pytest
+
+from benchmarks import make_synthetic_game
+from indexes import TroopSetIndex, count_bits, decode_bits, encode_bits, load_troop_index, save_troop_index
+
+
+@pytest.fixture(scope="module")
+def troops_dict():
+    troops_dict, _, _ = make_synthetic_game(5, 6, 40, 12, seed=3)
+    # A troop without an armour type, and a weapon shared between races
+    troops_dict["race_0"]["race_0_troop_0.lua"]["armour_types"] = None
+    troops_dict["race_1"]["race_1_troop_1.lua"]["weapons"].append("race_0_weapon_0.lua")
+    return troops_dict
+
+
+def filter_troops(troops_dict: dict, races: list=None, armour_types: list=None, weapons: list=None):
+    return {
+        (race, troop_file)
+        for race, race_troops in troops_dict.items()
+        for troop_file, troop in race_troops.items()
+        if (races is None or race in races)
+        and (armour_types is None or troop["armour_types"] in armour_types)
+        and (weapons is None or set(troop["weapons"]) & set(weapons))
+    }
+
+
+def make_filters(troops_dict: dict, count: int, seed: int=0):
+    rng = random.Random(seed)
+    races = list(troops_dict) + ["no_race"]
+    armour_types = [f"armour_type_{armour_type}" for armour_type in range(6)] + ["no_armour_type"]
+    weapons = sorted({weapon for race_troops in troops_dict.values()
+                      for troop in race_troops.values() for weapon in troop["weapons"]}) + ["no_weapon.lua"]
+
+    def sample(names: list):
+        # None matches everything, an empty list matches nothing
+        if rng.random() < 0.3:
+            return None
+        return rng.sample(names, rng.randint(0, 4))
+
+    return [(sample(races), sample(armour_types), sample(weapons)) for _ in range(count)]
+
+
+def test_select_matches_sets(troops_dict):
+    troop_index = TroopSetIndex.from_troops(troops_dict)
+
+    for races, armour_types, weapons in make_filters(troops_dict, 300):
+        bits = troop_index.select(races, armour_types, weapons)
+        expected = filter_troops(troops_dict, races, armour_types, weapons)
+
+        troops = troop_index.get_troops(bits)
+        assert set(troops) == expected
+        assert len(troops) == count_bits(bits) == len(expected)
+
+
+def test_count_by_matches_sets(troops_dict):
+    troop_index = TroopSetIndex.from_troops(troops_dict)
+
+    for races, armour_types, weapons in make_filters(troops_dict, 50, seed=1):
+        bits = troop_index.select(races, armour_types, weapons)
+        expected = filter_troops(troops_dict, races, armour_types, weapons)
+
+        assert troop_index.count_by(bits, troop_index.races) == Counter(race for race, _ in expected)
+        armour_type_counts = Counter(troops_dict[race][troop_file]["armour_types"] for race, troop_file in expected)
+        armour_type_counts.pop(None, None)
+        assert troop_index.count_by(bits, troop_index.armour_types) == armour_type_counts
+
+
+def test_troop_without_armour_type(troops_dict):
+    troop_index = TroopSetIndex.from_troops(troops_dict)
+
+    assert None not in troop_index.armour_types
+    assert ("race_0", "race_0_troop_0.lua") in troop_index.get_troops(troop_index.select(["race_0"]))
+    assert ("race_0", "race_0_troop_0.lua") not in troop_index.get_troops(
+        troop_index.select(armour_types=list(troop_index.armour_types)))
+
+
+def test_saved_index_matches(troops_dict, tmp_path):
+    index_path = tmp_path / "troopIndex.json"
+    save_troop_index(str(index_path), troops_dict)
+    troop_index = load_troop_index(str(index_path))
+
+    for races, armour_types, weapons in make_filters(troops_dict, 50, seed=2):
+        assert set(troop_index.get_troops(troop_index.select(races, armour_types, weapons))) == \
+            filter_troops(troops_dict, races, armour_types, weapons)
+
+
+@pytest.mark.parametrize("bits", [0, 1, 1 << 200, (1 << 200) | (1 << 64), (1 << 300) - 1])
+def test_encode_bits(bits):
+    assert decode_bits(encode_bits(bits)) == bits
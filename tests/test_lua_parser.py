@@ -0,0 +1,127 @@
+"""
+Tests reading the assignments out of lua troop files, in the Corsix
+layout and in the layouts other tools and hand edits leave.
+"""
+import random
+
+import pytest
+
+import lua_parser
+
+from benchmarks import make_troop_lua
+from lua_parser import parse_corsix_lines, parse_lua_assignments, tokenize_lua
+from troops import parse_troop_lua
+
+WEAPONS = [f"weapon_{weapon}.lua" for weapon in range(50)]
+
+
+def parse_with_tokenizer(monkeypatch, lua_text: str):
+    monkeypatch.setattr(lua_parser, "parse_corsix_lines", lambda lua_text: None)
+    return parse_lua_assignments(lua_text)
+
+
+@pytest.mark.parametrize("fuzz", [False, True])
+def test_troop_fields(fuzz):
+    rng = random.Random(fuzz)
+    for _ in range(200):
+        lua_text, (name, weapons, stats) = make_troop_lua(rng, WEAPONS, fuzz)
+        troop_name, weapon_files, troop_stats = parse_troop_lua(lua_text)
+        assert troop_name == name
+        assert weapon_files - {""} == weapons
+        assert troop_stats == stats
+
+
+def test_corsix_lines():
+    lua_text = (
+        'GameData = Inherit([[ebps\\races\\orks\\troops\\base.nil]])\r\n'
+        'GameData["ui_ext"]["screen_name_id"] = [[$15000023]] -- Slugga Boyz\r\n'
+        '-- a whole line comment\r\n'
+        '\r\n'
+        'GameData["health_ext"]["hitpoints"] = 1291.00000\r\n'
+        'GameData["combat_ext"]["hardpoints"]["hardpoint_01"]["weapon_table"]["weapon_01"]["weapon"] = '
+        '[[weapon\\ork_slugga.lua]]\r\n'
+    )
+    expected = [
+        ("", "ebps\\races\\orks\\troops\\base.nil", None),
+        ('["ui_ext"]["screen_name_id"]', "$15000023", "Slugga Boyz"),
+        ('["health_ext"]["hitpoints"]', 1291.0, None),
+        ('["combat_ext"]["hardpoints"]["hardpoint_01"]["weapon_table"]["weapon_01"]["weapon"]',
+         "weapon\\ork_slugga.lua", None)
+    ]
+    assert parse_corsix_lines(lua_text) == expected
+    assert parse_lua_assignments(lua_text) == expected
+
+
+def test_table_constructors():
+    lua_text = """
+GameData = {
+    health_ext = { hitpoints = 0x10, ["armour"] = 'tank_heavy' },
+    list = { "first", [[second]]; true, nil },
+    weapon = Reference([[weapon\\lascannon.lua]]),
+}
+"""
+    assert parse_corsix_lines(lua_text) is None
+    assert parse_lua_assignments(lua_text) == [
+        ('["health_ext"]["hitpoints"]', 16.0, None),
+        ('["health_ext"]["armour"]', "tank_heavy", None),
+        ('["list"][1]', "first", None),
+        ('["list"][2]', "second", None),
+        ('["list"][3]', True, None),
+        ('["list"][4]', None, None),
+        ('["weapon"]', "weapon\\lascannon.lua", None)
+    ]
+
+
+def test_trailing_comments():
+    lua_text = """GameData["a"] = 1 -- one
+GameData [ 'b' ]=[[two]]--two
+GameData["c"] = 3 --[[ not a name ]]
+GameData = { d = 4, -- four
+    e = 5 }
+-- GameData["f"] = 6
+"""
+    assert parse_lua_assignments(lua_text) == [
+        ('["a"]', 1.0, "one"),
+        ('["b"]', "two", "two"),
+        ('["c"]', 3.0, None),
+        ('["d"]', 4.0, "four"),
+        ('["e"]', 5.0, None)
+    ]
+
+
+@pytest.mark.parametrize("lua_text", [
+    'GameData["a"] = [[unclosed\nGameData["b"] = 2\n',
+    'GameData["a" = 1\nGameData["b"] = 2\n',
+    'GameData = { a = { b = 1\nGameData["b"] = 2\n',
+    ']]} = = ((\nGameData["b"] = 2\n',
+    '\x00\xff GameData["b"] = 2\n'
+])
+def test_broken_files_keep_what_can_be_read(lua_text):
+    assert ('["b"]', 2.0, None) in parse_lua_assignments(lua_text)
+
+
+def test_corsix_lines_match_tokenizer(monkeypatch):
+    rng = random.Random(0)
+    read_quickly = 0
+    for index in range(300):
+        lua_text, _ = make_troop_lua(rng, WEAPONS, index % 2 == 0)
+        lines = lua_text.split("\n")
+        line = rng.randrange(len(lines))
+        position = rng.randrange(len(lines[line]) + 1)
+        lines[line] = lines[line][:position] + rng.choice(['"', "[", "]", "--", " ", "\r", "=", "0x1", "_", "{"]) \
+            + lines[line][position:]
+        lua_text = "\n".join(lines)
+
+        assignments = parse_corsix_lines(lua_text)
+        if assignments is not None:
+            read_quickly += 1
+            assert assignments == parse_with_tokenizer(monkeypatch, lua_text)
+            monkeypatch.undo()
+
+    assert read_quickly
+
+
+def test_tokens():
+    assert tokenize_lua('x = -1.5e2 -- note\n"a\\"b"') == [
+        ("name", "x"), ("op", "="), ("number", -150.0), ("comment", "note"), ("string", 'a"b')
+    ]
@@ -0,0 +1,43 @@
+"""
+Tests that badly typed queries are answered with errors.
+"""
+import json
+
+import pytest
+
+from cli import answer_query_line, main
+from query import CounterQuery, QueryError
+
+
+@pytest.fixture
+def counter_queries():
+    troops_dict = {"Orks": {"boyz.lua": {"display_name": "Boyz", "armour_types": "infantry_low"}}}
+    return {None: CounterQuery(troops_dict, {"races": {"Orks": {}}})}
+
+
+@pytest.mark.parametrize("query_fields", [
+    {"player_race": "Orks", "opponent_race": "Orks", "troop": 5},
+    {"player_race": ["Orks"], "armour_type": "infantry_low"},
+    {"player_race": "Orks", "armour_type": {"infantry_low": 1}},
+    {"player_race": "Orks", "armour_type": "infantry_low", "metric": None},
+    {"player_race": "Orks", "armour_type": "infantry_low", "k": "10"},
+    {"player_race": "Orks", "armour_type": "infantry_low", "k": -1},
+    {"player_race": "Orks", "armour_type": "infantry_low", "k": 0}
+])
+def test_batch_line_with_wrong_types(counter_queries, query_fields):
+    result = json.loads(answer_query_line(counter_queries, None, json.dumps(query_fields)))
+    assert "must be" in result["error"]
+
+
+def test_query_with_missing_data_file(tmp_path, capsys):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"data": {"troops": str(tmp_path / "troops.json"),
+                                                "scores": str(tmp_path / "scores.json")}}))
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--config", str(config_path), "query", "--player-race", "Orks", "--armour-type", "infantry_low"])
+    assert "was not found" in str(exit_info.value)
+
+
+def test_find_troop_with_wrong_type(counter_queries):
+    with pytest.raises(QueryError):
+        counter_queries[None].find_troop("Orks", None)
@@ -0,0 +1,79 @@
+"""
+Tests the cost and health weighted scores against values worked out by
+hand.
+"""
+from array import array
+
+from scoring import calculate_scores, get_armour_type_health, get_troop_cost, rank_metrics, score_column
+
+TROOPS = {
+    "Orks": {
+        "boyz.lua": {"weapons": ["choppa.lua"], "armour_types": "infantry_low", "health": 100, "squad_size": 5,
+                     "cost": {"requisition": 150, "power": 50}},
+        "grot.lua": {"weapons": ["slugga.lua"], "armour_types": "infantry_low", "squad_size": 2,
+                     "cost": {"requisition": 0, "power": 0}}
+    },
+    "Eldar": {
+        "falcon.lua": {"weapons": ["slugga.lua"], "armour_types": "vehicle_med", "health": 1500, "squad_size": 1,
+                       "cost": {"requisition": 100}}
+    }
+}
+WEAPONS = {
+    "choppa.lua": {"infantry_low": 20.0, "vehicle_med": 0.0, "building_high": 1.0},
+    "slugga.lua": {"infantry_low": 10.0, "vehicle_med": 2.0, "building_high": 1.0}
+}
+
+
+def test_troop_cost():
+    assert get_troop_cost(TROOPS["Orks"]["boyz.lua"]) == 200
+    # Free troops count as a single resource
+    assert get_troop_cost(TROOPS["Orks"]["grot.lua"]) == 1
+    assert get_troop_cost({}) == 1
+
+
+def test_armour_type_health():
+    health = get_armour_type_health(TROOPS, ["infantry_low", "vehicle_med", "building_high"])
+    # The grot has no health, so counts as 0: (500 + 0) / 2
+    assert health["infantry_low"] == 250
+    assert health["vehicle_med"] == 1500
+    # No troop has it, so the average across every troop: (500 + 0 + 1500) / 3
+    assert health["building_high"] == 2000 / 3
+
+
+def test_score_column():
+    values = score_column(array("d", [20.0, 10.0, 0.0]), array("d", [5, 2, 3]), array("d", [200, 1, 50]), 250)
+    assert values == {
+        "dps": [20.0, 10.0, 0.0],
+        "squad_dps": [100.0, 20.0, 0.0],
+        "dps_per_resource": [0.5, 20.0, 0.0],
+        "time_to_kill": [2.5, 12.5, None]
+    }
+
+
+def test_rank_metrics():
+    order = rank_metrics({
+        "dps": [20.0, 10.0, 20.0, 0.0],
+        "time_to_kill": [2.5, None, 1.0, 2.5]
+    })
+    # Ties keep row order, and rows that can never kill go last
+    assert order == {"dps": [0, 2, 1, 3], "time_to_kill": [2, 0, 3, 1]}
+
+
+def test_calculate_scores():
+    scores = calculate_scores(TROOPS, WEAPONS, ["infantry_low", "vehicle_med"])
+    orks = scores["races"]["Orks"]
+    assert orks["rows"] == [["boyz.lua", "choppa.lua"], ["grot.lua", "slugga.lua"]]
+
+    infantry = orks["armourTypes"]["infantry_low"]
+    assert infantry["values"] == {
+        "dps": [20.0, 10.0],
+        "squad_dps": [100.0, 20.0],
+        "dps_per_resource": [0.5, 20.0],
+        "time_to_kill": [2.5, 12.5]
+    }
+    assert infantry["order"] == {"dps": [0, 1], "squad_dps": [0, 1], "dps_per_resource": [1, 0],
+                                 "time_to_kill": [0, 1]}
+
+    vehicle = orks["armourTypes"]["vehicle_med"]
+    assert vehicle["values"]["time_to_kill"] == [None, 375.0]
+    assert vehicle["order"]["time_to_kill"] == [1, 0]
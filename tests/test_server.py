@@ -0,0 +1,52 @@
+"""
+Tests the query service starting before its manifest exists and
+answering errors it didn't expect.
+"""
+import asyncio
+import json
+
+import pytest
+
+from server import QueryService
+
+
+@pytest.fixture
+def config(tmp_path):
+    troops_path = tmp_path / "troops.json"
+    troops_path.write_text(json.dumps({"Orks": {}}))
+    scores_path = tmp_path / "scores.json"
+    scores_path.write_text(json.dumps({"metrics": ["dps"], "races": {"Orks": {"rows": [], "armourTypes": {}}}}))
+    return {"data": {"troops": str(troops_path), "scores": str(scores_path),
+                     "manifest": str(tmp_path / "manifest.json")}}
+
+
+def test_starts_without_manifest(config, tmp_path):
+    service = QueryService(config)
+    assert service.use_manifest
+    assert service.data_version == (None,)
+
+    (tmp_path / "manifest.json").write_text("{}")
+    assert service.get_data_version() != service.data_version
+
+
+def test_unexpected_error_is_answered(config, monkeypatch):
+    service = QueryService(config)
+
+    def fail(path, params):
+        raise TypeError("bad data")
+    monkeypatch.setattr(service, "handle", fail)
+
+    async def request():
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /counters HTTP/1.1\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+
+    response = asyncio.run(request())
+    assert response.startswith(b"HTTP/1.1 500")
+    assert b"Internal error" in response
@@ -0,0 +1,72 @@
+"""
+Tests the dominance depths against peeling off the undominated layers
+one at a time.
+"""
+import random
+
+import pytest
+
+import skyline
+
+from skyline import calculate_race_skyline, dominance_depths, reduce_columns
+
+
+def dominates(a: tuple, b: tuple):
+    return all(x >= y for x, y in zip(a, b)) and a != b
+
+
+def peel_layers(vectors: list):
+    depths = [None] * len(vectors)
+    remaining = set(range(len(vectors)))
+    depth = 0
+    while remaining:
+        layer = {index for index in remaining
+                 if not any(dominates(vectors[other], vectors[index]) for other in remaining)}
+        for index in layer:
+            depths[index] = depth
+        remaining -= layer
+        depth += 1
+
+    return depths
+
+
+def make_vectors(rng: random.Random, count: int, columns: int, values: int):
+    # Few distinct values, so there are plenty of ties in each column
+    vectors = {tuple(rng.randrange(values) for _ in range(columns)) for _ in range(count)}
+    return list(vectors)
+
+
+@pytest.mark.parametrize("block_rows, block_bits", [(1024, 2 ** 29), (1, 1), (3, 1), (7, 64)])
+@pytest.mark.parametrize("seed", range(4))
+def test_depths_match_layer_peeling(monkeypatch, block_rows, block_bits, seed):
+    monkeypatch.setattr(skyline, "MIN_BLOCK_ROWS", block_rows)
+    monkeypatch.setattr(skyline, "BLOCK_BITS", block_bits)
+    rng = random.Random(seed)
+    for columns in (1, 2, 3, 5):
+        vectors = make_vectors(rng, 120, columns, 6)
+        assert dominance_depths(vectors) == peel_layers(vectors)
+
+
+def test_float_sums_with_rounding():
+    # 0.1 + 0.2 and 0.3 are different sums for vectors that are equal
+    # in every other way
+    vectors = [(0.1, 0.2, 0.0), (0.0, 0.3, 0.0), (0.3, 0.0, 0.0), (0.1, 0.2, 0.1)]
+    assert dominance_depths(vectors) == peel_layers(vectors)
+
+
+def test_empty_and_constant_columns():
+    assert dominance_depths([]) == []
+    vectors = reduce_columns([(1, 5, 2), (1, 3, 2), (1, 4, 2)])
+    assert dominance_depths(vectors) == peel_layers(vectors) == [0, 2, 1]
+
+
+def test_race_skyline_shares_depth_of_equal_pairs():
+    weapons_dict = {"a.lua": {"x": 2, "y": 1}, "b.lua": {"x": 1, "y": 2}, "c.lua": {"x": 1, "y": 1}}
+    race_troops = {
+        "one.lua": {"weapons": ["a.lua", "c.lua"], "squad_size": 1, "cost": {"requisition": 10, "power": 0}},
+        "two.lua": {"weapons": ["a.lua", "b.lua"], "squad_size": 1, "cost": {"requisition": 10, "power": 0}}
+    }
+    race_skyline = calculate_race_skyline(race_troops, weapons_dict, ["x", "y"])
+    depths = dict(zip(map(tuple, race_skyline["rows"]), race_skyline["depth"]))
+    assert depths == {("one.lua", "a.lua"): 0, ("one.lua", "c.lua"): 1,
+                      ("two.lua", "a.lua"): 0, ("two.lua", "b.lua"): 0}
@@ -0,0 +1,108 @@
+"""
+Tests that validation rejects each kind of bad input and passes a valid
+dataset.
+"""
+import copy
+
+import pytest
+
+from validation import ERROR, WARNING, ValidationError, validate_loaded_data
+
+
+ARMOUR_TYPES = ["infantry_low", "vehicle_med"]
+
+WEAPONS = {
+    "choppa.lua": {"infantry_low": 10.0, "vehicle_med": 2.0},
+    "rokkit.lua": {"infantry_low": 1.5, "vehicle_med": 30}
+}
+
+TROOPS = {
+    "Orks": {
+        "boyz.lua": {"weapons": ["choppa.lua"], "armour_types": "infantry_low", "missing_weapons": []},
+        "kan.lua": {"weapons": ["rokkit.lua"], "armour_types": "vehicle_med", "missing_weapons": []}
+    }
+}
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {"troops": {"Orks": str(tmp_path)}}
+
+
+def validate(config: dict, weapons_dict: dict=WEAPONS, troops_dict: dict=TROOPS):
+    return validate_loaded_data(config, weapons_dict, ARMOUR_TYPES, troops_dict)
+
+
+def get_errors(config: dict, weapons_dict: dict=WEAPONS, troops_dict: dict=TROOPS):
+    with pytest.raises(ValidationError) as error:
+        validate(config, weapons_dict, troops_dict)
+
+    return [problem for problem in error.value.problems if problem["severity"] == ERROR]
+
+
+def test_valid_data_passes(config):
+    assert validate(config) == []
+
+
+def test_missing_weapon(config):
+    troops_dict = copy.deepcopy(TROOPS)
+    troops_dict["Orks"]["boyz.lua"]["weapons"].append("slugga.lua")
+
+    errors = get_errors(config, troops_dict=troops_dict)
+    assert len(errors) == 1
+    assert errors[0]["troop_file"] == "boyz.lua"
+    assert "slugga.lua" in errors[0]["message"]
+
+
+def test_weapon_missing_armour_type(config):
+    weapons_dict = copy.deepcopy(WEAPONS)
+    del weapons_dict["rokkit.lua"]["vehicle_med"]
+
+    errors = get_errors(config, weapons_dict=weapons_dict)
+    assert len(errors) == 1
+    assert "rokkit.lua" in errors[0]["message"] and "vehicle_med" in errors[0]["message"]
+
+
+def test_troop_missing_armour_type_warns(config):
+    troops_dict = copy.deepcopy(TROOPS)
+    troops_dict["Orks"]["kan.lua"]["armour_types"] = None
+
+    problems = validate(config, troops_dict=troops_dict)
+    assert [(problem["severity"], problem["troop_file"]) for problem in problems] == [(WARNING, "kan.lua")]
+
+
+def test_unknown_armour_type(config):
+    troops_dict = copy.deepcopy(TROOPS)
+    troops_dict["Orks"]["kan.lua"]["armour_types"] = "monster_high"
+
+    errors = get_errors(config, troops_dict=troops_dict)
+    assert len(errors) == 1
+    assert errors[0]["troop_file"] == "kan.lua"
+    assert "monster_high" in errors[0]["message"]
+
+
+@pytest.mark.parametrize("damage", ["12.5", None, float("nan"), float("inf")])
+def test_invalid_dps(config, damage):
+    weapons_dict = copy.deepcopy(WEAPONS)
+    weapons_dict["choppa.lua"]["infantry_low"] = damage
+
+    errors = get_errors(config, weapons_dict=weapons_dict)
+    assert len(errors) == 1
+    assert "choppa.lua" in errors[0]["message"] and "infantry_low" in errors[0]["message"]
+
+
+def test_every_error_reported_at_once(config, tmp_path):
+    weapons_dict = copy.deepcopy(WEAPONS)
+    weapons_dict["choppa.lua"]["infantry_low"] = "lots"
+    troops_dict = copy.deepcopy(TROOPS)
+    troops_dict["Orks"]["kan.lua"]["armour_types"] = "monster_high"
+    config["troops"]["Eldar"] = str(tmp_path / "eldar")
+
+    errors = get_errors(config, weapons_dict, troops_dict)
+    assert len(errors) == 3
+    assert {error["race"] for error in errors} == {None, "Orks", "Eldar"}
+
+
+def test_empty_race(config):
+    errors = get_errors(config, troops_dict={"Orks": {}})
+    assert [error["race"] for error in errors] == ["Orks"]
@@ -0,0 +1,115 @@
+"""
+Tests reading weapon files in the different ways Excel saves them:
+comma or semicolon separated, with decimal points or decimal commas and
+with thousands separators, plus the diagnostics for bad cells.
+"""
+import csv
+import io
+import logging
+
+import pytest
+
+from weapons import create_weapons_dict, detect_dialect, detect_number_format, weapon_file_reader
+
+
+COMMA_FILE = """DoW DPS Calculator,,,
+File,infantry_low,vehicle_med,commander
+Damage Type,,,
+w_choppa.rgd,12.5,0.25,3
+w_rokkit.rgd,1.75,1200.5,40.125
+"""
+
+SEMICOLON_FILE = """DoW DPS Calculator;;;
+File;infantry_low;vehicle_med;commander
+Damage Type;;;
+w_choppa.rgd;12,5;0,25;3
+w_rokkit.rgd;1,75;1.200,5;40,125
+"""
+
+EXPECTED_WEAPONS = {
+    "w_choppa.lua": {"infantry_low": 12.5, "vehicle_med": 0.25, "commander": 3.0},
+    "w_rokkit.lua": {"infantry_low": 1.75, "vehicle_med": 1200.5, "commander": 40.125}
+}
+
+
+def read_weapon_file(tmp_path, text: str, encoding: str="utf-8"):
+    weapon_path = tmp_path / "weapon_stats.csv"
+    with open(weapon_path, "w", encoding=encoding, newline="") as weapon_file:
+        weapon_file.write(text)
+
+    return weapon_file_reader(weapon_path)
+
+
+@pytest.mark.parametrize("text, delimiter", [(COMMA_FILE, ","), (SEMICOLON_FILE, ";"),
+                                             (COMMA_FILE.replace(",", "\t"), "\t")])
+def test_detect_dialect(text, delimiter):
+    assert detect_dialect(text).delimiter == delimiter
+
+
+def test_detect_dialect_quoted_header():
+    text = '"File";"infantry_low";"vehicle_med"\nw_choppa.rgd;1;2\n'
+    assert detect_dialect(text).delimiter == ";"
+
+
+@pytest.mark.parametrize("text, separators", [
+    (COMMA_FILE, (".", ",")),
+    (SEMICOLON_FILE, (",", ".")),
+    # Three digits after the separator could be either, so it stays a decimal point
+    ("File;a;b\nw.rgd;1,000;2,000\nw2.rgd;1,000;2,000\n", (".", ","))
+])
+def test_detect_number_format(text, separators):
+    assert detect_number_format(text, detect_dialect(text)) == separators
+
+
+def test_comma_separated(tmp_path):
+    armour_types, weapons_dict = read_weapon_file(tmp_path, COMMA_FILE)
+
+    assert armour_types == ["infantry_low", "vehicle_med", "commander"]
+    assert weapons_dict == EXPECTED_WEAPONS
+
+
+def test_semicolon_separated_decimal_commas(tmp_path):
+    armour_types, weapons_dict = read_weapon_file(tmp_path, SEMICOLON_FILE)
+
+    assert armour_types == ["infantry_low", "vehicle_med", "commander"]
+    assert weapons_dict == EXPECTED_WEAPONS
+
+
+def test_thousands_separators(tmp_path):
+    text = COMMA_FILE.replace("1200.5", '"1,200.5"').replace("w_rokkit.rgd,", "w_rokkit.rgd, ")
+    _, weapons_dict = read_weapon_file(tmp_path, text)
+    assert weapons_dict == EXPECTED_WEAPONS
+
+    text = SEMICOLON_FILE.replace("1.200,5", "1 200,5")
+    _, weapons_dict = read_weapon_file(tmp_path, text)
+    assert weapons_dict == EXPECTED_WEAPONS
+
+
+def test_byte_order_mark_and_padding(tmp_path):
+    text = COMMA_FILE.replace("commander\n", "commander,,\n")
+    armour_types, weapons_dict = read_weapon_file(tmp_path, text, "utf-8-sig")
+
+    assert armour_types == ["infantry_low", "vehicle_med", "commander"]
+    assert weapons_dict == EXPECTED_WEAPONS
+
+
+def test_bad_cells_are_diagnosed(caplog):
+    text = COMMA_FILE.replace("0.25", "lots").replace(",40.125", "")
+
+    with caplog.at_level(logging.WARNING):
+        _, weapons_dict = create_weapons_dict(csv.reader(io.StringIO(text)))
+
+    assert weapons_dict["w_choppa.lua"] == {"infantry_low": 12.5, "vehicle_med": 0.0, "commander": 3.0}
+    assert weapons_dict["w_rokkit.lua"] == {"infantry_low": 1.75, "vehicle_med": 1200.5, "commander": 0.0}
+
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert "Found 2 bad DPS cell(s)" in warnings[0]
+    assert "Line 4, vehicle_med: DPS is not a number ('lots'), using 0" in warnings[0]
+    assert "Line 5, commander: DPS is missing, using 0" in warnings[0]
+
+
+def test_missing_header():
+    with pytest.raises(Exception, match="header row"):
+        create_weapons_dict(csv.reader(io.StringIO("w_choppa.rgd,1\n")))
+
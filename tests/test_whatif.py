@@ -0,0 +1,51 @@
+"""
+Tests that what-if edits give the same scores as scoring the edited
+weapons from scratch.
+"""
+import random
+
+import pytest
+
+from benchmarks import make_synthetic_game
+from scoring import calculate_scores
+from whatif import WhatIf, WhatIfError
+
+
+def get_edited_weapons(what_if: WhatIf):
+    return {
+        weapon: dict(zip(what_if.armour_types, damages))
+        for weapon, damages in what_if.dps.items()
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_edits_match_full_rescore(seed):
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(3, 6, 30, 12, seed)
+    what_if = WhatIf(troops_dict, weapons_dict, armour_types)
+    rng = random.Random(seed)
+    weapons = list(weapons_dict)
+
+    for edit in range(40):
+        choice = rng.randrange(5)
+        if choice == 0:
+            what_if.scale_weapon(rng.choice(weapons), rng.choice([0, 0.5, 1.5]), rng.choice(armour_types))
+        elif choice == 1:
+            what_if.scale_weapon(rng.choice(weapons), rng.uniform(0.5, 2))
+        elif choice == 2:
+            # Equal values, so the tie breaks are checked too
+            what_if.set_weapon_dps(rng.choice(weapons), rng.choice(armour_types), 50.0)
+        elif choice == 3:
+            what_if.scale_armour_type(rng.choice(armour_types), rng.uniform(0.5, 2))
+        elif edit % 10 == 0:
+            what_if.reset()
+
+        assert what_if.scores == calculate_scores(troops_dict, get_edited_weapons(what_if), armour_types)
+
+
+def test_counters_need_an_armour_type():
+    troops_dict, weapons_dict, armour_types = make_synthetic_game(1, 2, 5, 4)
+    what_if = WhatIf(troops_dict, weapons_dict, armour_types)
+    with pytest.raises(WhatIfError):
+        what_if.counters("race_0", None)
+    with pytest.raises(WhatIfError):
+        what_if.counters("race_0", "armour_type_missing")
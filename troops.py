@@ -7,13 +7,24 @@ May 2020
 """
 import logging
 
-from file_handlers import read_from_lua, create_and_check_path
+from cache import ParseCache
+from file_handlers import read_from_lua, create_and_check_path, PathNotFoundError
+from lua_parser import parse_lua_assignments
 from pathlib import Path
 
 WEAPONS = None
 
+# Maps the full lua key of each troop stat we pull out to its stat name
+TROOP_STAT_KEYS = {
+    '["health_ext"]["hitpoints"]': "health",
+    '["cost_ext"]["time_cost"]["cost"]["requisition"]': "requisition",
+    '["cost_ext"]["time_cost"]["cost"]["power"]': "power",
+    '["squad_loadout_ext"]["unit_max"]': "squad_size",
+}
 
-def collate_troop_data(troops_config: dict, weapons_dict: dict, armour_types_dict: dict):
+
+def collate_troop_data(troops_config: dict, weapons_dict: dict, armour_types_dict: dict,
+                       parse_cache: ParseCache=None):
     """
     Collates the troop data from the given input directories.
 
@@ -22,6 +33,8 @@ def collate_troop_data(troops_config: dict, weapons_dict: dict, armour_types_dic
     :param weapons_dict: a dictionary of every weapon in DoW
     :param armour_types_dict: a dictionary of every armour type mapped
                                 to the troops that have it
+    :param parse_cache: a cache of parsed troop files, or None to parse
+                        every file
 
     :returns: a dictionary containing every troop in DoW, with its
                 weapons and armour type
@@ -31,14 +44,18 @@ def collate_troop_data(troops_config: dict, weapons_dict: dict, armour_types_dic
     troops_dict = {}
     for race_name in troops_config:
         race_troops_directory = troops_config[race_name]
-        race_troops_dict = read_race_troops(
-            race_troops_directory, armour_types_dict)
+        try:
+            race_troops_dict = read_race_troops(
+                race_troops_directory, armour_types_dict, parse_cache)
+        except PathNotFoundError:
+            # Reported by the validation stage along with any other problems
+            race_troops_dict = {}
         troops_dict[race_name] = race_troops_dict
 
     return troops_dict
 
 
-def read_race_troops(race_troops_directory: str, armour_types_dict: dict):
+def read_race_troops(race_troops_directory: str, armour_types_dict: dict, parse_cache: ParseCache=None):
     """
     Reads all of a race's troop files in a directory, then makes them 
     into a dictionary containing all of troops, along with their names, 
@@ -48,133 +65,184 @@ def read_race_troops(race_troops_directory: str, armour_types_dict: dict):
                                     for this race are located
     :param armour_types_dict: a dictionary of every armour type mapped
                                 to the troops that have it
+    :param parse_cache: a cache of parsed troop files, or None to parse
+                        every file
     :returns: a dictionary containing every troop in the input directory
                 mapped to it's weapons and armour type
-    :raises: a generic exception when no lua files are found in a provided
-                directory
+    :raises PathNotFoundError: when the directory cannot be found
     """
     race_troops_dict = {}
     race_troops_path = create_and_check_path(race_troops_directory, True)
 
-    # For each file(path) in the race_troops_directory directory ending in .lua
-    for file_path in race_troops_path.glob("*.lua"):
-        lua_lines = read_from_lua(file_path)
-        troop_file = get_file_from_file_path(file_path)
-
-        troop_name, troop_weapons = get_troop_info(lua_lines)
-        armour_types = armour_types_dict[troop_file] if troop_file in armour_types_dict else None
-        race_troops_dict[troop_file] = {
-            "display_name": troop_name,
-            "weapons": troop_weapons,
-            "armour_types": armour_types,
-            "troop_file": troop_file
-        }
-
-    # In theory this could also be due to no weapons being found in a troop's .lua file
+    # For each file(path) in the race_troops_directory directory ending in .lua,
+    # sorted so the troops are in the same order on every machine
+    for file_path in sorted(race_troops_path.glob("*.lua")):
+        troop_file, troop = read_troop_file(file_path, armour_types_dict, parse_cache)
+        race_troops_dict[troop_file] = troop
+
+    # Empty races are reported by the validation stage
     if len(race_troops_dict) < 1:
-        error = f"No (valid) .lua files found in the troops directory ('{str(race_troops_path)}')"
-        logging.error(error)
-        raise Exception(error)
+        logging.warning(f"No .lua files found in the troops directory ('{str(race_troops_path)}')")
 
     return race_troops_dict
 
 
-def get_troop_info(troop_lua_lines: list):
+def read_troop_file(file_path: Path, armour_types_dict: dict, parse_cache: ParseCache=None):
     """
-    From a list of lua file lines, pulls out what weapons this troop 
-    uses and the name of the troop.
+    Reads a single troop file into a dictionary of the troop's name,
+    weapons, armour type and stats.
 
-    :param troop_lua_lines: the list of lines from the lua file for this troop
-    :returns: (the troop name, the weapons this troop uses)
+    :param file_path: the path to the troop's .lua file
+    :param armour_types_dict: a dictionary of every armour type mapped
+                                to the troops that have it
+    :param parse_cache: a cache of parsed troop files, or None to parse
+                        the file
+    :returns: (the troop's filename, the troop's information)
     """
-    troop_name = None
-    troop_weapons = set()
+    troop_file = get_file_from_file_path(file_path)
 
-    for line in troop_lua_lines:
-        key, value = get_lua_key_value_pair(line)
-        troop_name = get_troop_name(line, key) or troop_name
+    if parse_cache is not None:
+        troop_name, weapon_files, troop_stats = parse_cache.get(file_path, parse_troop_file)
+    else:
+        troop_name, weapon_files, troop_stats = parse_troop_file(file_path)
+    troop_weapons, missing_weapons = split_weapon_files(weapon_files)
+
+    armour_types = armour_types_dict[troop_file] if troop_file in armour_types_dict else None
+    troop = {
+        "display_name": troop_name,
+        "weapons": sorted(troop_weapons),
+        "armour_types": armour_types,
+        "troop_file": troop_file,
+        "health": troop_stats["health"],
+        "cost": {
+            "requisition": troop_stats["requisition"],
+            "power": troop_stats["power"]
+        },
+        "squad_size": int(troop_stats["squad_size"]),
+        "missing_weapons": sorted(missing_weapons)
+    }
+
+    return troop_file, troop
+
+
+def update_race_troops(race_troops_dict: dict, changed_paths: list, weapons_dict: dict,
+                       armour_types_dict: dict):
+    """
+    Re-reads only the troop files of a race that have changed, removing
+    any that have been deleted. Every other troop is left as it was.
 
-        # If the value isn't a weapon or isn't a valid weapon file
-        if not "weapon_table" in key or not value:
-            continue
+    :param race_troops_dict: every troop in the race, updated in place
+    :param changed_paths: the paths of the race's changed .lua files
+    :param weapons_dict: a dictionary of every weapon in DoW
+    :param armour_types_dict: a dictionary of every armour type mapped
+                                to the troops that have it
+    :returns: the updated race_troops_dict, in filename order
+    """
+    global WEAPONS
+    WEAPONS = weapons_dict
 
-        troop_weapons.add(value)
+    for file_path in changed_paths:
+        file_path = Path(file_path)
+        if file_path.exists():
+            troop_file, troop = read_troop_file(file_path, armour_types_dict)
+            race_troops_dict[troop_file] = troop
+        else:
+            race_troops_dict.pop(get_file_from_file_path(file_path), None)
 
-    return troop_name, troop_weapons
+    # Keep the same order as a full read
+    return {troop_file: race_troops_dict[troop_file] for troop_file in sorted(race_troops_dict)}
 
 
-def get_lua_key_value_pair(lua_line: str):
+def parse_troop_file(file_path: Path):
     """
-    Extracts a lua key:value pair from the provided lua line
+    Parses a troop's .lua file.
 
-    :param lua_line: a line from a lua file
-    :returns: (the key from the lua line, the value from the lua line)
+    :param file_path: the path to the troop's .lua file
+    :returns: see parse_troop_lua
     """
-    value_index = lua_line.find("=")
-    key = get_lua_key(lua_line[:value_index])
+    return parse_troop_lua(read_from_lua(file_path))
 
-    # If the value should be a weapon, get the value of object
-    value = get_weapon_filename(lua_line[value_index + 2:])
 
-    return key, value
+def parse_troop_lua(troop_lua_text: str):
+    """
+    From a troop's lua file, pulls out the files this troop's weapons
+    reference, the name of the troop and its health, cost and squad
+    size. The result doesn't depend on the weapons data, so it can be
+    cached.
+
+    :param troop_lua_text: the text of the lua file for this troop
+    :returns: (the troop name, the set of weapon files this troop
+                references, a dictionary of the troop's stats)
+    """
+    troop_name = None
+    weapon_files = set()
+    troop_stats = {"health": 0.0, "requisition": 0.0, "power": 0.0, "squad_size": 1}
 
+    for key, value, comment in parse_lua_assignments(troop_lua_text):
+        # The troop name is in the comment after its screen name id
+        if "screen_name_id" in key:
+            troop_name = comment or troop_name
+            continue
 
-def get_lua_key(lua_key_value_str: str):
-    """
-    Iterates over a lua key:value pair to find the last lua sub-key. 
-    For example: weapon_01 in ["weapon_table"]["weapon_01"]
+        if key in TROOP_STAT_KEYS:
+            if isinstance(value, float):
+                troop_stats[TROOP_STAT_KEYS[key]] = value
+            continue
 
-    :param lua_key_value_str: the lua key-value pair as a string
-    :returns: the last key value in the lua key
-    """
-    key = ""
-    key_start = lua_key_value_str.find("[")
-    while key_start >= 0:
-        key_end = lua_key_value_str.find("]", key_start)
-        key += lua_key_value_str[key_start:key_end + 1]
-        key_start = lua_key_value_str.find("[", key_end)
+        if "weapon_table" in key and isinstance(value, str):
+            weapon_files.add(get_weapon_reference(value))
 
-    return key
+    return troop_name, weapon_files, troop_stats
 
 
-def get_troop_name(lua_line: str, lua_key: str):
+def split_weapon_files(weapon_files: set):
     """
-    Extracts the troop name from this lua line if present, else returns 
-    None.
+    Splits the files a troop's weapons reference into the ones in the
+    weapons dictionary and the ones that look like weapon files but
+    aren't in it.
 
-    :param lua_line: the lua line to search through
-    :param lua_key: the lua key value in the line
-    :returns: the troop name or None
+    :param weapon_files: the weapon files the troop references
+    :returns: (the weapons this troop uses, the weapon files this troop
+                uses that aren't in the weapons dictionary)
     """
-    troop_name = None
-    # Pull out troop name from comment
-    if "screen_name_id" in lua_key:
-        name_index = lua_line.find("--")
-        # Check that comment of the name is there
-        if name_index >= 0:
-            troop_name = lua_line[name_index + 2:].strip()
+    troop_weapons = set()
+    missing_weapons = set()
+    for weapon_file in weapon_files:
+        if weapon_file in WEAPONS:
+            troop_weapons.add(weapon_file)
+        elif weapon_file.endswith(".lua"):
+            # Keep track of it so that it can be reported
+            missing_weapons.add(weapon_file)
 
-    return troop_name
+    return troop_weapons, missing_weapons
 
 
-def get_weapon_filename(lua_value: str):
+def get_troop_info(troop_lua_text: str):
     """
-    Formats a lua value (from a key:value pair) into a weapon filename
-    if it is one, or None if it's another type of value.
+    From a troop's lua file, pulls out what weapons this troop uses, the
+    name of the troop and its health, cost and squad size.
 
-    :param lua_value: the value from a lua line
-    :returns: the weapon filename or None
+    :param troop_lua_text: the text of the lua file for this troop
+    :returns: (the troop name, the weapons this troop uses, a dictionary
+                of the troop's stats, the weapon files this troop uses
+                that aren't in the weapons dictionary)
     """
-    lua_value = lua_value.strip()
-    lua_value = lua_value.strip("[]()")
+    troop_name, weapon_files, troop_stats = parse_troop_lua(troop_lua_text)
+    troop_weapons, missing_weapons = split_weapon_files(weapon_files)
 
-    file_index = lua_value.rfind("\\")
-    lua_value = lua_value[file_index + 1:]
+    return troop_name, troop_weapons, troop_stats, missing_weapons
 
-    if lua_value and not lua_value == "nil" and lua_value in WEAPONS:
-        return lua_value
-    else:
-        return None
+
+def get_weapon_reference(lua_value: str):
+    """
+    Formats a lua string value into the filename it references, without
+    checking that it's a weapon.
+
+    :param lua_value: the string value, e.g. weapon\\ork_choppa.lua
+    :returns: the referenced filename (may be empty)
+    """
+    lua_value = lua_value.strip().replace("/", "\\")
+    return lua_value[lua_value.rfind("\\") + 1:]
 
 
 def get_file_from_file_path(file_path: Path):
@@ -185,9 +253,4 @@ def get_file_from_file_path(file_path: Path):
 
     :returns: a filename string
     """
-    file_path_str = str(file_path)
-    name_start = file_path_str.rfind("\\")
-    if name_start < 0:
-        return file_path_str
-
-    return file_path_str[name_start + 1:]
+    return Path(file_path).name
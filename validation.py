@@ -0,0 +1,213 @@
+"""
+Validates the ingested weapon and troop data before the counters are
+calculated, so that bad inputs are all reported at once instead of
+failing part way through the counters.
+
+It checks for:
+ - Races with a missing troops directory or no troops
+ - Troops that reference weapons that aren't in the weapons data
+ - Troops with no armour type, or an armour type the weapons have no
+   DPS for
+ - Weapons that are missing DPS values for some armour types
+"""
+import logging
+
+from math import isfinite
+from pathlib import Path
+
+from file_handlers import load_from_json
+
+ERROR = "error"
+WARNING = "warning"
+
+
+class ValidationError(Exception):
+    """
+    An exception for when the ingested data has problems that would stop
+    the counters from being calculated.
+    """
+    def __init__(self, problems: list):
+        """
+        :param problems: the list of problems that were found
+        """
+        self.problems = problems
+        errors = [problem for problem in problems if problem["severity"] == ERROR]
+        message = f"Found {len(errors)} error(s) in the input data:\n"
+        message += "\n".join(format_problem(problem) for problem in errors)
+        super().__init__(message)
+
+
+def validate_data(config: dict):
+    """
+    Validates the generated weapon, armour type and troop data files,
+    logging every problem found in a single report.
+
+    :param config: the configuration for the program
+    :returns: the list of problems found (only warnings)
+    :raises ValidationError: when any errors are found
+    """
+    weapons_dict = load_from_json(config["data"]["weapons"])
+    armour_types_dict = load_from_json(config["data"]["armourTypes"])
+    troops_dict = load_from_json(config["data"]["troops"])
+
+    armour_types = list(armour_types_dict["armourTypeToTroops"])
+    return validate_loaded_data(config, weapons_dict, armour_types, troops_dict)
+
+
+def validate_loaded_data(config: dict, weapons_dict: dict, armour_types: list, troops_dict: dict):
+    """
+    Validates weapon and troop data that has already been loaded,
+    logging every problem found in a single report.
+
+    :param config: the configuration for the program
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types every weapon should have
+    :param troops_dict: every troop in DoW organised by race
+    :returns: the list of problems found (only warnings)
+    :raises ValidationError: when any errors are found
+    """
+    problems = validate_weapons(weapons_dict, armour_types)
+    problems += validate_troops(troops_dict, weapons_dict, armour_types, config["troops"])
+
+    report_problems(problems)
+
+    if any(problem["severity"] == ERROR for problem in problems):
+        raise ValidationError(problems)
+
+    return problems
+
+
+def validate_weapons(weapons_dict: dict, armour_types: list):
+    """
+    Checks that every weapon has a DPS value for every armour type.
+
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types every weapon should have
+    :returns: a list of problems
+    """
+    problems = []
+    for weapon, damages in weapons_dict.items():
+        missing = [armour_type for armour_type in armour_types if armour_type not in damages]
+        if missing:
+            problems.append(create_problem(
+                ERROR, f"Weapon {weapon} has no DPS for armour type(s): {', '.join(missing)}"))
+
+        invalid = [armour_type for armour_type, damage in damages.items()
+                   if not isinstance(damage, (int, float)) or not isfinite(damage)]
+        if invalid:
+            problems.append(create_problem(
+                ERROR, f"Weapon {weapon} has invalid DPS for armour type(s): {', '.join(invalid)}"))
+
+    return problems
+
+
+def validate_troops(troops_dict: dict, weapons_dict: dict, armour_types: list, troops_config: dict):
+    """
+    Checks every race has troops and every troop's weapons and armour
+    type can be found.
+
+    :param troops_dict: every troop in DoW organised by race
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types every weapon should have
+    :param troops_config: a dictionary mapping races to the location of
+                            their input troop files
+    :returns: a list of problems
+    """
+    problems = []
+    armour_types = set(armour_types)
+    for race, race_directory in troops_config.items():
+        race_troops = troops_dict.get(race)
+        if not Path(race_directory).exists():
+            problems.append(create_problem(
+                ERROR, f"Troops directory ({race_directory}) does not exist", race))
+            continue
+        if not race_troops:
+            problems.append(create_problem(
+                ERROR, f"No troops found in the troops directory ({race_directory})", race))
+            continue
+
+        for troop_file, troop in race_troops.items():
+            problems += validate_troop(race, troop_file, troop, weapons_dict, armour_types)
+
+    return problems
+
+
+def validate_troop(race: str, troop_file: str, troop: dict, weapons_dict: dict, armour_types: set):
+    """
+    Checks a troop's weapons and armour type can be found.
+
+    :param race: the race the troop belongs to
+    :param troop_file: the troop's .lua filename
+    :param troop: the troop's information
+    :param weapons_dict: every weapon mapped to its DPS against each
+                            armour type
+    :param armour_types: the armour types every weapon should have
+    :returns: a list of problems
+    """
+    problems = []
+
+    dangling = [weapon for weapon in troop["weapons"] if weapon not in weapons_dict]
+    if dangling:
+        problems.append(create_problem(
+            ERROR, f"Uses weapon(s) not in the weapons data: {', '.join(sorted(dangling))}",
+            race, troop_file))
+
+    # These weapons were dropped when the troop was read
+    missing = troop.get("missing_weapons")
+    if missing:
+        problems.append(create_problem(
+            WARNING, f"Ignored weapon(s) not in the weapon DPS file: {', '.join(sorted(missing))}",
+            race, troop_file))
+
+    if not troop["armour_types"]:
+        problems.append(create_problem(
+            WARNING, "Has no armour type in the weapon DPS file", race, troop_file))
+    elif troop["armour_types"] not in armour_types:
+        problems.append(create_problem(
+            ERROR, f"Has an unknown armour type: {troop['armour_types']}", race, troop_file))
+
+    return problems
+
+
+def create_problem(severity: str, message: str, race: str=None, troop_file: str=None):
+    """
+    Creates a problem record for the validation report.
+
+    :param severity: either ERROR or WARNING
+    :param message: a description of the problem
+    :param race: the race the problem was found in, if any
+    :param troop_file: the troop the problem was found in, if any
+    :returns: a dictionary describing the problem
+    """
+    return {"severity": severity, "race": race, "troop_file": troop_file, "message": message}
+
+
+def format_problem(problem: dict):
+    """
+    Formats a problem as a single line of text.
+
+    :param problem: the problem to format
+    :returns: the problem as a string
+    """
+    location = " > ".join(part for part in (problem["race"], problem["troop_file"]) if part)
+    location = f"[{location}] " if location else ""
+    return f"{problem['severity'].upper()}: {location}{problem['message']}"
+
+
+def report_problems(problems: list):
+    """
+    Logs every problem found as a single report.
+
+    :param problems: the list of problems to log
+    """
+    if not problems:
+        logging.info("Validation found no problems")
+        return
+
+    errors = sum(problem["severity"] == ERROR for problem in problems)
+    report = "\n".join(format_problem(problem) for problem in problems)
+    level = logging.ERROR if errors else logging.WARNING
+    logging.log(level, f"Validation found {errors} error(s) and {len(problems) - errors} warning(s):\n{report}")
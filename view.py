@@ -4,19 +4,87 @@ This module provides a GUI for the DoW Troop Counters program.
 Harrison Cook
 May 2020
 """
+import logging
 import sys
 import generate_data
+import metrics
 
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtCore, QtGui, QtWidgets, uic
 
 from file_handlers import load_from_json
+from indexes import InternPool
+from profiles import get_profile_config, get_profile_names
+from scoring import METRICS, METRIC_LABELS
+from skyline import SKYLINE_METRICS, calculate_race_skyline
+from watcher import FileWatcher, Regenerator
+from whatif import WhatIf, WhatIfError
 from window_file import Ui_MainWindow
 
 
-class CustomQListWidgetItem(QtWidgets.QListWidgetItem):
-    def __init__(self, text, value, listWidget):
-        super().__init__(text, listWidget)
-        self.value = value
+class ListModel(QtCore.QAbstractListModel):
+    """
+    A read only list of labels, each with a value behind it (e.g. a troop's
+    display name and its troop file). The labels are built once, so
+    showing a list is just a matter of giving its model to the view.
+    """
+
+    def __init__(self, labels, values=None, parent=None):
+        """
+        :param labels: the text to display for each row
+        :param values: the value of each row, defaults to the labels
+        :param parent: the model's parent QObject
+        """
+        super().__init__(parent)
+        self.labels = tuple(labels)
+        self.values = self.labels if values is None else tuple(values)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        # A list has no children below its rows
+        return 0 if parent.isValid() else len(self.labels)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return self.labels[index.row()]
+        if role == QtCore.Qt.UserRole:
+            return self.values[index.row()]
+        return None
+
+    def value(self, index):
+        """
+        Gets the value behind a row.
+
+        :param index: the QModelIndex of the row
+        :returns: the row's value, or None for an invalid index
+        """
+        return self.values[index.row()] if index.isValid() else None
+
+
+class RegenerateWorker(QtCore.QThread):
+    """
+    Regenerates the data on a background thread, so the window carries on
+    responding while the files are read and the counters recalculated.
+    """
+    regenerated = QtCore.pyqtSignal(list)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, regenerator, changed_paths=None, parent=None):
+        """
+        :param regenerator: the Regenerator to regenerate the data with
+        :param changed_paths: the input files that changed, or None to
+                                regenerate everything
+        """
+        super().__init__(parent)
+        self.regenerator = regenerator
+        self.changed_paths = changed_paths
+
+    def run(self):
+        try:
+            self.regenerated.emit(self.regenerator.regenerate(self.changed_paths))
+        except Exception as e:
+            logging.exception(f"Failed to regenerate data: {e}")
+            self.failed.emit(str(e))
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -30,6 +98,30 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.ui.actionDewit.triggered.connect(self.generate_data)
 
+        # Regenerates the data whenever the input files change
+        self.actionWatch = QtWidgets.QAction("Watch for changes", self)
+        self.actionWatch.setCheckable(True)
+        self.ui.menuGenerate_Data.addAction(self.actionWatch)
+        self.actionWatch.toggled.connect(self.toggle_watch)
+        self.watcher = None
+        self.regenerator = None
+        self.regenerateWorker = None
+        self.watchTimer = QtCore.QTimer(self)
+        self.watchTimer.setInterval(1000)
+        self.watchTimer.timeout.connect(self.check_for_changes)
+
+        # The config profile whose data is being displayed
+        self.profile = None
+        self.profile_data = {}
+        self.profileComboBox = QtWidgets.QComboBox(self)
+        self.ui.menubar.setCornerWidget(self.profileComboBox)
+        self.profileComboBox.currentIndexChanged.connect(self.profile_change)
+        # The list models of the displayed profile
+        self.race_model = None
+        self.empty_model = None
+        self.troop_models = {}
+        self.weapon_models = {}
+
         self.first = True
 
         table = self.ui.playerCounterTable
@@ -41,105 +133,484 @@ class MainWindow(QtWidgets.QMainWindow):
         table.setColumnWidth(2, 45)
         table.setHorizontalHeaderLabels(["Troop", "Weapon", "DPS"])
 
+        # The metric the counters table is sorted by
+        self.metricComboBox = QtWidgets.QComboBox(self.ui.centralwidget)
+        for metric in METRICS:
+            self.metricComboBox.addItem(METRIC_LABELS[metric], metric)
+        self.ui.gridLayout.addWidget(self.metricComboBox, 0, 7, 1, 1)
+        self.metricComboBox.currentIndexChanged.connect(self.metric_change)
+
+        # Timings of the slots and data loading, for finding slowdowns
+        self.menuDebug = self.ui.menubar.addMenu("Debug")
+        self.actionCollectMetrics = self.menuDebug.addAction("Collect metrics")
+        self.actionCollectMetrics.setCheckable(True)
+        self.actionCollectMetrics.toggled.connect(self.toggle_metrics)
+        self.actionShowMetrics = self.menuDebug.addAction("Show metrics")
+        self.actionShowMetrics.triggered.connect(self.show_metrics)
+        self.metricsDialog = None
+
+        # Balance changes applied on top of the generated scores
+        self.what_if = None
+        self.create_what_if_panel()
+
+        # The player race's all-round units, found when first shown
+        self.skylines = {}
+        self.create_skyline_panel()
+
         try:
             self.init()
         except:
             pass
 
 
+    @metrics.timed("view.init")
     def init(self):
         """
         Initialises the data display in the GUI
         """
         self.config = load_from_json("config.json")
-        self.troops = load_from_json(self.config["data"]["troops"], self.first)
-        self.weapons = load_from_json(self.config["data"]["weapons"], self.first)
-        self.armour_types = load_from_json(self.config["data"]["armourTypes"], self.first)
-        self.counters = load_from_json(self.config["data"]["counters"], self.first)
+        if self.first and self.config.get("metrics"):
+            self.actionCollectMetrics.setChecked(True)
+        self.load_profiles()
 
-        self.current_troop_list = list(self.troops)
         self.opponent_race_selected = None
 
-        self.ui.opponentRaceList.currentItemChanged.connect(self.populate_troops)
-        self.ui.opponentUnitList.currentItemChanged.connect(self.display_troop)
-        self.ui.playerRaceList.currentItemChanged.connect(self.player_race_change)
+        self.populate_profiles()
+
+        self.first = False
+
+
+    @metrics.timed("view.load_profiles")
+    def load_profiles(self):
+        """
+        Loads the data of every profile that has been generated. The
+        profiles share their identical strings and rows, so loading
+        several similar mods costs little more than loading one.
+        """
+        pool = InternPool()
+        self.profile_data = {}
+        for profile in [None] + get_profile_names(self.config):
+            data = get_profile_config(self.config, profile)["data"]
+            try:
+                self.profile_data[profile] = {
+                    data_file: pool.load_json(data[data_file])
+                    for data_file in ("troops", "weapons", "armourTypes", "counters", "scores")
+                }
+            except Exception as e:
+                # The profile hasn't been generated yet
+                logging.info(f"Skipping profile {profile or 'Default'}, its data can't be loaded: {e}")
+                continue
+
+        if metrics.is_enabled():
+            self.record_memory()
+
+
+    def record_memory(self):
+        """
+        Records the memory each loaded data file uses.
+        """
+        for profile, profile_data in self.profile_data.items():
+            for data_file, value in profile_data.items():
+                metrics.set_gauge(f"memory.{profile or 'Default'}.{data_file}", metrics.deep_size(value))
+
+
+    def populate_profiles(self):
+        """
+        Populates the profile selector with the loaded profiles, keeping
+        the current profile selected if it is still loaded.
+        """
+        if not self.profile_data:
+            self.setWindowStatus("No data loaded, generate the data first")
+            return
+
+        if self.profile not in self.profile_data:
+            self.profile = next(iter(self.profile_data))
+
+        self.profileComboBox.blockSignals(True)
+        self.profileComboBox.clear()
+        for profile in self.profile_data:
+            self.profileComboBox.addItem(profile or "Default", profile)
+        self.profileComboBox.setCurrentIndex(self.profileComboBox.findData(self.profile))
+        self.profileComboBox.blockSignals(False)
+
+        self.use_profile(self.profile)
+
+
+    @metrics.timed("view.use_profile")
+    def use_profile(self, profile):
+        """
+        Displays a loaded profile's data.
 
+        :param profile: the name of the profile, or None for the top level
+                        config
+        """
+        self.profile = profile
+        profile_data = self.profile_data[profile]
+        self.troops = profile_data["troops"]
+        self.weapons = profile_data["weapons"]
+        self.armour_types = profile_data["armourTypes"]
+        self.counters = profile_data["counters"]
+        self.scores = profile_data["scores"]
+
+        self.current_troop_list = list(self.troops)
+        self.what_if = None
+        self.populate_what_if_panel()
+        self.skylines = {}
+        self.create_list_models()
+        self.reset_table()
         self.populate_races()
+        self.populate_skyline_panel()
 
-        self.first = False
+
+    def profile_change(self, _index):
+        """
+        Process the user changing the profile selection.
+        """
+        self.use_profile(self.profileComboBox.currentData())
+
+
+    def create_list_models(self):
+        """
+        Creates the list models for the profile's data. Every race's
+        troops are sorted by name up front, so selecting a race or troop
+        only swaps a list's model rather than rebuilding its items.
+        """
+        # Qt deletes the previous profile's models once control returns to
+        # the event loop, by which time the lists have been given new ones
+        old_models = [self.race_model, self.empty_model, *self.troop_models.values(), *self.weapon_models.values()]
+        for model in old_models:
+            if model is not None:
+                model.deleteLater()
+
+        self.race_model = ListModel(self.troops, parent=self)
+        self.empty_model = ListModel((), parent=self)
+        self.troop_models = {}
+        for race, race_troops in self.troops.items():
+            troop_files = sorted(race_troops, key=lambda troop_file: (
+                (race_troops[troop_file]["display_name"] or troop_file).lower(), troop_file))
+            self.troop_models[race] = ListModel(
+                [race_troops[troop_file]["display_name"] or troop_file for troop_file in troop_files],
+                troop_files, self)
+        # Weapon lists are made the first time their troop is selected
+        self.weapon_models = {}
+
+
+    def set_list_model(self, list_view, model, current_changed=None):
+        """
+        Shows a model in a list. A list gets a new selection model with
+        every model, so the selection signal is connected again each time.
+
+        :param list_view: the QListView to show the model in
+        :param model: the ListModel to show
+        :param current_changed: the slot to call when the current row
+                                changes, if any
+        """
+        old_selection_model = list_view.selectionModel()
+        list_view.setModel(model)
+        if old_selection_model is not None:
+            old_selection_model.deleteLater()
+        if current_changed is not None:
+            list_view.selectionModel().currentChanged.connect(current_changed)
 
 
     def populate_races(self):
         """
         Populates the race lists.
         """
-        self.ui.opponentRaceList.clear()
-        self.ui.opponentRaceList.addItems(list(self.troops))
-        self.ui.playerRaceList.clear()
-        self.ui.playerRaceList.addItems(list(self.troops))
+        self.set_list_model(self.ui.opponentRaceList, self.race_model, self.populate_troops)
+        self.set_list_model(self.ui.playerRaceList, self.race_model, self.player_race_change)
+        self.set_list_model(self.ui.opponentUnitList, self.empty_model, self.display_troop)
+        self.display_troop(QtCore.QModelIndex())
 
 
-    def populate_troops(self, selected_race):
+    @metrics.timed("view.populate_troops")
+    def populate_troops(self, selected_race, _previous=None):
         """
         Populates the troop lists
         
-        :param selected_race: the race that has been selected by the user
+        :param selected_race: the QModelIndex of the race that has been
+                                selected by the user
         """
-        self.ui.opponentUnitList.clear()
-        if selected_race:
-            self.opponent_race_selected = selected_race.text()
-            for troop in self.troops[self.opponent_race_selected]:
-                CustomQListWidgetItem(self.troops[self.opponent_race_selected][troop]['display_name'], troop, self.ui.opponentUnitList)
+        if selected_race.isValid():
+            self.opponent_race_selected = self.race_model.value(selected_race)
+            model = self.troop_models[self.opponent_race_selected]
+        else:
+            model = self.empty_model
+        self.set_list_model(self.ui.opponentUnitList, model, self.display_troop)
+        self.display_troop(QtCore.QModelIndex())
 
 
-    def display_troop(self, selected_troop):
+    @metrics.timed("view.display_troop")
+    def display_troop(self, selected_troop, _previous=None):
         """
         Populates the troop information labels when a troop is selected.
 
-        :param selected_troop: the troop that has been selected
+        :param selected_troop: the QModelIndex of the troop that has been
+                                selected
         """
         self.reset_table()
-        if selected_troop:
-            troop = self.troops[self.opponent_race_selected][selected_troop.value]
+        if selected_troop.isValid():
+            troop_file = selected_troop.data(QtCore.Qt.UserRole)
+            troop = self.troops[self.opponent_race_selected][troop_file]
             self.ui.opponentUnitNameLabel.setText(troop["display_name"])
             self.ui.opponentFileNameLabel.setText(troop["troop_file"])
             self.ui.opponentArmourTypeLabel.setText(troop["armour_types"])
-            self.ui.opponentUnitWeaponList.clear()
-            self.ui.opponentUnitWeaponList.addItems(troop["weapons"])
+
+            key = (self.opponent_race_selected, troop_file)
+            if key not in self.weapon_models:
+                self.weapon_models[key] = ListModel(troop["weapons"], parent=self)
+            self.set_list_model(self.ui.opponentUnitWeaponList, self.weapon_models[key])
         else:
             self.ui.opponentUnitNameLabel.clear()
             self.ui.opponentFileNameLabel.clear()
             self.ui.opponentArmourTypeLabel.clear()
-            self.ui.opponentUnitWeaponList.clear()
+            self.set_list_model(self.ui.opponentUnitWeaponList, self.empty_model)
 
 
-    def player_race_change(self, selected_race):
+    def player_race_change(self, selected_race, _previous=None):
         """
         Process the user changing the player race selection.
         """
-        if len(self.ui.opponentFileNameLabel.text()) > 0:
+        self.populate_skyline_panel()
+        if selected_race.isValid() and len(self.ui.opponentFileNameLabel.text()) > 0:
             self.populate_table(selected_race)
 
 
+    def metric_change(self, _index):
+        """
+        Process the user changing the metric the counters are sorted by.
+        """
+        self.refresh_table()
+
+
+    @metrics.timed("view.populate_table")
     def populate_table(self, selected_race):
         """
-        Populates the counters (DPS) table.
+        Populates the counters table, sorted by the selected metric.
 
-        :param selected_race: the player race the user has selected
+        :param selected_race: the QModelIndex of the player race the user
+                                has selected
         """
         self.reset_table()
-        selected_race = selected_race.text()
+        selected_race = self.race_model.value(selected_race)
         selected_armour_type = self.ui.opponentArmourTypeLabel.text()
-        counters = self.counters[selected_race][selected_armour_type]
+        metric = self.metricComboBox.currentData()
+        scores = self.what_if.scores if self.what_if is not None else self.scores
+        race_scores = scores["races"][selected_race]
+        armour_type_scores = race_scores["armourTypes"][selected_armour_type]
+        values = armour_type_scores["values"][metric]
         
         table = self.ui.playerCounterTable
-        table.setRowCount(len(counters))
+        table.setHorizontalHeaderItem(2, QtWidgets.QTableWidgetItem(METRIC_LABELS[metric]))
+        table.setRowCount(len(values))
 
-        for index, counter in enumerate(counters):
-            unit_name = self.troops[selected_race][counter["troop_file"]]["display_name"]
+        for index, row in enumerate(armour_type_scores["order"][metric]):
+            troop_file, weapon = race_scores["rows"][row]
+            value = values[row]
+            unit_name = self.troops[selected_race][troop_file]["display_name"]
             table.setItem(index, 0, QtWidgets.QTableWidgetItem(unit_name)) 
-            table.setItem(index, 1, QtWidgets.QTableWidgetItem(counter["weapon"]))
-            table.setItem(index, 2, QtWidgets.QTableWidgetItem("{:.1f}".format(counter["damage"])))
+            table.setItem(index, 1, QtWidgets.QTableWidgetItem(weapon))
+            table.setItem(index, 2, QtWidgets.QTableWidgetItem("-" if value is None else "{:.1f}".format(value)))
+
+
+    def create_what_if_panel(self):
+        """
+        Creates the what-if panel, for trying out changes to weapon DPS
+        without regenerating the data.
+        """
+        self.whatIfDock = QtWidgets.QDockWidget("What if", self)
+        self.whatIfDock.setObjectName("whatIfDock")
+        panel = QtWidgets.QWidget(self.whatIfDock)
+        layout = QtWidgets.QFormLayout(panel)
+
+        self.whatIfWeaponComboBox = QtWidgets.QComboBox(panel)
+        self.whatIfWeaponComboBox.setEditable(True)
+        self.whatIfWeaponComboBox.setInsertPolicy(QtWidgets.QComboBox.NoInsert)
+        self.whatIfWeaponComboBox.completer().setFilterMode(QtCore.Qt.MatchContains)
+        layout.addRow("Weapon", self.whatIfWeaponComboBox)
+
+        self.whatIfArmourTypeComboBox = QtWidgets.QComboBox(panel)
+        layout.addRow("Against", self.whatIfArmourTypeComboBox)
+
+        self.whatIfModeComboBox = QtWidgets.QComboBox(panel)
+        self.whatIfModeComboBox.addItem("Multiply DPS by", "scale")
+        self.whatIfModeComboBox.addItem("Set DPS to", "set")
+        self.whatIfValueSpinBox = QtWidgets.QDoubleSpinBox(panel)
+        self.whatIfValueSpinBox.setRange(0, 100000)
+        self.whatIfValueSpinBox.setDecimals(2)
+        self.whatIfValueSpinBox.setValue(1.2)
+        layout.addRow(self.whatIfModeComboBox, self.whatIfValueSpinBox)
+
+        buttons = QtWidgets.QHBoxLayout()
+        self.whatIfApplyButton = QtWidgets.QPushButton("Apply", panel)
+        self.whatIfApplyButton.clicked.connect(self.apply_what_if)
+        self.whatIfResetButton = QtWidgets.QPushButton("Reset", panel)
+        self.whatIfResetButton.clicked.connect(self.reset_what_if)
+        buttons.addWidget(self.whatIfApplyButton)
+        buttons.addWidget(self.whatIfResetButton)
+        layout.addRow(buttons)
+
+        self.whatIfEditsText = QtWidgets.QPlainTextEdit(panel)
+        self.whatIfEditsText.setReadOnly(True)
+        self.whatIfEditsText.setPlaceholderText("No changes, the table shows the generated data")
+        layout.addRow(self.whatIfEditsText)
+
+        self.whatIfDock.setWidget(panel)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.whatIfDock)
+        self.whatIfDock.hide()
+        self.menuTools = self.ui.menubar.addMenu("Tools")
+        self.menuTools.addAction(self.whatIfDock.toggleViewAction())
+
+
+    def populate_what_if_panel(self):
+        """
+        Fills the what-if panel's weapons and armour types from the
+        profile's data, clearing any changes.
+        """
+        self.whatIfWeaponComboBox.clear()
+        self.whatIfWeaponComboBox.addItem("Every weapon", None)
+        for weapon in sorted(self.weapons):
+            self.whatIfWeaponComboBox.addItem(weapon, weapon)
+
+        self.whatIfArmourTypeComboBox.clear()
+        self.whatIfArmourTypeComboBox.addItem("Every armour type", None)
+        for armour_type in self.get_scored_armour_types():
+            self.whatIfArmourTypeComboBox.addItem(armour_type, armour_type)
+
+        self.whatIfEditsText.clear()
+
+
+    def get_scored_armour_types(self):
+        """
+        :returns: the armour types the scores were generated for
+        """
+        race_scores = next(iter(self.scores["races"].values()), {"armourTypes": {}})
+        return list(race_scores["armourTypes"])
+
+
+    def apply_what_if(self):
+        """
+        Applies the change in the what-if panel, then refreshes the
+        counters table.
+        """
+        weapon_index = self.whatIfWeaponComboBox.findText(self.whatIfWeaponComboBox.currentText())
+        weapon = self.whatIfWeaponComboBox.itemData(weapon_index) if weapon_index >= 0 else None
+        if weapon is None and weapon_index != 0:
+            self.setWindowStatus(f"Unknown weapon: {self.whatIfWeaponComboBox.currentText()}")
+            return
+        armour_type = self.whatIfArmourTypeComboBox.currentData()
+        mode = self.whatIfModeComboBox.currentData()
+        value = self.whatIfValueSpinBox.value()
+
+        if self.what_if is None:
+            # Made the first time it is used, since it copies the scores
+            self.what_if = WhatIf(self.troops, self.weapons, self.get_scored_armour_types())
+
+        timer = QtCore.QElapsedTimer()
+        timer.start()
+        try:
+            if weapon is None:
+                if mode != "scale" or armour_type is None:
+                    raise WhatIfError("Choose a weapon, or an armour type to multiply every weapon against")
+                changed = self.what_if.scale_armour_type(armour_type, value)
+            elif mode == "scale":
+                changed = self.what_if.scale_weapon(weapon, value, armour_type)
+            else:
+                changed = self.what_if.set_weapon_dps(weapon, armour_type, value)
+        except WhatIfError as e:
+            self.setWindowStatus(str(e))
+            return
+
+        edit = "{} vs {}: {} {:g}".format(
+            weapon or "Every weapon", armour_type or "every armour type",
+            "x" if mode == "scale" else "=", value)
+        self.whatIfEditsText.appendPlainText(edit)
+        self.setWindowStatus(f"Re-ranked {len(changed)} counter lists in {timer.elapsed()}ms")
+        self.refresh_table()
+
+
+    def reset_what_if(self):
+        """
+        Undoes every what-if change, going back to the generated data.
+        """
+        if self.what_if is not None:
+            self.what_if.reset()
+        self.whatIfEditsText.clear()
+        self.refresh_table()
+
+
+    def create_skyline_panel(self):
+        """
+        Creates the all-round units panel, listing the player race's troop
+        and weapon pairs that nothing else in the race beats against every
+        armour type.
+        """
+        self.skylineDock = QtWidgets.QDockWidget("All-round units", self)
+        self.skylineDock.setObjectName("skylineDock")
+        panel = QtWidgets.QWidget(self.skylineDock)
+        layout = QtWidgets.QFormLayout(panel)
+
+        self.skylineMetricComboBox = QtWidgets.QComboBox(panel)
+        for metric in SKYLINE_METRICS:
+            self.skylineMetricComboBox.addItem(METRIC_LABELS[metric], metric)
+        self.skylineMetricComboBox.currentIndexChanged.connect(self.populate_skyline_panel)
+        layout.addRow("Compare by", self.skylineMetricComboBox)
+
+        # Depth 0 pairs are never beaten, depth 1 pairs only by depth 0
+        # pairs and so on
+        self.skylineDepthSpinBox = QtWidgets.QSpinBox(panel)
+        self.skylineDepthSpinBox.setRange(0, 100000)
+        self.skylineDepthSpinBox.valueChanged.connect(self.populate_skyline_panel)
+        layout.addRow("Up to depth", self.skylineDepthSpinBox)
+
+        self.skylineTable = QtWidgets.QTableWidget(0, 3, panel)
+        self.skylineTable.setHorizontalHeaderLabels(["Troop", "Weapon", "Depth"])
+        self.skylineTable.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        layout.addRow(self.skylineTable)
+
+        self.skylineDock.setWidget(panel)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.skylineDock)
+        self.skylineDock.hide()
+        self.skylineDock.visibilityChanged.connect(self.populate_skyline_panel)
+        self.menuTools.addAction(self.skylineDock.toggleViewAction())
+
+
+    @metrics.timed("view.populate_skyline_panel")
+    def populate_skyline_panel(self, *_args):
+        """
+        Lists the selected player race's all-round units, if the panel is
+        showing. Each race's skyline is found the first time it is shown.
+        """
+        self.skylineTable.setRowCount(0)
+        selected_race = self.ui.playerRaceList.currentIndex()
+        if not self.skylineDock.isVisible() or not selected_race.isValid():
+            return
+
+        race = self.race_model.value(selected_race)
+        metric = self.skylineMetricComboBox.currentData()
+        if (race, metric) not in self.skylines:
+            self.skylines[(race, metric)] = calculate_race_skyline(
+                self.troops[race], self.weapons, self.get_scored_armour_types(), metric)
+        race_skyline = self.skylines[(race, metric)]
+
+        max_depth = self.skylineDepthSpinBox.value()
+        rows = sorted((depth, row) for row, depth in enumerate(race_skyline["depth"]) if depth <= max_depth)
+        self.skylineTable.setRowCount(len(rows))
+        for index, (depth, row) in enumerate(rows):
+            troop_file, weapon = race_skyline["rows"][row]
+            unit_name = self.troops[race][troop_file]["display_name"]
+            self.skylineTable.setItem(index, 0, QtWidgets.QTableWidgetItem(unit_name))
+            self.skylineTable.setItem(index, 1, QtWidgets.QTableWidgetItem(weapon))
+            self.skylineTable.setItem(index, 2, QtWidgets.QTableWidgetItem(str(depth)))
+
+
+    def refresh_table(self):
+        """
+        Populates the counters table again if it is showing counters.
+        """
+        selected_race = self.ui.playerRaceList.currentIndex()
+        if selected_race.isValid() and len(self.ui.opponentFileNameLabel.text()) > 0:
+            self.populate_table(selected_race)
 
 
     def reset_table(self):
@@ -166,7 +637,7 @@ class MainWindow(QtWidgets.QMainWindow):
         try:
             self.setWindowStatus("Generating data...")
             
-            generate_data.run()
+            generate_data.run(profile=self.profile)
 
             self.setWindowStatus("Populating GUI elements..")
 
@@ -176,6 +647,169 @@ class MainWindow(QtWidgets.QMainWindow):
             self.setWindowStatus(f"Failed to generate data: {e}")
 
 
+    def toggle_metrics(self, checked):
+        """
+        Starts or stops collecting metrics.
+
+        :param checked: whether or not collecting has been turned on
+        """
+        metrics.enable(checked)
+        if checked:
+            self.setWindowStatus("Collecting metrics")
+            # The data is already loaded, so measure its memory now
+            self.record_memory()
+        else:
+            self.setWindowStatus("Stopped collecting metrics")
+
+
+    def show_metrics(self):
+        """
+        Shows the metrics recorded so far in a window, and writes them to
+        the log.
+        """
+        if self.metricsDialog is None:
+            self.metricsDialog = QtWidgets.QDialog(self)
+            self.metricsDialog.setWindowTitle("Metrics")
+            self.metricsDialog.resize(700, 400)
+            layout = QtWidgets.QVBoxLayout(self.metricsDialog)
+            self.metricsText = QtWidgets.QPlainTextEdit(self.metricsDialog)
+            self.metricsText.setReadOnly(True)
+            self.metricsText.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+            layout.addWidget(self.metricsText)
+            buttons = QtWidgets.QDialogButtonBox(self.metricsDialog)
+            buttons.addButton("Refresh", QtWidgets.QDialogButtonBox.ActionRole).clicked.connect(self.refresh_metrics)
+            buttons.addButton("Reset", QtWidgets.QDialogButtonBox.ResetRole).clicked.connect(self.reset_metrics)
+            buttons.addButton(QtWidgets.QDialogButtonBox.Close).clicked.connect(self.metricsDialog.close)
+            layout.addWidget(buttons)
+
+        self.refresh_metrics()
+        metrics.log_report()
+        self.metricsDialog.show()
+        self.metricsDialog.raise_()
+
+
+    def refresh_metrics(self):
+        """
+        Shows the latest metrics in the metrics window.
+        """
+        self.metricsText.setPlainText(metrics.report())
+
+
+    def reset_metrics(self):
+        """
+        Forgets the metrics recorded so far.
+        """
+        metrics.reset()
+        self.refresh_metrics()
+
+
+    def toggle_watch(self, checked):
+        """
+        Starts or stops watching the input files for changes.
+
+        :param checked: whether or not watching has been turned on
+        """
+        if not checked:
+            self.watchTimer.stop()
+            if self.watcher:
+                self.watcher.stop()
+            self.watcher = None
+            self.setWindowStatus("Stopped watching for changes")
+            return
+
+        if self.is_regenerating():
+            self.actionWatch.setChecked(False)
+            self.setWindowStatus("Still regenerating data, try again once it has finished")
+            return
+
+        try:
+            self.regenerator = Regenerator(profile=self.profile)
+        except Exception as e:
+            self.actionWatch.setChecked(False)
+            self.setWindowStatus(f"Failed to watch for changes: {e}")
+            return
+
+        self.setWindowStatus("Generating data...")
+        self.start_regeneration()
+
+
+    def is_regenerating(self):
+        """
+        :returns: whether or not the data is being regenerated
+        """
+        return self.regenerateWorker is not None and self.regenerateWorker.isRunning()
+
+
+    def start_regeneration(self, changed_paths=None):
+        """
+        Regenerates the data on a worker thread. The results are handled
+        by regeneration_finished or regeneration_failed.
+
+        :param changed_paths: the input files that changed, or None to
+                                regenerate everything
+        """
+        self.regenerateWorker = RegenerateWorker(self.regenerator, changed_paths, self)
+        self.regenerateWorker.regenerated.connect(self.regeneration_finished)
+        self.regenerateWorker.failed.connect(self.regeneration_failed)
+        self.regenerateWorker.start()
+
+
+    def regeneration_finished(self, races):
+        """
+        Shows the regenerated data, and starts watching for changes once
+        the first regeneration has finished.
+
+        :param races: the names of the races that were regenerated
+        """
+        self.setWindowStatus("Populating GUI elements..")
+        self.init()
+
+        if not self.actionWatch.isChecked():
+            self.setWindowStatus("Data successfuly generated")
+        elif self.watcher is None:
+            try:
+                self.watcher = FileWatcher(self.regenerator.config)
+            except Exception as e:
+                self.actionWatch.setChecked(False)
+                self.setWindowStatus(f"Failed to watch for changes: {e}")
+                return
+            self.watchTimer.start()
+            self.setWindowStatus("Watching for changes")
+        else:
+            self.setWindowStatus(f"Regenerated data for {', '.join(races) or 'no races'}")
+
+
+    def regeneration_failed(self, error):
+        """
+        Shows why the data couldn't be regenerated. The last good data
+        stays loaded.
+
+        :param error: the error message
+        """
+        if self.watcher is None:
+            self.actionWatch.setChecked(False)
+            self.setWindowStatus(f"Failed to watch for changes: {error}")
+        else:
+            self.setWindowStatus(f"Failed to regenerate data: {error}")
+
+
+    def check_for_changes(self):
+        """
+        Regenerates the data affected by any changed input files. Changes
+        made while a regeneration is running are picked up once it has
+        finished.
+        """
+        if self.is_regenerating():
+            return
+
+        changed_paths = self.watcher.poll()
+        if not changed_paths:
+            return
+
+        self.setWindowStatus("Regenerating data...")
+        self.start_regeneration(changed_paths)
+
+
 if __name__ == "__main__":
     app = QtWidgets.QApplication([])
 
@@ -0,0 +1,325 @@
+"""
+Watches the input files and regenerates the data when they change.
+
+- The weapon DPS csv and every race's troops directory are watched, with
+  inotify (or the platform's equivalent) through watchdog if it is
+  installed, or by polling the files otherwise
+- Bursts of changes (e.g. dumping every RGD in Corsix's) are debounced
+  into a single regeneration
+- When only troop files change, only those files are re-read and only
+  their races' counters (and skylines) are recalculated; the rest of the
+  data is reused. If they change which armour types the troops have,
+  everything is regenerated
+"""
+import logging
+import threading
+import time
+
+from pathlib import Path
+
+import generate_data
+
+from database import save_to_sqlite
+from file_handlers import load_from_json, save_to_json
+from indexes import save_troop_index
+from profiles import load_profile_config
+from scoring import calculate_scores
+from skyline import calculate_race_skyline
+from troops import update_race_troops
+from validation import validate_loaded_data
+
+# watchdog is optional, the files are polled if it isn't installed
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+
+class FileWatcher():
+    """
+    Keeps track of changes to the input files.
+    """
+
+    def __init__(self, config: dict, debounce: float=0.5, use_polling: bool=False):
+        """
+        :param config: the configuration for the program
+        :param debounce: the number of seconds the files must stop
+                            changing for before the changes are returned
+        :param use_polling: whether or not to poll the files even if
+                            watchdog is installed
+        """
+        self.weapon_input = Path(config["corsixWeaponDPS"])
+        self.directories = [Path(directory) for directory in config["troops"].values()]
+        self.debounce = debounce
+
+        self.snapshot = self.take_snapshot()
+        self.pending = set()
+        self.last_change = None
+
+        self.observer = None
+        self.dirty = threading.Event()
+        if Observer is not None and not use_polling:
+            self.start_observer()
+
+    def start_observer(self):
+        """
+        Starts watching the input directories for file events.
+        """
+        self.observer = Observer()
+        for directory in {self.weapon_input.parent, *self.directories}:
+            if directory.exists():
+                self.observer.schedule(self, str(directory), recursive=False)
+        self.observer.start()
+        logging.info("Watching input files for changes")
+
+    def dispatch(self, event):
+        """
+        Called by watchdog on its own thread for every file event.
+        """
+        self.dirty.set()
+
+    def stop(self):
+        """
+        Stops watching for file events.
+        """
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+
+    def take_snapshot(self):
+        """
+        Gets the modification time and size of every input file.
+
+        :returns: a dictionary mapping file paths to (mtime, size)
+        """
+        snapshot = {}
+        paths = [self.weapon_input]
+        for directory in self.directories:
+            if directory.exists():
+                paths += directory.glob("*.lua")
+
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            snapshot[str(path)] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+    def poll(self):
+        """
+        Checks for changes to the input files.
+
+        :returns: the set of changed (added, modified or deleted) file
+                    paths once they have stopped changing for the
+                    debounce time, otherwise an empty set
+        """
+        now = time.monotonic()
+
+        # With watchdog the files are only checked after an event
+        if self.observer is None or self.dirty.is_set():
+            self.dirty.clear()
+            snapshot = self.take_snapshot()
+            changed = {
+                path for path in snapshot.keys() | self.snapshot.keys()
+                if snapshot.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = snapshot
+
+            if changed:
+                self.pending |= changed
+                self.last_change = now
+                return set()
+
+        if self.pending and now - self.last_change >= self.debounce:
+            changed, self.pending = self.pending, set()
+            return changed
+
+        return set()
+
+
+class Regenerator():
+    """
+    Regenerates the data, keeping the results in memory so that later
+    regenerations only redo the parts affected by the changed files.
+    """
+
+    def __init__(self, config_path: str="config.json", profile: str=None):
+        """
+        :param config_path: the path to the config file
+        :param profile: the name of the config profile to regenerate, or
+                        None for the top level config
+        """
+        self.config_path = config_path
+        self.profile = profile
+        self.config = load_profile_config(config_path, profile)
+        self.weapon_input = Path(self.config["corsixWeaponDPS"]).resolve()
+        self.race_directories = {
+            Path(directory).resolve(): race for race, directory in self.config["troops"].items()
+        }
+        self.state = None
+
+    def regenerate(self, changed_paths: set=None):
+        """
+        Regenerates the data affected by the changed files.
+
+        :param changed_paths: the input files that changed, or None to
+                                regenerate everything
+        :returns: the names of the races that were regenerated
+        """
+        changed_paths = {Path(path).resolve() for path in changed_paths or []}
+
+        if self.state is None or not changed_paths or self.weapon_input in changed_paths:
+            # Every troop depends on the weapons and armour types
+            return self.regenerate_all()
+
+        changed_races = {}
+        for path in changed_paths:
+            race = self.race_directories.get(path.parent)
+            if race is not None and path.suffix == ".lua":
+                changed_races.setdefault(race, []).append(path)
+
+        if not changed_races:
+            return []
+
+        return self.regenerate_races(changed_races)
+
+    def regenerate_all(self):
+        """
+        Regenerates all of the data and loads it into memory.
+
+        :returns: the names of every race
+        """
+        logging.info("Regenerating all data")
+        generate_data.run(config_path=self.config_path, profile=self.profile)
+
+        data = self.config["data"]
+        armour_types_dict = load_from_json(data["armourTypes"])
+        self.state = {
+            "weapons": load_from_json(data["weapons"]),
+            "armourTypes": armour_types_dict,
+            "allArmourTypes": list(armour_types_dict["armourTypeToTroops"]),
+            "optimisedArmourTypes": generate_data.get_armour_types(self.config),
+            "troops": load_from_json(data["troops"]),
+            "counters": load_from_json(data["counters"]),
+            "skyline": load_from_json(data["skyline"]) if "skyline" in data else None
+        }
+
+        return list(self.config["troops"])
+
+    def regenerate_races(self, changed_races: dict):
+        """
+        Re-reads the changed troop files and recalculates the counters
+        for the races they belong to, reusing everything else. The
+        changes are made to copies, which only replace the data in memory
+        once they have passed validation, so a bad troop file leaves the
+        last good data in place.
+
+        :param changed_races: a dictionary mapping races to their changed
+                                troop file paths
+        :returns: the names of the races that were regenerated
+        """
+        state = self.state
+        armour_types = state["optimisedArmourTypes"]
+        data = self.config["data"]
+
+        troops_dict = dict(state["troops"])
+        for race, changed_paths in changed_races.items():
+            logging.info(f"Re-reading {len(changed_paths)} changed troop file(s) for {race}")
+            troops_dict[race] = update_race_troops(
+                dict(troops_dict.get(race, {})), changed_paths, state["weapons"],
+                state["armourTypes"]["troopsToArmourType"])
+
+        # The optimised armour types and every race's counters depend on
+        # which armour types the troops have
+        if get_troop_armour_types(troops_dict) != get_troop_armour_types(state["troops"]):
+            logging.info("The troops' armour types changed")
+            return self.regenerate_all()
+
+        validate_loaded_data(self.config, state["weapons"], state["allArmourTypes"], troops_dict)
+
+        counters = dict(state["counters"])
+        damage_classes = generate_data.DamageClasses(state["weapons"], armour_types)
+        for race in changed_races:
+            logging.info(f"Recalculating counters for {race}")
+            counters[race] = generate_data.rank_race_counters(troops_dict[race], damage_classes)
+
+        skylines = state["skyline"]
+        if skylines is not None:
+            skylines = dict(skylines, races=dict(skylines["races"]))
+            for race in changed_races:
+                logging.info(f"Recalculating the skyline for {race}")
+                skylines["races"][race] = calculate_race_skyline(
+                    troops_dict[race], state["weapons"], skylines["armourTypes"], skylines["metric"])
+
+        state["troops"] = troops_dict
+        state["counters"] = counters
+        state["skyline"] = skylines
+
+        save_to_json(data["troops"], troops_dict)
+        save_to_json(data["counters"], counters, indent=False)
+
+        # Time to kill uses the health of every race's troops
+        scores = calculate_scores(troops_dict, state["weapons"], armour_types)
+        save_to_json(data["scores"], scores, indent=False)
+
+        if "database" in data:
+            save_to_sqlite(data["database"], state["weapons"], state["allArmourTypes"], troops_dict)
+
+        if "troopIndex" in data:
+            save_troop_index(data["troopIndex"], troops_dict)
+
+        if skylines is not None:
+            save_to_json(data["skyline"], skylines, indent=False)
+
+        generate_data.write_manifest(self.config)
+
+        return sorted(changed_races)
+
+
+def get_troop_armour_types(troops_dict: dict):
+    """
+    :param troops_dict: every troop organised by race
+    :returns: the set of armour types the troops have
+    """
+    return {troop["armour_types"] for race_troops in troops_dict.values() for troop in race_troops.values()}
+
+
+def watch(config_path: str="config.json", interval: float=1.0, debounce: float=0.5,
+          use_polling: bool=False, profile: str=None):
+    """
+    Watches the input files and regenerates the data when they change,
+    until interrupted.
+
+    :param config_path: the path to the config file
+    :param interval: the number of seconds between checks for changes
+    :param debounce: the number of seconds the files must stop changing
+                        for before regenerating
+    :param use_polling: whether or not to poll the files even if
+                        watchdog is installed
+    :param profile: the name of the config profile to watch, or None for
+                    the top level config
+    """
+    regenerator = Regenerator(config_path, profile)
+    regenerator.regenerate()
+
+    watcher = FileWatcher(regenerator.config, debounce, use_polling)
+    print("Watching for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(interval)
+            changed_paths = watcher.poll()
+            if not changed_paths:
+                continue
+
+            try:
+                races = regenerator.regenerate(changed_paths)
+                print(f"Regenerated data for {', '.join(races) or 'no races'}")
+            except Exception as e:
+                logging.exception(f"Failed to regenerate data: {e}")
+                print(f"Failed to regenerate data: {e}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
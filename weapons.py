@@ -1,17 +1,32 @@
 """
-Generates the weapon data from the input csv to be put into the data 
+Generates the weapon data from the input csv to be put into the data
 files then saves that data to the specified file.
 
+The csv is usually copy-pasted through Excel, so it isn't always a clean
+comma separated file. The delimiter and the number format (decimal
+commas, thousands separators) are detected once from the file, then every
+row's DPS cells are converted together. Cells that can't be converted
+are reported all at once instead of stopping the generation.
+
 Harrison Cook
 May 2020
 """
 import csv
-import sys
+import re
 import logging
 
 from file_handlers import create_and_check_path
 from pathlib import Path
 
+# How much of the file is used to detect its dialect and number format
+SAMPLE_SIZE = 64 * 1024
+DELIMITERS = ",;\t"
+
+DECIMAL_POINT = re.compile(r"[-+]?\d*\.(\d{1,2}|\d{4,})")
+DECIMAL_COMMA = re.compile(r"[-+]?\d*,(\d{1,2}|\d{4,})")
+# Spaces Excel uses as thousands separators in some locales
+SPACES = " \u00a0\u202f"
+
 
 def collate_weapon_data(weapon_input_filename: str):
     """
@@ -19,85 +34,231 @@ def collate_weapon_data(weapon_input_filename: str):
 
     :param weapon_input_filename: the filename/path to the weapon input file
     :returns: (a dictionary of armour types and their associated troops,
-                a dictionary of all weapons andtheir dps) 
+                a dictionary of all weapons andtheir dps)
     """
     weapon_input_path = create_and_check_path(weapon_input_filename, True)
-    armour_types, weapon_rows = weapon_file_reader(weapon_input_path)
-    weapons_dict = create_weapons_dict(armour_types, weapon_rows)
+    armour_types, weapons_dict = weapon_file_reader(weapon_input_path)
 
-    return armour_types, weapons_dict
+    return set(armour_types), weapons_dict
+
+
+def detect_dialect(sample: str):
+    """
+    Detects the csv dialect of the weapon file, e.g. semicolon separated
+    when Excel is set to a locale with decimal commas. The delimiter is
+    taken from the header row, which always starts with "File", falling
+    back to sniffing the sample.
+
+    :param sample: the start of the weapon file
+    :returns: the csv dialect
+    """
+    for line in sample.splitlines():
+        line = line.strip('"')
+        delimiter = line[4:5]
+        if line.startswith("File") and delimiter and delimiter in DELIMITERS:
+            logging.debug(f"Detected {delimiter!r} separated weapon file")
+            return type("WeaponFileDialect", (csv.excel,), {"delimiter": delimiter})
+
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=DELIMITERS)
+    except csv.Error:
+        logging.debug("Could not detect the weapon file's csv dialect, assuming comma separated")
+        return csv.excel
+
+    logging.debug(f"Detected {dialect.delimiter!r} separated weapon file")
+    return dialect
+
+
+def detect_number_format(sample: str, dialect):
+    """
+    Detects whether the DPS values use a decimal point or a decimal
+    comma. Values with exactly three digits after the separator (e.g.
+    1,000) could be either, so they don't count towards either.
+
+    :param sample: the start of the weapon file
+    :param dialect: the csv dialect of the weapon file
+    :returns: (the decimal separator, the thousands separator)
+    """
+    decimal_points = decimal_commas = 0
+    # The last line of the sample may have been cut off
+    for line in csv.reader(sample.splitlines()[:-1], dialect):
+        if not line or ".rgd" not in line[0]:
+            continue
+        for cell in line[1:]:
+            cell = cell.strip()
+            if DECIMAL_POINT.fullmatch(cell):
+                decimal_points += 1
+            elif DECIMAL_COMMA.fullmatch(cell):
+                decimal_commas += 1
+
+    if decimal_commas > decimal_points:
+        logging.debug("Detected decimal commas in the weapon file")
+        return ",", "."
+
+    return ".", ","
+
+
+def create_number_table(decimal_separator: str, thousands_separator: str):
+    """
+    Creates a translation table that turns a DPS cell in the detected
+    number format into one float() can read.
+
+    :param decimal_separator: the decimal separator used in the file
+    :param thousands_separator: the thousands separator used in the file
+    :returns: a str.translate table
+    """
+    table = {ord(space): None for space in SPACES}
+    table[ord(thousands_separator)] = None
+    table[ord(decimal_separator)] = "."
+    return table
 
 
 def weapon_file_reader(weapon_input_path: Path):
     """
-    Reads weapon information and armour types from the weapon file.
+    Reads weapon information and armour types from the weapon file,
+    detecting its dialect and number format from the start of the file.
 
     :param weapon_input_path: the Path to the weapon input file
-    :returns: (a set of all armour types, a list of the weapon csv rows)
-    :raises: a generic exception when the armour types cannot be found
+    :returns: (a list of all armour types in column order, a dictionary
+                of all weapons mapped to their damage against each
+                armour type)
     """
     logging.debug("Loading weapon input csv file")
-    with open(weapon_input_path) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=",")
+    # utf-8-sig drops the byte order mark Excel adds
+    with open(weapon_input_path, encoding="utf-8-sig", newline="") as csv_file:
+        sample = csv_file.read(SAMPLE_SIZE)
+        dialect = detect_dialect(sample)
+        decimal_separator, thousands_separator = detect_number_format(sample, dialect)
+
+        csv_file.seek(0)
+        armour_types, weapons_dict = create_weapons_dict(
+            csv.reader(csv_file, dialect), decimal_separator, thousands_separator)
         logging.debug("Done")
 
-        armour_types = None
-        weapon_rows = []
-        for line in csv_reader:
-            # Find first header/damage_type line
-            if not armour_types and line[0] == "File":
-                armour_types = line[1:]
+    return armour_types, weapons_dict
+
 
-            # Skip other header/damage_type lines
-            if ".rgd" not in line[0]:
-                continue
+def create_weapons_dict(csv_reader, decimal_separator: str=".", thousands_separator: str=","):
+    """
+    Creates a dictionary of weapons, where the weapon filename are the
+    keys and the dictionary of weapon damages are the values. Each row
+    is converted as it is read, a whole row at a time.
+
+    :param csv_reader: the rows of the weapon file
+    :param decimal_separator: the decimal separator used in the file
+    :param thousands_separator: the thousands separator used in the file
+    :returns: (a list of all armour types in column order, a dictionary
+                of all weapons mapped to their damage against each
+                armour type)
+    :raises: a generic exception when the armour types cannot be found
+    """
+    number_table = create_number_table(decimal_separator, thousands_separator)
+    # Files with decimal points can mostly be read by float() as they are
+    plain_numbers = decimal_separator == "."
+
+    armour_types = None
+    columns = 0
+    weapons_dict = {}
+    diagnostics = []
+    for line in csv_reader:
+        if not line:
+            continue
+        weapon_file = line[0].strip()
 
-            weapon_rows.append(line)
+        # Skip header/damage_type lines, the first one has the armour types
+        if ".rgd" not in weapon_file:
+            if not armour_types and weapon_file == "File":
+                armour_types = [armour_type.strip() for armour_type in line[1:]]
+                # Excel pads the rows out to the widest row
+                while armour_types and not armour_types[-1]:
+                    armour_types.pop()
+                columns = len(armour_types)
+            continue
 
         if not armour_types:
-            error = "Could not find header row (armour types) in weapon stats file"
-            logging.error(error)
-            raise Exception(error)
+            continue
 
-    return set(armour_types), weapon_rows
+        cells = line[1:columns + 1]
+        try:
+            # Fast paths, the whole row converts at once
+            if plain_numbers:
+                try:
+                    weapon_damages = dict(zip(armour_types, map(float, cells)))
+                except ValueError:
+                    weapon_damages = dict(zip(armour_types, map(float, translate_row(cells, number_table))))
+            else:
+                weapon_damages = dict(zip(armour_types, map(float, translate_row(cells, number_table))))
+            if len(weapon_damages) < columns:
+                raise ValueError
+        except ValueError:
+            damages = parse_damages(armour_types, cells, number_table, csv_reader.line_num, diagnostics)
+            weapon_damages = dict(zip(armour_types, damages))
 
+        # Replace file type since units reference .lua not .rgd
+        weapons_dict[weapon_file.replace(".rgd", ".lua")] = weapon_damages
+
+    if not armour_types:
+        error = "Could not find header row (armour types) in weapon stats file"
+        logging.error(error)
+        raise Exception(error)
+
+    report_diagnostics(diagnostics)
+
+    return armour_types, weapons_dict
 
-def create_weapons_dict(armour_types: set, weapon_rows: list):
-    """
-    Creates a dictionary of weapons, where the weapon filename are the 
-    keys and the dictionary of weapon damages are the values.
 
-    :param armour_types: the set of possbile armour types
-    :param weapon_rows: a list of the weapon csv rows
-    :returns: a dictionary of all weapons mapped to their damage against
-                each armour type
+def translate_row(cells: list, number_table: dict):
     """
-    weapons_dict = {}
-    for weapon_row in weapon_rows:
-        weapon_dict = get_weapon_dict(armour_types, weapon_row)
-        weapons_dict.update(weapon_dict)
+    Translates a row's DPS cells into a form float() can read. The row
+    is translated in one go rather than cell by cell.
 
-    return weapons_dict
+    :param cells: the row's DPS cells
+    :param number_table: the translation table for the number format
+    :returns: a list of the translated cells
+    """
+    return "\0".join(cells).translate(number_table).split("\0")
 
 
-def get_weapon_dict(armour_types: set, weapon_row: list):
+def parse_damages(armour_types: list, cells: list, number_table: dict, line_number: int, diagnostics: list):
     """
-    Creates a weapon's stats dictionary by mapping the armour types
-    values as keys to the weapon_row values as values.
+    Converts a row's DPS cells one at a time, recording a diagnostic for
+    every cell that is missing, empty or not a number. Those cells are
+    given 0 DPS.
 
-    :param armour_types: the set of possbile armour types
-    :param weapon_rows: a single weapon csv rows
-    :returns: a dictionary of a single weapon mapped to it's damage
-                against each armour type
+    :param armour_types: the list of possbile armour types, in the same
+                            order as the csv columns
+    :param cells: the row's DPS cells
+    :param number_table: the translation table for the number format
+    :param line_number: the row's line number in the file
+    :param diagnostics: the list to add diagnostics to
+    :returns: a list of the row's damages
     """
-    # Replace file type since units reference .lua not .rgd
-    weapon_file_name = weapon_row[0].replace(".rgd", ".lua")
+    damages = []
+    for column, armour_type in enumerate(armour_types):
+        cell = cells[column] if column < len(cells) else None
+        try:
+            damages.append(float(cell.translate(number_table)))
+            continue
+        except (AttributeError, ValueError):
+            damages.append(0.0)
 
-    weapon_damages_list = [float(num) for num in weapon_row[1:]]
+        if cell is None:
+            problem = "is missing"
+        elif not cell.strip():
+            problem = "is empty"
+        else:
+            problem = f"is not a number ({cell!r})"
+        diagnostics.append(f"Line {line_number}, {armour_type}: DPS {problem}, using 0")
 
-    # Maps the damage_type values (as dict keys) to the weapon damages (as dict values)
-    weapon_damages = dict(zip(armour_types, weapon_damages_list))
+    return damages
 
-    weapon_dict = {weapon_file_name: weapon_damages}
 
-    return weapon_dict
+def report_diagnostics(diagnostics: list):
+    """
+    Logs every cell that couldn't be converted as a single report.
+
+    :param diagnostics: the list of diagnostics to log
+    """
+    if diagnostics:
+        report = "\n".join(diagnostics)
+        logging.warning(f"Found {len(diagnostics)} bad DPS cell(s) in the weapon file:\n{report}")
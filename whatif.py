@@ -0,0 +1,361 @@
+"""
+Tries out balance changes (e.g. "what if the heavy bolter did 20% more
+to tank_heavy_med") without editing the weapon DPS file and generating
+the data again.
+
+The weapon data is kept as a matrix, one row of DPS per weapon in armour
+type column order, and the scores are laid out the same way as the
+scoring stage lays them out. An edit only touches the DPS cells it
+changes, then only the rows of those weapons are scored again and only
+the counter lists for the changed armour types are re-ranked. The
+changed rows are filtered out of the existing ranking and merged back in
+at the places found with a binary search, rather than ranking every row
+again.
+
+    what_if = WhatIf(troops_dict, weapons_dict, armour_types)
+    what_if.scale_weapon("heavy_bolter.lua", 1.2, "tank_heavy_med")
+    what_if.counters("Space Marines", "tank_heavy_med", "dps", 10)
+"""
+import logging
+
+from array import array
+from itertools import filterfalse
+
+from scoring import ASCENDING_METRICS, METRICS, get_armour_type_health, get_race_columns, \
+    rank_metrics, score_column
+
+
+class WhatIfError(Exception):
+    """
+    An exception for when an edit can't be made, e.g. because the weapon
+    or armour type doesn't exist.
+    """
+    pass
+
+
+class WhatIf():
+    """
+    Holds a copy of the scores that balance edits are applied to. The
+    scores are in the same form as scores.json, so they can be shown
+    anywhere the generated scores can.
+    """
+
+    def __init__(self, troops_dict: dict, weapons_dict: dict, armour_types: list):
+        """
+        :param troops_dict: every troop in DoW organised by race
+        :param weapons_dict: every weapon mapped to its DPS against each
+                                armour type
+        :param armour_types: the armour types to score against
+        """
+        self.armour_types = list(armour_types)
+        self.armour_columns = {armour_type: column for column, armour_type in enumerate(self.armour_types)}
+        self.base_dps = {
+            weapon: array("d", [damages[armour_type] for armour_type in self.armour_types])
+            for weapon, damages in weapons_dict.items()
+        }
+        self.dps = {weapon: array("d", damages) for weapon, damages in self.base_dps.items()}
+
+        target_health = get_armour_type_health(troops_dict, self.armour_types)
+        self.target_health = [target_health[armour_type] for armour_type in self.armour_types]
+
+        # Each race's squad size and cost columns, and where each weapon's
+        # rows are in each race
+        self.race_columns = {}
+        self.weapon_rows = {}
+        self.scores = {"metrics": list(METRICS), "races": {}}
+        for race, race_troops in troops_dict.items():
+            rows, squad_sizes, costs = get_race_columns(race_troops)
+            self.race_columns[race] = (squad_sizes, costs)
+            for row, (_, weapon) in enumerate(rows):
+                self.weapon_rows.setdefault(weapon, {}).setdefault(race, []).append(row)
+
+            race_scores = {"rows": rows, "armourTypes": {}}
+            for column, armour_type in enumerate(self.armour_types):
+                dps = array("d", [self.dps[weapon][column] for _, weapon in rows])
+                values = score_column(dps, squad_sizes, costs, self.target_health[column])
+                race_scores["armourTypes"][armour_type] = {"values": values, "order": rank_metrics(values)}
+            self.scores["races"][race] = race_scores
+
+        # The rankings before any edits, saved the first time a ranking changes
+        self.base_orders = {}
+        self.edits = []
+
+    def check_weapon(self, weapon: str):
+        """
+        :param weapon: the weapon to check
+        :raises WhatIfError: when the weapon doesn't exist
+        """
+        if weapon not in self.dps:
+            raise WhatIfError(f"Unknown weapon: {weapon}")
+
+    def get_columns(self, armour_type: str=None):
+        """
+        Gets the matrix columns of an armour type.
+
+        :param armour_type: the armour type, or None for every armour type
+        :returns: a list of column indexes
+        :raises WhatIfError: when the armour type doesn't exist
+        """
+        if armour_type is None:
+            return list(range(len(self.armour_types)))
+        if armour_type not in self.armour_columns:
+            raise WhatIfError(f"Unknown armour type: {armour_type}")
+
+        return [self.armour_columns[armour_type]]
+
+    def scale_weapon(self, weapon: str, multiplier: float, armour_type: str=None):
+        """
+        Multiplies a weapon's DPS against an armour type.
+
+        :param weapon: the weapon to change
+        :param multiplier: what to multiply the DPS by
+        :param armour_type: the armour type, or None for every armour type
+        :returns: a list of the (race, armour type) counter lists that
+                    were re-ranked
+        :raises WhatIfError: when the edit can't be made
+        """
+        self.check_weapon(weapon)
+        check_multiplier(multiplier)
+        columns = self.get_columns(armour_type)
+
+        damages = self.dps[weapon]
+        for column in columns:
+            damages[column] *= multiplier
+
+        self.edits.append(("scale", weapon, armour_type, multiplier))
+        return self.update_weapon(weapon, columns)
+
+    def set_weapon_dps(self, weapon: str, armour_type: str, dps: float):
+        """
+        Overrides a weapon's DPS against an armour type.
+
+        :param weapon: the weapon to change
+        :param armour_type: the armour type, or None for every armour type
+        :param dps: the new DPS
+        :returns: a list of the (race, armour type) counter lists that
+                    were re-ranked
+        :raises WhatIfError: when the edit can't be made
+        """
+        self.check_weapon(weapon)
+        if dps < 0:
+            raise WhatIfError(f"DPS can't be negative: {dps}")
+        columns = self.get_columns(armour_type)
+
+        damages = self.dps[weapon]
+        for column in columns:
+            damages[column] = dps
+
+        self.edits.append(("set", weapon, armour_type, dps))
+        return self.update_weapon(weapon, columns)
+
+    def scale_armour_type(self, armour_type: str, multiplier: float):
+        """
+        Multiplies every weapon's DPS against an armour type.
+
+        :param armour_type: the armour type to change
+        :param multiplier: what to multiply the DPS by
+        :returns: a list of the (race, armour type) counter lists that
+                    were re-ranked
+        :raises WhatIfError: when the edit can't be made
+        """
+        check_multiplier(multiplier)
+        if armour_type is None:
+            raise WhatIfError("An armour type is needed")
+        column = self.get_columns(armour_type)[0]
+
+        for damages in self.dps.values():
+            damages[column] *= multiplier
+
+        self.edits.append(("scale", None, armour_type, multiplier))
+        changed = []
+        for race, race_scores in self.scores["races"].items():
+            squad_sizes, costs = self.race_columns[race]
+            dps = array("d", [self.dps[weapon][column] for _, weapon in race_scores["rows"]])
+            bucket = race_scores["armourTypes"][armour_type]
+            self.save_base_order(race, armour_type, bucket)
+            bucket["values"] = score_column(dps, squad_sizes, costs, self.target_health[column])
+            rerank(bucket)
+            changed.append((race, armour_type))
+
+        logging.debug("What-if: re-ranked %d counter lists", len(changed))
+        return changed
+
+    def reset(self):
+        """
+        Undoes every edit.
+
+        :returns: a list of the (race, armour type) counter lists that
+                    were re-ranked
+        """
+        changed = []
+        for weapon, base_damages in self.base_dps.items():
+            damages = self.dps[weapon]
+            columns = [column for column, damage in enumerate(base_damages) if damages[column] != damage]
+            if columns:
+                self.dps[weapon] = array("d", base_damages)
+                changed += self.update_weapon(weapon, columns)
+
+        self.edits = []
+        self.base_orders = {}
+        return sorted(set(changed))
+
+    def update_weapon(self, weapon: str, columns: list):
+        """
+        Scores a weapon's rows again for some armour types, then re-ranks
+        the counter lists they are in.
+
+        :param weapon: the weapon that changed
+        :param columns: the matrix columns that changed
+        :returns: a list of the (race, armour type) counter lists that
+                    were re-ranked
+        """
+        damages = self.dps[weapon]
+        changed = []
+        for race, rows in self.weapon_rows.get(weapon, {}).items():
+            squad_sizes, costs = self.race_columns[race]
+            armour_type_scores = self.scores["races"][race]["armourTypes"]
+            for column in columns:
+                armour_type = self.armour_types[column]
+                bucket = armour_type_scores[armour_type]
+                self.save_base_order(race, armour_type, bucket)
+
+                values = bucket["values"]
+                dps_values, squad_dps_values = values["dps"], values["squad_dps"]
+                dps_per_resource_values, time_to_kill_values = values["dps_per_resource"], values["time_to_kill"]
+                damage = damages[column]
+                target_health = self.target_health[column]
+                for row in rows:
+                    squad_dps = damage * squad_sizes[row]
+                    dps_values[row] = damage
+                    squad_dps_values[row] = squad_dps
+                    dps_per_resource_values[row] = squad_dps / costs[row]
+                    time_to_kill_values[row] = target_health / squad_dps if squad_dps > 0 else None
+
+                rerank_rows(bucket, rows)
+                changed.append((race, armour_type))
+
+        logging.debug("What-if: re-ranked %d counter lists", len(changed))
+        return changed
+
+    def save_base_order(self, race: str, armour_type: str, bucket: dict):
+        """
+        Keeps a counter list's ranking from before any edits, the first
+        time it is about to change.
+        """
+        if (race, armour_type) not in self.base_orders:
+            self.base_orders[(race, armour_type)] = {
+                metric: list(order) for metric, order in bucket["order"].items()
+            }
+
+    def counters(self, race: str, armour_type: str, metric: str="dps", k: int=10):
+        """
+        Gets the best counters in a race to an armour type after the edits,
+        along with how far each one has moved.
+
+        :param race: the player's race
+        :param armour_type: the armour type to counter
+        :param metric: the metric to rank by
+        :param k: the number of counters to return, or None for all of them
+        :returns: a list of dictionaries with the troop_file, weapon,
+                    metric value, rank and rank_change (positive is
+                    better than before the edits)
+        :raises WhatIfError: when the race, armour type or metric doesn't exist
+        """
+        if race not in self.scores["races"]:
+            raise WhatIfError(f"Unknown race: {race}")
+        if metric not in METRICS:
+            raise WhatIfError(f"Unknown metric: {metric}")
+        if armour_type is None:
+            raise WhatIfError("An armour type is needed")
+        self.get_columns(armour_type)
+
+        race_scores = self.scores["races"][race]
+        bucket = race_scores["armourTypes"][armour_type]
+        order = bucket["order"][metric]
+        base_order = self.base_orders.get((race, armour_type), {}).get(metric, order)
+        base_ranks = {row: rank for rank, row in enumerate(base_order)} if base_order is not order else None
+
+        counters = []
+        for rank, row in enumerate(order[:k]):
+            troop_file, weapon = race_scores["rows"][row]
+            counters.append({
+                "troop_file": troop_file,
+                "weapon": weapon,
+                metric: bucket["values"][metric][row],
+                "rank": rank + 1,
+                "rank_change": base_ranks[row] - rank if base_ranks is not None else 0
+            })
+
+        return counters
+
+
+def check_multiplier(multiplier: float):
+    """
+    :param multiplier: the multiplier to check
+    :raises WhatIfError: when the multiplier is negative
+    """
+    if multiplier < 0:
+        raise WhatIfError(f"Multiplier can't be negative: {multiplier}")
+
+
+def get_rank_key(metric: str, column: list):
+    """
+    Gets the key a metric's rows are ranked by. Ties are broken by row,
+    the same as scoring.rank_metrics, so every row's key is different.
+
+    :param metric: the metric being ranked
+    :param column: the metric's values
+    :returns: a function from a row to its key, best first
+    """
+    if metric in ASCENDING_METRICS:
+        # Rows that can never kill the target go last
+        return lambda row: (column[row] is None, column[row] or 0, row)
+
+    return lambda row: (-column[row], row)
+
+
+def rerank(bucket: dict):
+    """
+    Re-ranks a counter list in place after every value in it changed.
+    Sorting the old ranking is still quicker than ranking from scratch,
+    since an armour type wide change leaves most of it in order.
+
+    :param bucket: an armour type's values and order
+    """
+    for metric, column in bucket["values"].items():
+        bucket["order"][metric].sort(key=get_rank_key(metric, column))
+
+
+def rerank_rows(bucket: dict, rows: list):
+    """
+    Re-ranks a counter list in place after some of its rows changed. The
+    rest of the ranking is still in order, so the changed rows are
+    filtered out in one pass, their new places found with a binary
+    search, and the ranking rebuilt from slices in another pass.
+
+    :param bucket: an armour type's values and order
+    :param rows: the rows whose values changed
+    """
+    changed_rows = set(rows)
+    for metric, column in bucket["values"].items():
+        order = bucket["order"][metric]
+        key = get_rank_key(metric, column)
+        kept = list(filterfalse(changed_rows.__contains__, order))
+
+        reranked = []
+        previous = 0
+        for row in sorted(changed_rows, key=key):
+            row_key = key(row)
+            low, high = previous, len(kept)
+            while low < high:
+                middle = (low + high) // 2
+                if key(kept[middle]) < row_key:
+                    low = middle + 1
+                else:
+                    high = middle
+            reranked += kept[previous:low]
+            reranked.append(row)
+            previous = low
+
+        reranked += kept[previous:]
+        order[:] = reranked
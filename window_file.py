@@ -21,7 +21,7 @@ class Ui_MainWindow(object):
         self.verticalLayout.setObjectName("verticalLayout")
         self.gridLayout = QtWidgets.QGridLayout()
         self.gridLayout.setObjectName("gridLayout")
-        self.opponentUnitList = QtWidgets.QListWidget(self.centralwidget)
+        self.opponentUnitList = QtWidgets.QListView(self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.MinimumExpanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
@@ -31,6 +31,8 @@ class Ui_MainWindow(object):
         self.opponentUnitList.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.opponentUnitList.setProperty("showDropIndicator", False)
         self.opponentUnitList.setDefaultDropAction(QtCore.Qt.IgnoreAction)
+        self.opponentUnitList.setLayoutMode(QtWidgets.QListView.Batched)
+        self.opponentUnitList.setUniformItemSizes(True)
         self.opponentUnitList.setObjectName("opponentUnitList")
         self.gridLayout.addWidget(self.opponentUnitList, 2, 3, 1, 1)
         self.playerCounterTable = QtWidgets.QTableWidget(self.centralwidget)
@@ -85,7 +87,7 @@ class Ui_MainWindow(object):
         self.label_3.setAutoFillBackground(False)
         self.label_3.setObjectName("label_3")
         self.gridLayout.addWidget(self.label_3, 0, 5, 1, 1)
-        self.playerRaceList = QtWidgets.QListWidget(self.centralwidget)
+        self.playerRaceList = QtWidgets.QListView(self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.MinimumExpanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
@@ -96,6 +98,8 @@ class Ui_MainWindow(object):
         self.playerRaceList.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.playerRaceList.setProperty("showDropIndicator", False)
         self.playerRaceList.setDefaultDropAction(QtCore.Qt.IgnoreAction)
+        self.playerRaceList.setLayoutMode(QtWidgets.QListView.Batched)
+        self.playerRaceList.setUniformItemSizes(True)
         self.playerRaceList.setObjectName("playerRaceList")
         self.gridLayout.addWidget(self.playerRaceList, 2, 5, 1, 1)
         self.line = QtWidgets.QFrame(self.centralwidget)
@@ -104,7 +108,7 @@ class Ui_MainWindow(object):
         self.line.setFrameShadow(QtWidgets.QFrame.Sunken)
         self.line.setObjectName("line")
         self.gridLayout.addWidget(self.line, 2, 4, 1, 1)
-        self.opponentRaceList = QtWidgets.QListWidget(self.centralwidget)
+        self.opponentRaceList = QtWidgets.QListView(self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.MinimumExpanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
@@ -114,6 +118,8 @@ class Ui_MainWindow(object):
         self.opponentRaceList.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.opponentRaceList.setProperty("showDropIndicator", False)
         self.opponentRaceList.setDefaultDropAction(QtCore.Qt.IgnoreAction)
+        self.opponentRaceList.setLayoutMode(QtWidgets.QListView.Batched)
+        self.opponentRaceList.setUniformItemSizes(True)
         self.opponentRaceList.setObjectName("opponentRaceList")
         self.gridLayout.addWidget(self.opponentRaceList, 2, 0, 1, 1)
         self.groupBox = QtWidgets.QGroupBox(self.centralwidget)
@@ -173,7 +179,7 @@ class Ui_MainWindow(object):
         self.label_7.setFont(font)
         self.label_7.setObjectName("label_7")
         self.verticalLayout_4.addWidget(self.label_7)
-        self.opponentUnitWeaponList = QtWidgets.QListWidget(self.centralwidget)
+        self.opponentUnitWeaponList = QtWidgets.QListView(self.centralwidget)
         self.opponentUnitWeaponList.setEnabled(True)
         self.opponentUnitWeaponList.setMinimumSize(QtCore.QSize(200, 200))
         font = QtGui.QFont()
@@ -188,6 +194,7 @@ class Ui_MainWindow(object):
         self.opponentUnitWeaponList.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
         self.opponentUnitWeaponList.setLayoutMode(QtWidgets.QListView.SinglePass)
         self.opponentUnitWeaponList.setBatchSize(102)
+        self.opponentUnitWeaponList.setUniformItemSizes(True)
         self.opponentUnitWeaponList.setObjectName("opponentUnitWeaponList")
         self.verticalLayout_4.addWidget(self.opponentUnitWeaponList)
         self.gridLayout.addLayout(self.verticalLayout_4, 3, 4, 1, 4)
@@ -217,7 +224,6 @@ class Ui_MainWindow(object):
         self.label.setText(_translate("MainWindow", "Race you are trying to counter"))
         self.label_2.setText(_translate("MainWindow", "Unit you are trying to counter"))
         self.label_3.setText(_translate("MainWindow", "Race you are playing"))
-        self.opponentRaceList.setSortingEnabled(False)
         self.label_4.setText(_translate("MainWindow", "Unit:"))
         self.label_5.setText(_translate("MainWindow", "Armour Type:"))
         self.label_6.setText(_translate("MainWindow", "Filename:"))